@@ -0,0 +1,43 @@
+// Fills the search form datalist with the names suggested for the typed
+// prefix, at most one request in flight per pause in the typing
+(function () {
+  var input = document.querySelector('input[data-suggest-url]');
+  if (!input) {
+    return;
+  }
+  var list = document.getElementById(input.getAttribute('list'));
+  var timer = null;
+  var controller = null;
+
+  function fill(suggestions) {
+    list.innerHTML = '';
+    suggestions.forEach(function (suggestion) {
+      var option = document.createElement('option');
+      option.value = suggestion.name;
+      if (suggestion.kind !== 'name') {
+        option.label = suggestion.name + ' (' + suggestion.match + ')';
+      }
+      list.appendChild(option);
+    });
+  }
+
+  input.addEventListener('input', function () {
+    clearTimeout(timer);
+    timer = setTimeout(function () {
+      var term = input.value.trim();
+      if (!term) {
+        fill([]);
+        return;
+      }
+      if (controller) {
+        controller.abort();
+      }
+      controller = new AbortController();
+      fetch(input.dataset.suggestUrl + '?q=' + encodeURIComponent(term),
+            {signal: controller.signal})
+        .then(function (response) { return response.json(); })
+        .then(function (data) { fill(data.suggestions); })
+        .catch(function () {});
+    }, 100);
+  });
+})();
@@ -0,0 +1,4 @@
+"""
+Performance benchmarks of the catalog, run from the site directory, e.g.:
+    python -m benchmarks.random_mineral
+"""
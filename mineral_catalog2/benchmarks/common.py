@@ -0,0 +1,139 @@
+"""
+Helpers shared by the benchmarks: Django setup and a throwaway database
+seeded with synthetic minerals
+"""
+import contextlib
+import json
+import os
+import random
+import string
+import time
+
+import django
+
+
+def setup_django():
+    """
+    Configures Django with the project settings, DEBUG off as in production
+    (DEBUG keeps the SQL of the last 9000 queries)
+    """
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE',
+                          'mineral_catalog2.settings')
+    django.setup()
+
+    from django.conf import settings
+    settings.DEBUG = False
+
+
+def synthetic_minerals(count, seed=0):
+    """
+    Generates unsaved synthetic Mineral objects
+    :param count: number of minerals to generate
+    :param seed: random seed, the same seed generates the same minerals
+    :return: A list of Mineral objects
+    """
+    from main_app.models import Mineral
+
+    rnd = random.Random(seed)
+    categories = ['Silicate', 'Oxide', 'Sulfide', 'Carbonate', 'Phosphate',
+                  'Sulfate', 'Halide', 'Organic', 'Native element']
+    streaks = ['White', 'Colorless', 'Grey', 'Black', 'Brown', 'Red',
+               'Yellow', 'Green', 'Light grey', 'Reddish brown']
+
+    def word(length):
+        return ''.join(rnd.choice(string.ascii_lowercase)
+                       for _ in range(length))
+
+    return [
+        Mineral(
+            name='{}{}ite'.format(word(1).upper(), word(rnd.randint(3, 9))),
+            image_filename='{}.jpg'.format(word(8)),
+            image_caption=' '.join(word(rnd.randint(3, 9))
+                                   for _ in range(8)),
+            category=rnd.choice(categories),
+            formula='{}<sub>2</sub>O<sub>3</sub>'.format(word(2).title()),
+            strunz_classification='0{}.AB.{}'.format(rnd.randint(1, 9),
+                                                     rnd.randint(10, 99)),
+            color=', '.join(word(rnd.randint(3, 7)) for _ in range(3)),
+            crystal_system=rnd.choice(['Monoclinic', 'Triclinic',
+                                       'Orthorhombic', 'Hexagonal']),
+            mohs_scale_hardness='{}–{}'.format(rnd.randint(1, 5),
+                                               rnd.randint(5, 9)),
+            luster=rnd.choice(['Vitreous', 'Metallic', 'Pearly', 'Dull']),
+            streak=rnd.choice(streaks),
+            specific_gravity='{:.2f}'.format(rnd.uniform(1, 8)),
+            group=word(10),
+        )
+        for _ in range(count)
+    ]
+
+
+def realistic_minerals(count, seed=0):
+    """
+    Generates unsaved Mineral objects whose every field value is drawn
+    from the values of that field in assets/data/minerals.json, missing
+    values included, so the field lengths, categories, streaks and name
+    initials follow the real catalog distributions
+    :param count: number of minerals to generate
+    :param seed: random seed, the same seed generates the same minerals
+    :return: A list of Mineral objects, with unique names
+    """
+    from django.conf import settings
+    from main_app.models import Mineral
+
+    with open(os.path.join(settings.BASE_DIR, 'assets/data/minerals.json'),
+              encoding='utf-8') as data:
+        records = json.load(data)
+
+    rnd = random.Random(seed)
+    fields = {field for record in records for field in record}
+    columns = {field: [record.get(field, '') for record in records]
+               for field in fields}
+    names = columns.pop('name')
+    minerals = []
+    for index in range(count):
+        # the real names first, then numbered copies keeping the initials
+        name = names[index % len(names)]
+        if index >= len(names):
+            name = '{} {}'.format(name, index // len(names) + 1)
+        minerals.append(Mineral(
+            name=name,
+            **{field: rnd.choice(values) for field, values in columns.items()}
+        ))
+    return minerals
+
+
+@contextlib.contextmanager
+def seeded_database(count, seed=0, generate=synthetic_minerals):
+    """
+    Creates a throwaway test database seeded with synthetic minerals,
+    the database is destroyed on exit
+    :param count: number of synthetic minerals to seed
+    :param seed: random seed of the synthetic minerals
+    :param generate: the synthetic minerals generator
+    """
+    from django.test.utils import setup_databases, teardown_databases
+    from main_app.models import Mineral
+
+    old_config = setup_databases(verbosity=0, interactive=False)
+    try:
+        # the catalog loaded by the migrations is not part of the benchmark
+        Mineral.objects.all().delete()
+        minerals = generate(count, seed)
+        # bulk_create doesn't call save(), which maintains the slugs
+        for mineral in minerals:
+            mineral.set_derived_values()
+        Mineral.objects.bulk_create(minerals, batch_size=500)
+        yield
+    finally:
+        teardown_databases(old_config, verbosity=0)
+
+
+def timed(function, repeat):
+    """
+    :return: The mean wall time in seconds of a single function call
+    """
+    start = time.perf_counter()
+    for _ in range(repeat):
+        function()
+    return (time.perf_counter() - start) / repeat
@@ -0,0 +1,86 @@
+"""
+Compares the NDJSON export, streamed through the WSGI application, to
+serializing the whole catalog at once: throughput and peak memory
+allocated while serving a full dump.
+    python -m benchmarks.export [catalog sizes...]
+"""
+import json
+import sys
+import time
+import tracemalloc
+
+from benchmarks.common import realistic_minerals, seeded_database, \
+    setup_django
+
+
+def measured(function):
+    """
+    :return: A (seconds, peak allocated bytes, result) tuple of a call
+    """
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = function()
+    seconds = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return seconds, peak, result
+
+
+def streamed_export(application, environ):
+    """
+    Serves the export the way a WSGI server does, writing every chunk out
+    :return: The number of bytes served
+    """
+    def start_response(status, headers):
+        assert status.startswith('200'), status
+
+    served = 0
+    response = application(environ, start_response)
+    for chunk in response:
+        served += len(chunk)
+    response.close()
+    return served
+
+
+def whole_export(fields):
+    """
+    Serializes every mineral into a single NDJSON string
+    :return: The number of bytes built
+    """
+    from main_app.models import Mineral
+
+    keys = ('id', 'name') + fields
+    rows = Mineral.objects.order_by('pk').values_list('pk', 'name', *fields)
+    return len(''.join(json.dumps(dict(zip(keys, row)), ensure_ascii=False)
+                       + '\n' for row in rows).encode())
+
+
+def main(sizes):
+    setup_django()
+    from django.conf import settings
+    from django.core.handlers.wsgi import WSGIHandler
+    from django.test.client import RequestFactory
+    from django.urls import reverse
+    from main_app.api import API_FIELDS
+
+    settings.ALLOWED_HOSTS = list(settings.ALLOWED_HOSTS) + ['testserver']
+    settings.MINERAL_PERF_SNAPSHOT_INTERVAL = None
+    application = WSGIHandler()
+
+    print('{:>7} {:>9} {:>10} {:>10} {:>10}'.format(
+        'size', 'mode', 'rows/s', 'MB', 'peak MB'))
+    for size in sizes:
+        with seeded_database(size, generate=realistic_minerals):
+            environ = RequestFactory().get(reverse('api:export')).environ
+            for mode, function in (
+                    ('streamed', lambda: streamed_export(application,
+                                                         environ)),
+                    ('whole', lambda: whole_export(API_FIELDS[1:]))):
+                seconds, peak, served = measured(function)
+                print('{:>7} {:>9} {:>10.0f} {:>10.1f} {:>10.1f}'.format(
+                    size, mode, size / seconds, served / 2 ** 20,
+                    peak / 2 ** 20))
+
+
+if __name__ == '__main__':
+    main([int(size) for size in sys.argv[1:]] or [10000, 100000])
@@ -0,0 +1,55 @@
+"""
+Imports a synthetic JSON catalog file and reports the import throughput
+and the peak memory of the process.
+    python -m benchmarks.import_minerals [records count]
+"""
+import json
+import resource
+import sys
+import tempfile
+
+from benchmarks.common import seeded_database, setup_django, \
+    synthetic_minerals
+
+FIELDS = ['name', 'image_filename', 'image_caption', 'category', 'formula',
+          'strunz_classification', 'color', 'crystal_system',
+          'mohs_scale_hardness', 'luster', 'streak', 'specific_gravity',
+          'group']
+
+
+def write_catalog(data, count, chunk=10000):
+    """
+    Writes count synthetic minerals records as a JSON array, chunk at a time
+    """
+    data.write('[')
+    for offset in range(0, count, chunk):
+        minerals = synthetic_minerals(min(chunk, count - offset), offset)
+        for index, mineral in enumerate(minerals):
+            if offset or index:
+                data.write(',\n')
+            json.dump({field: getattr(mineral, field) for field in FIELDS},
+                      data)
+    data.write(']')
+
+
+def main(count):
+    setup_django()
+    from main_app.importer import import_minerals, iter_json_array
+
+    with tempfile.TemporaryFile('w+', encoding='utf-8') as data:
+        write_catalog(data, count)
+        data.seek(0)
+        with seeded_database(0):
+            before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+            stats = import_minerals(iter_json_array(data))
+            after = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    print('{} minerals imported in {:.1f}s ({:.0f}/s), '
+          'peak RSS {:.0f}MB (+{:.0f}MB)'.format(
+              stats['created'], stats['seconds'],
+              stats['created'] / stats['seconds'],
+              after / 1024, (after - before) / 1024))
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 1000000)
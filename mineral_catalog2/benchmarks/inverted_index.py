@@ -0,0 +1,48 @@
+"""
+Compares the in-memory inverted index search backend against the
+icontains Q chain on synthetic catalogs.
+    python -m benchmarks.inverted_index [catalog size ...]
+"""
+import sys
+import time
+import tracemalloc
+
+from benchmarks.common import seeded_database, setup_django, timed
+
+TERMS = ['silicate', 'vitreous', 'red', 'mono', 'xyz', 'oxyde']
+
+
+def main(sizes):
+    setup_django()
+    from main_app.inverted_index import InvertedIndex
+    from main_app.search import IContainsSearchBackend
+
+    icontains = IContainsSearchBackend()
+    print('{:>8} {:>10} {:>16} {:>16} {:>10}'.format(
+        'minerals', 'term', 'icontains ms', 'inverted ms', 'matches'))
+    for size in sizes:
+        with seeded_database(size):
+            index = InvertedIndex()
+            start = time.perf_counter()
+            index.build()
+            build_time = time.perf_counter() - start
+
+            tracemalloc.start()
+            index = InvertedIndex()
+            index.build()
+            index_bytes = tracemalloc.get_traced_memory()[0]
+            tracemalloc.stop()
+            print('{:>8} built in {:.2f}s, {:.1f}MB'.format(
+                size, build_time, index_bytes / 2 ** 20))
+
+            repeat = max(1, 10000 // size)
+            for term in TERMS:
+                print('{:>8} {:>10} {:>16.3f} {:>16.3f} {:>10}'.format(
+                    size, term,
+                    timed(lambda: icontains.search(term), repeat) * 1e3,
+                    timed(lambda: index.search(term), repeat) * 1e3,
+                    len(index.search(term))))
+
+
+if __name__ == '__main__':
+    main([int(size) for size in sys.argv[1:]] or [1000, 10000, 100000])
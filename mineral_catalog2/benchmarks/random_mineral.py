@@ -0,0 +1,53 @@
+"""
+Compares the per request allocation and time of picking a random mineral
+by materializing the whole table against the cached pk array picker.
+    python -m benchmarks.random_mineral [catalog size ...]
+"""
+import random
+import sys
+import tracemalloc
+
+from benchmarks.common import seeded_database, setup_django, timed
+
+
+def allocated_bytes(function):
+    """
+    :return: The peak traced memory in bytes of a single function call
+    """
+    tracemalloc.start()
+    function()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return peak
+
+
+def main(sizes):
+    setup_django()
+    from django.db import connection
+    from django.test.utils import CaptureQueriesContext
+    from main_app.models import Mineral
+    from main_app.random_picker import random_mineral_picker
+
+    def full_table_pick():
+        return random.choice(Mineral.objects.all())
+
+    pickers = [('full table', full_table_pick),
+               ('pk array', random_mineral_picker.pick)]
+
+    print('{:>8} {:>12} {:>14} {:>12} {:>8}'.format(
+        'minerals', 'picker', 'peak bytes', 'usec/pick', 'queries'))
+    for size in sizes:
+        with seeded_database(size):
+            random_mineral_picker.invalidate()
+            # warming up the pk array, it is loaded once per catalog change
+            random_mineral_picker.pick()
+            for label, picker in pickers:
+                with CaptureQueriesContext(connection) as queries:
+                    picker()
+                print('{:>8} {:>12} {:>14} {:>12.1f} {:>8}'.format(
+                    size, label, allocated_bytes(picker),
+                    timed(picker, 50) * 1e6, len(queries)))
+
+
+if __name__ == '__main__':
+    main([int(size) for size in sys.argv[1:]] or [870, 10000])
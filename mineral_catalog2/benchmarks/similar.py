@@ -0,0 +1,46 @@
+"""
+Time of the similar minerals computation over the whole catalog, in a
+single process and shared by worker processes, with the sparse pure
+Python scoring and with NumPy when it is installed.
+    python -m benchmarks.similar [catalog sizes...]
+"""
+import os
+import sys
+import time
+
+from benchmarks.common import realistic_minerals, seeded_database, \
+    setup_django
+
+
+def main(sizes):
+    setup_django()
+    from django.conf import settings
+    from main_app.models import Mineral
+    from main_app.similarity import FEATURE_FIELDS, feature_vectors, \
+        nearest_neighbours, numpy
+
+    limit = settings.MINERAL_SIMILAR_LIMIT
+    workers = os.cpu_count() or 1
+    modes = [('python', False)] + ([('numpy', True)] if numpy else [])
+
+    print('{:>7} {:>8} {:>8} {:>11} {:>10}'.format(
+        'size', 'mode', 'workers', 'vectors s', 'top-k s'))
+    for size in sizes:
+        with seeded_database(size, generate=realistic_minerals):
+            start = time.perf_counter()
+            columns, vectors = feature_vectors(
+                Mineral.objects.order_by('pk').values(*FEATURE_FIELDS))
+            vectors_seconds = time.perf_counter() - start
+            for mode, use_numpy in modes:
+                for pool_size in sorted({1, workers}):
+                    start = time.perf_counter()
+                    nearest_neighbours(columns, vectors, limit,
+                                       workers=pool_size,
+                                       use_numpy=use_numpy)
+                    print('{:>7} {:>8} {:>8} {:>11.2f} {:>10.2f}'.format(
+                        size, mode, pool_size, vectors_seconds,
+                        time.perf_counter() - start))
+
+
+if __name__ == '__main__':
+    main([int(size) for size in sys.argv[1:]] or [1000, 5000])
@@ -0,0 +1,105 @@
+"""
+Compares the concurrent read throughput of the stock SQLite backend,
+connecting per request, against the tuned backend with persistent
+connections, writable and read only (immutable).
+Each simulated request runs the queries of a list page and of a detail
+page, then ends the way Django ends a request (close_old_connections).
+    python -m benchmarks.sqlite_reads [catalog size] [requests per thread]
+"""
+import os
+import random
+import shutil
+import sys
+import tempfile
+import threading
+import time
+
+from benchmarks.common import realistic_minerals, setup_django
+
+THREADS = (1, 4, 8)
+
+# alias: (ENGINE, CONN_MAX_AGE, OPTIONS)
+MODES = {
+    'stock': ('django.db.backends.sqlite3', 0, {}),
+    'tuned': ('mineral_catalog2.sqlite_backend', 600, {}),
+    'read only': ('mineral_catalog2.sqlite_backend', 600,
+                  {'read_only': True}),
+}
+
+
+def create_catalog(path, count):
+    """
+    Migrates a database file at path and seeds it with count minerals
+    """
+    from django.core.management import call_command
+    from django.db import connections
+    from main_app.models import Mineral
+
+    call_command('migrate', database='seed', verbosity=0)
+    Mineral.objects.using('seed').all().delete()
+    minerals = realistic_minerals(count)
+    for mineral in minerals:
+        mineral.set_derived_values()
+    Mineral.objects.using('seed').bulk_create(minerals, batch_size=500)
+    connections['seed'].close()
+
+
+def run(alias, threads, requests, pks):
+    """
+    :return: The requests per second of threads reading concurrently
+    """
+    from django.db import connections
+    from main_app.models import Mineral
+
+    def worker(seed):
+        rnd = random.Random(seed)
+        connection = connections[alias]
+        for _ in range(requests):
+            list(Mineral.objects.using(alias)
+                 .filter(name_initial=rnd.choice('abcdefghlmnprst'))
+                 .order_by('name', 'pk').values_list('pk', 'name')[:101])
+            Mineral.objects.using(alias).get(pk=rnd.choice(pks))
+            connection.close_if_unusable_or_obsolete()
+        connection.close()
+
+    workers = [threading.Thread(target=worker, args=(seed,))
+               for seed in range(threads)]
+    start = time.perf_counter()
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+    return threads * requests / (time.perf_counter() - start)
+
+
+def main(count, requests):
+    directory = tempfile.mkdtemp()
+    path = os.path.join(directory, 'catalog.sqlite3')
+    try:
+        setup_django()
+        from django.conf import settings
+        default = settings.DATABASES['default']
+        settings.DATABASES['seed'] = dict(
+            default, ENGINE='mineral_catalog2.sqlite_backend', NAME=path,
+            CONN_MAX_AGE=0, OPTIONS={})
+        for alias, (engine, max_age, options) in MODES.items():
+            settings.DATABASES[alias] = dict(
+                default, ENGINE=engine, NAME=path, CONN_MAX_AGE=max_age,
+                OPTIONS=options)
+
+        create_catalog(path, count)
+        from main_app.models import Mineral
+        pks = list(Mineral.objects.using('seed').values_list('pk', flat=True))
+
+        print('{:>10} {:>8} {:>12}'.format('mode', 'threads', 'requests/s'))
+        for alias in MODES:
+            for threads in THREADS:
+                print('{:>10} {:>8} {:>12.0f}'.format(
+                    alias, threads, run(alias, threads, requests, pks)))
+    finally:
+        shutil.rmtree(directory)
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 10000,
+         int(sys.argv[2]) if len(sys.argv) > 2 else 500)
@@ -0,0 +1,77 @@
+"""
+Latency of the search suggestions at growing catalog sizes: the prefix
+index lookup alone, the whole suggest view through the test client, and
+for comparison the icontains prefix query suggestions would otherwise run.
+    python -m benchmarks.suggest [catalog sizes...]
+"""
+import random
+import sys
+import time
+
+from benchmarks.common import realistic_minerals, seeded_database, \
+    setup_django, timed
+
+LOOKUPS = 2000
+
+
+def prefixes(names, count, seed=0):
+    """
+    :return: count typed prefixes of 1 to 6 characters of random names
+    """
+    rnd = random.Random(seed)
+    return [rnd.choice(names)[:rnd.randint(1, 6)] for _ in range(count)]
+
+
+def main(sizes):
+    setup_django()
+    from django.conf import settings
+    from django.test import Client
+    from django.urls import reverse
+    from main_app.models import Mineral
+    from main_app.perf import Histogram
+    from main_app.signals import catalog_changed
+    from main_app.suggest_index import suggest_index
+
+    settings.ALLOWED_HOSTS = list(settings.ALLOWED_HOSTS) + ['testserver']
+    settings.MINERAL_PERF_SNAPSHOT_INTERVAL = None
+    limit = settings.MINERAL_SUGGEST_LIMIT
+    url = reverse('minerals:suggest')
+    client = Client()
+
+    print('{:>7} {:>9} {:>10} {:>10} {:>10} {:>13} {:>12}'.format(
+        'size', 'build s', 'p50 us', 'p99 us', 'max us', 'view p99 us',
+        'query ms'))
+    for size in sizes:
+        with seeded_database(size, generate=realistic_minerals):
+            catalog_changed.send(sender=Mineral)
+            start = time.perf_counter()
+            suggest_index.build()
+            build_seconds = time.perf_counter() - start
+            names = list(Mineral.objects.values_list('name', flat=True))
+            terms = prefixes(names, LOOKUPS)
+
+            lookups = Histogram()
+            for term in terms:
+                start = time.perf_counter()
+                suggest_index.suggest(term, limit)
+                lookups.record((time.perf_counter() - start) * 1e6)
+
+            views = Histogram()
+            for term in terms[:LOOKUPS // 4]:
+                start = time.perf_counter()
+                client.get(url, {'q': term})
+                views.record((time.perf_counter() - start) * 1e6)
+
+            query = timed(lambda: [list(
+                Mineral.objects.filter(name__istartswith=term)
+                .values_list('pk', 'name')[:limit])
+                for term in terms[:20]], 1) / 20
+
+            print('{:>7} {:>9.2f} {:>10} {:>10} {:>10} {:>13} {:>12.3f}'
+                  .format(size, build_seconds, lookups.percentile(50),
+                          lookups.percentile(99), lookups.max,
+                          views.percentile(99), query * 1e3))
+
+
+if __name__ == '__main__':
+    main([int(size) for size in sys.argv[1:]] or [10000, 100000])
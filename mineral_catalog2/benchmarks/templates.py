@@ -0,0 +1,68 @@
+"""
+Render time of the list and detail templates, with the layout fragments
+(sidebar facets and letters bar) served from the fragment cache, and
+rendered on every page as the layout did before the cache.
+    python -m benchmarks.templates [catalog size] [renders]
+"""
+import sys
+
+from benchmarks.common import realistic_minerals, seeded_database, \
+    setup_django, timed
+
+
+def page_contexts():
+    """
+    :return: A dict of the template name to a context rendering it as
+    the views do
+    """
+    import json
+
+    from main_app.images import image_sources
+    from main_app.models import Mineral
+    from main_app.projections import MineralRow, project
+
+    mineral = Mineral.objects.order_by('pk').first()
+    rows = project(Mineral.objects.filter(name_initial='a')
+                   .order_by('name', 'pk')[:100], MineralRow)
+    snapshot = json.loads(mineral.detail_snapshot)
+    return {
+        'main_app/index.html': {
+            'minerals': rows, 'random_mineral': mineral,
+            'selected_letter': 'a', 'selected_category': None,
+            'selected_streak': None},
+        'main_app/mineral_detail.html': {
+            'mineral': {'pk': mineral.pk, 'name': mineral.name,
+                        'image_caption': snapshot['caption']},
+            'image': image_sources(mineral.image_filename),
+            'attributes': snapshot['attributes'],
+            'random_mineral': mineral},
+    }
+
+
+def main(count, renders):
+    setup_django()
+    from django.template.loader import get_template
+    from main_app.fragments import fragment_cache
+    from main_app.models import Mineral
+    from main_app.signals import catalog_changed
+
+    with seeded_database(count, generate=realistic_minerals):
+        catalog_changed.send(sender=Mineral)
+        print('{:<30} {:>14} {:>14}'.format('template', 'cached ms',
+                                            'rendered ms'))
+        for name, context in page_contexts().items():
+            template = get_template(name)
+            template.render(context)
+
+            def rendered():
+                fragment_cache.clear()
+                template.render(context)
+
+            print('{:<30} {:>14.3f} {:>14.3f}'.format(
+                name, timed(lambda: template.render(context), renders) * 1e3,
+                timed(rendered, renders) * 1e3))
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 10000,
+         int(sys.argv[2]) if len(sys.argv) > 2 else 500)
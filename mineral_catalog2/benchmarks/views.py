@@ -0,0 +1,277 @@
+"""
+Load test of the catalog views over realistic synthetic catalogs.
+Every route is driven through Django's test client and through a
+multi-threaded driver calling the WSGI application directly, reporting
+per view the throughput, the latency percentiles, the queries and template
+time per request (recorded by main_app.perf.PerfMiddleware) and the peak
+memory allocated by a request.
+The results can be stored as a JSON baseline, later runs are compared to
+it and fail if a view got slower than the threshold allows.
+    python -m benchmarks.views [--sizes 1000 10000 100000]
+        [--requests 200] [--threads 4] [--page-cache]
+        [--baseline views-baseline.json] [--save]
+        [--threshold 0.2]
+"""
+import argparse
+import json
+import random
+import sys
+import threading
+import time
+import tracemalloc
+from urllib.parse import urlencode
+
+from benchmarks.common import realistic_minerals, seeded_database, \
+    setup_django
+
+# the views measured, their URL name as recorded by the PerfMiddleware
+VIEWS = ('minerals:list', 'minerals:list_by_letter',
+         'minerals:list_by_category', 'minerals:list_by_streak',
+         'minerals:detail', 'minerals:search')
+
+DRIVERS = ('client', 'wsgi')
+
+
+def request_paths(count, seed=0):
+    """
+    Draws count request paths of every view out of the seeded catalog
+    :return: A dict of the URL name to its list of paths
+    """
+    from django.urls import reverse
+    from main_app.facets import facet_registry
+    from main_app.models import Mineral
+
+    rnd = random.Random(seed)
+    pks = list(Mineral.objects.values_list('pk', flat=True))
+    names = list(Mineral.objects.values_list('name', flat=True))
+    # the minerals missing a category or streak have an empty slug
+    categories = [slug for slug in facet_registry.get('category') if slug]
+    streaks = [slug for slug in facet_registry.get('streak') if slug]
+    letters = sorted({name[:1].lower() for name in names if name})
+
+    def draw(function):
+        return [function() for _ in range(count)]
+
+    return {
+        'minerals:list': draw(lambda: reverse('minerals:list')),
+        'minerals:list_by_letter': draw(lambda: reverse(
+            'minerals:list_by_letter',
+            kwargs={'letter': rnd.choice(letters)})),
+        'minerals:list_by_category': draw(lambda: reverse(
+            'minerals:list_by_category',
+            kwargs={'selected_category': rnd.choice(categories)})),
+        'minerals:list_by_streak': draw(lambda: reverse(
+            'minerals:list_by_streak',
+            kwargs={'selected_streak': rnd.choice(streaks)})),
+        'minerals:detail': draw(lambda: reverse(
+            'minerals:detail', kwargs={'pk': rnd.choice(pks)})),
+        'minerals:search': draw(lambda: '{}?{}'.format(
+            reverse('minerals:search'),
+            urlencode({'q': rnd.choice(names)[:rnd.randint(3, 8)]}))),
+    }
+
+
+def drive_client(paths, threads):
+    """
+    Requests the paths in sequence through the test client
+    :return: The latencies in seconds and the total wall time
+    """
+    from django.test import Client
+
+    client = Client()
+    latencies = []
+    start = time.perf_counter()
+    for path in paths:
+        request_start = time.perf_counter()
+        response = client.get(path)
+        latencies.append(time.perf_counter() - request_start)
+        assert response.status_code == 200, (path, response.status_code)
+    return latencies, time.perf_counter() - start
+
+
+def drive_wsgi(paths, threads):
+    """
+    Requests the paths from threads calling the WSGI application, as a
+    threaded WSGI server does
+    :return: The latencies in seconds and the total wall time
+    """
+    from django.core.handlers.wsgi import WSGIHandler
+    from django.test.client import RequestFactory
+
+    application = WSGIHandler()
+    factory = RequestFactory()
+    environs = [factory.get(path).environ for path in paths]
+    latencies = []
+    lock = threading.Lock()
+
+    def start_response(status, headers):
+        assert status.startswith('200'), status
+
+    def worker(chunk):
+        measured = []
+        for environ in chunk:
+            request_start = time.perf_counter()
+            response = application(environ, start_response)
+            b''.join(response)
+            response.close()
+            measured.append(time.perf_counter() - request_start)
+        with lock:
+            latencies.extend(measured)
+
+    workers = [threading.Thread(target=worker, args=(environs[i::threads],))
+               for i in range(threads)]
+    start = time.perf_counter()
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+    return latencies, time.perf_counter() - start
+
+
+def peak_memory(paths):
+    """
+    :return: The peak memory in bytes allocated by a single request
+    """
+    from django.test import Client
+
+    client = Client()
+    client.get(paths[0])
+    tracemalloc.start()
+    client.get(paths[-1])
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return peak
+
+
+def measure(paths, driver, threads):
+    """
+    Runs the requests of a single view
+    :return: A dict of the view measures
+    """
+    from main_app.perf import Histogram, perf_recorder
+
+    drive = {'client': drive_client, 'wsgi': drive_wsgi}[driver]
+    # warming up the in-process caches and indexes
+    drive(paths[:5], 1)
+    perf_recorder.reset()
+    latencies, seconds = drive(paths, threads)
+
+    histogram = Histogram()
+    for latency in latencies:
+        histogram.record(latency * 1e6)
+    recorded = next(iter(perf_recorder.views.values())).histograms
+    return {
+        'requests_per_second': round(len(latencies) / seconds, 1),
+        'p50_ms': histogram.percentile(50) / 1000,
+        'p95_ms': histogram.percentile(95) / 1000,
+        'p99_ms': histogram.percentile(99) / 1000,
+        'queries': round(recorded['queries'].total /
+                         recorded['queries'].count, 2),
+        'template_ms': round(recorded['template_ms'].total /
+                             recorded['template_ms'].count / 1000, 3),
+        'peak_bytes': peak_memory(paths),
+    }
+
+
+def regressions(results, baseline, threshold):
+    """
+    Compares the results to the baseline ones
+    :return: A list of the regression messages
+    """
+    messages = []
+    for key, views in results.items():
+        for view_name, measures in views.items():
+            base = baseline.get(key, {}).get(view_name)
+            if base is None:
+                continue
+            if measures['p95_ms'] > base['p95_ms'] * (1 + threshold):
+                messages.append('{} {}: p95 {}ms, baseline {}ms'.format(
+                    key, view_name, measures['p95_ms'], base['p95_ms']))
+            if measures['requests_per_second'] < \
+                    base['requests_per_second'] * (1 - threshold):
+                messages.append('{} {}: {} requests/s, baseline {}'.format(
+                    key, view_name, measures['requests_per_second'],
+                    base['requests_per_second']))
+            if measures['queries'] > base['queries']:
+                messages.append('{} {}: {} queries, baseline {}'.format(
+                    key, view_name, measures['queries'], base['queries']))
+    return messages
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--sizes', type=int, nargs='+',
+                        default=[1000, 10000])
+    parser.add_argument('--requests', type=int, default=200,
+                        help='requests per view and driver')
+    parser.add_argument('--threads', type=int, default=4,
+                        help='threads of the WSGI driver')
+    parser.add_argument('--drivers', nargs='+', choices=DRIVERS,
+                        default=list(DRIVERS))
+    parser.add_argument('--page-cache', action='store_true',
+                        help='keep the page cache, measuring its hits')
+    parser.add_argument('--baseline',
+                        help='JSON baseline file to compare the results to')
+    parser.add_argument('--save', action='store_true',
+                        help='store the results as the baseline')
+    parser.add_argument('--threshold', type=float, default=0.2,
+                        help='allowed relative slowdown to the baseline')
+    options = parser.parse_args(argv)
+
+    setup_django()
+    from django.conf import settings
+    from main_app.models import Mineral
+    from main_app.signals import catalog_changed
+
+    settings.ALLOWED_HOSTS = list(settings.ALLOWED_HOSTS) + ['testserver']
+    settings.MINERAL_PERF_SNAPSHOT_INTERVAL = None
+    if not options.page_cache:
+        settings.CACHES[settings.MINERAL_PAGE_CACHE] = {
+            'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}
+
+    results = {}
+    print('{:>7} {:>6} {:<26} {:>8} {:>8} {:>8} {:>8} {:>8} {:>9} '
+          '{:>10}'.format('size', 'driver', 'view', 'req/s', 'p50 ms',
+                          'p95 ms', 'p99 ms', 'queries', 'templ ms',
+                          'peak KB'))
+    for size in options.sizes:
+        with seeded_database(size, generate=realistic_minerals):
+            catalog_changed.send(sender=Mineral)
+            paths = request_paths(options.requests)
+            for driver in options.drivers:
+                key = '{}/{}'.format(size, driver)
+                results[key] = {}
+                for view_name in VIEWS:
+                    measures = measure(paths[view_name], driver,
+                                       options.threads)
+                    results[key][view_name] = measures
+                    print('{:>7} {:>6} {:<26} {:>8} {:>8.2f} {:>8.2f} '
+                          '{:>8.2f} {:>8} {:>9} {:>10.0f}'.format(
+                              size, driver, view_name,
+                              measures['requests_per_second'],
+                              measures['p50_ms'], measures['p95_ms'],
+                              measures['p99_ms'], measures['queries'],
+                              measures['template_ms'],
+                              measures['peak_bytes'] / 1024))
+
+    if not options.baseline:
+        return 0
+    if options.save:
+        with open(options.baseline, 'w') as baseline:
+            json.dump(results, baseline, indent=2, sort_keys=True)
+        print('Baseline saved to {}'.format(options.baseline))
+        return 0
+
+    with open(options.baseline) as baseline:
+        messages = regressions(results, json.load(baseline),
+                               options.threshold)
+    for message in messages:
+        print('REGRESSION ' + message)
+    if not messages:
+        print('No regression beyond {:.0%} of {}'.format(
+            options.threshold, options.baseline))
+    return 1 if messages else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,214 @@
+"""
+Read-only JSON API of the catalog, the list, detail, search and filter
+views return the same minerals as their HTML pages, and the export view
+streams the whole catalog as NDJSON, one mineral object per line.
+Every view takes a fields param, the comma separated names of the
+API_FIELDS to return, all of them by default, id and name always.
+"""
+import functools
+import hashlib
+import json
+
+from django.conf import settings
+from django.http import JsonResponse, StreamingHttpResponse
+from django.views.decorators.http import condition
+
+from .facet_index import facet_index
+from .models import Mineral
+from .page_cache import (cache_page_by, catalog_last_modified, catalog_state,
+                         detail_tags, list_tags, page_etag, search_tags)
+from .pagination import paginate, paginate_bitmap
+from .projections import fields_row_class, project
+from .search import SearchTimeout, search_pks
+from .views import facet_selection, get_minerals_by, range_lookups
+
+# the mineral fields served, the data fields and the parsed numeric ranges
+API_FIELDS = tuple(
+    field.name for field in Mineral._meta.concrete_fields
+    if field.editable and field.name != 'id'
+    or field.name.endswith(('_min', '_max')))
+
+
+def error_response(message, status):
+    return JsonResponse({'error': message}, status=status)
+
+
+def requested_fields(request):
+    """
+    Gets the fields param of the request
+    :return: A tuple of the requested API_FIELDS besides id and name, in
+    the API_FIELDS order
+    :raise ValueError: if a requested field isn't one of the API_FIELDS
+    """
+    fields = request.GET.get('fields')
+    if not fields:
+        return API_FIELDS[1:]
+    names = {name.strip() for name in fields.split(',')} - {'', 'id', 'name'}
+    unknown = names.difference(API_FIELDS)
+    if unknown:
+        raise ValueError('Unknown fields: {}'.format(
+            ', '.join(sorted(unknown))))
+    return tuple(name for name in API_FIELDS[1:] if name in names)
+
+
+def with_fields(view):
+    """
+    Calls the view with the row class of the requested fields, answers a
+    400 error if a requested field is unknown
+    """
+    @functools.wraps(view)
+    def wrapper(request, *args, **kwargs):
+        try:
+            fields = requested_fields(request)
+        except ValueError as error:
+            return error_response(str(error), 400)
+        return view(request, fields_row_class(fields), *args, **kwargs)
+    return wrapper
+
+
+def page_response(request, page, **extra):
+    """
+    :return: A JSON response of the page rows and the URLs of its
+    neighbour pages
+    """
+    return JsonResponse({
+        'results': [row.as_dict() for row in page],
+        'previous': '{}?{}'.format(request.path, page.previous_query)
+        if page.has_previous else None,
+        'next': '{}?{}'.format(request.path, page.next_query)
+        if page.has_next else None,
+        **extra,
+    })
+
+
+@condition(etag_func=page_etag(list_tags),
+           last_modified_func=catalog_last_modified)
+@cache_page_by(list_tags)
+@with_fields
+def mineral_list(request, row_class, letter='a', selected_category=None,
+                 selected_streak=None):
+    """
+    A page of the minerals of a letter, a category or a streak
+    :return: A JSON response, see page_response
+    """
+    if selected_category:
+        minerals = get_minerals_by('category', selected_category)
+    elif selected_streak:
+        minerals = get_minerals_by('streak', selected_streak)
+    else:
+        minerals = Mineral.objects.filter(name_initial=letter.lower())
+    return page_response(request, paginate(request, minerals, row_class))
+
+
+@condition(etag_func=page_etag(detail_tags),
+           last_modified_func=catalog_last_modified)
+@cache_page_by(detail_tags)
+@with_fields
+def mineral_detail(request, row_class, pk):
+    """
+    :return: A JSON response of a single mineral
+    """
+    rows = project(Mineral.objects.filter(pk=pk), row_class)
+    if not rows:
+        return error_response('Not found', 404)
+    return JsonResponse(rows[0].as_dict())
+
+
+@condition(etag_func=page_etag(search_tags),
+           last_modified_func=catalog_last_modified)
+@cache_page_by(search_tags)
+@with_fields
+def search(request, row_class):
+    """
+    A page of the minerals matching the q param
+    :return: A JSON response, see page_response
+    """
+    try:
+        pks_found = search_pks(request.GET.get('q', ''),
+                               settings.MINERAL_SEARCH_MAX_RESULTS)
+    except SearchTimeout:
+        return error_response('The search timed out', 503)
+    page = paginate(request, Mineral.objects.filter(pk__in=pks_found),
+                    row_class)
+    return page_response(request, page)
+
+
+@condition(etag_func=page_etag(search_tags),
+           last_modified_func=catalog_last_modified)
+@cache_page_by(search_tags)
+@with_fields
+def filter_minerals(request, row_class):
+    """
+    A page of the minerals having the selected facets values and
+    measured ranges, see views.filter_minerals, with the matches total
+    and the counts of every facet value
+    :return: A JSON response, see page_response
+    """
+    selection = facet_selection(request.GET)
+    lookups = range_lookups(request.GET)
+    within = None
+    if lookups:
+        within = facet_index.mask_of(Mineral.objects.filter(**lookups)
+                                     .values_list('pk', flat=True))
+    bits = facet_index.mask(selection)
+    if within is not None:
+        bits &= within
+    page = paginate_bitmap(request, bits)
+
+    # the index pages hold the pk and name only, fetch the other fields
+    if len(row_class.fields) > 2 and page.object_list:
+        rows = {row.pk: row for row in project(
+            Mineral.objects.filter(pk__in=[row.pk for row in page]),
+            row_class)}
+        page.object_list = [rows[row.pk] for row in page]
+
+    return page_response(request, page,
+                         total=facet_index.count(bits),
+                         facets=facet_index.counts(selection, within))
+
+
+def export_etag(request):
+    """
+    The export ETag, the global catalog version and the requested fields
+    """
+    return hashlib.md5('{}\n{}'.format(
+        catalog_state()[0], request.GET.get('fields', '')).encode()
+    ).hexdigest()
+
+
+def export_lines(fields, chunk_size):
+    """
+    Serializes every mineral, in pk order, fetching chunk_size rows at a
+    time from a server side cursor
+    :return: A generator of the bytes of chunk_size NDJSON lines
+    """
+    keys = ('id', 'name') + fields
+    rows = Mineral.objects.order_by('pk').values_list(
+        'pk', 'name', *fields).iterator(chunk_size=chunk_size)
+    lines = []
+    for row in rows:
+        lines.append(json.dumps(dict(zip(keys, row)), ensure_ascii=False))
+        if len(lines) == chunk_size:
+            lines.append('')
+            yield '\n'.join(lines).encode()
+            lines = []
+    if lines:
+        lines.append('')
+        yield '\n'.join(lines).encode()
+
+
+@condition(etag_func=export_etag, last_modified_func=catalog_last_modified)
+def export(request):
+    """
+    Streams the whole catalog as NDJSON, in constant memory whatever the
+    catalog size. A client sending the ETag of its last export back in
+    If-None-Match gets a 304 until the catalog changes.
+    :return: A streaming response
+    """
+    try:
+        fields = requested_fields(request)
+    except ValueError as error:
+        return error_response(str(error), 400)
+    return StreamingHttpResponse(
+        export_lines(fields, settings.MINERAL_EXPORT_CHUNK_SIZE),
+        content_type='application/x-ndjson; charset=utf-8')
@@ -0,0 +1,33 @@
+from django.urls import path
+
+from . import api
+
+
+app_name = 'api'
+
+urlpatterns = [
+    path('minerals/', api.mineral_list,
+         name='list'
+         ),
+    path('minerals/by-letter/<letter>/', api.mineral_list,
+         name='list_by_letter'
+         ),
+    path('minerals/by-category/<selected_category>/', api.mineral_list,
+         name='list_by_category'
+         ),
+    path('minerals/by-streak/<selected_streak>/', api.mineral_list,
+         name='list_by_streak'
+         ),
+    path('minerals/<int:pk>/', api.mineral_detail,
+         name='detail'
+         ),
+    path('minerals/search/', api.search,
+         name='search'
+         ),
+    path('minerals/filter/', api.filter_minerals,
+         name='filter'
+         ),
+    path('minerals/export/', api.export,
+         name='export'
+         ),
+]
@@ -3,3 +3,7 @@ from django.apps import AppConfig
 
 class MainAppConfig(AppConfig):
     name = 'main_app'
+
+    def ready(self):
+        # connecting the catalog caches signal receivers
+        from . import signals  # noqa: F401
@@ -0,0 +1,226 @@
+"""
+In-process bitmap index of the minerals facets.
+Every mineral has a position, its rank in the (name, pk) order, and every
+facet value a Python int whose bits are set at the positions of the
+minerals having it. Combining facets is a bitwise AND, a facet value count
+a popcount, and the set bits of a selection, in position order, are its
+minerals in the list pages order.
+The index is built by a single scan of the Mineral table, saves update the
+bitmaps of the saved mineral in place and only an added or renamed mineral,
+moving the positions, makes the index rebuilt on its next use.
+"""
+import bisect
+import threading
+from array import array
+
+from .models import Mineral
+from .parsing import crystal_systems, lusters
+
+# the faceted attributes, in display order
+FACETS = ('category', 'streak', 'crystal_system', 'luster', 'letter')
+
+# the columns read to compute the facets values
+FACET_COLUMNS = ('pk', 'name', 'category_slug', 'streak_slug',
+                 'crystal_system', 'luster', 'name_initial')
+
+
+def facet_values(row):
+    """
+    :param row: a tuple of the FACET_COLUMNS values of a mineral
+    :return: A dict of every facet to the set of the mineral values, a
+    mineral may have several lusters or crystal systems, or none
+    """
+    _, _, category, streak, crystal_system, luster, letter = row
+    return {
+        'category': {category} if category else set(),
+        'streak': {streak} if streak else set(),
+        'crystal_system': set(crystal_systems(crystal_system)),
+        'luster': set(lusters(luster)),
+        'letter': {letter} if letter else set(),
+    }
+
+
+def bitmap(positions, size):
+    """
+    :return: An int having the bits of positions set, built in linear time
+    """
+    buffer = bytearray((size + 7) // 8)
+    for position in positions:
+        buffer[position >> 3] |= 1 << (position & 7)
+    return int.from_bytes(buffer, 'little')
+
+
+def popcount(bits):
+    return bin(bits).count('1')
+
+
+class FacetIndex:
+    """
+    The facets values bitmaps, built lazily and kept until invalidated
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._built = False
+        self.version = 0
+
+    def invalidate(self):
+        """
+        Drops the index, rebuilt on its next use
+        """
+        with self._lock:
+            self.version += 1
+            self._built = False
+
+    def build(self):
+        # sorted in Python, the order bisect expects whatever the database
+        # collation is
+        rows = sorted(Mineral.objects.values_list(*FACET_COLUMNS).iterator(),
+                      key=lambda row: (row[1], row[0]))
+        keys = []
+        pks = array('q')
+        values = []
+        positions = {facet: {} for facet in FACETS}
+        for position, row in enumerate(rows):
+            keys.append((row[1], row[0]))
+            pks.append(row[0])
+            mineral_values = facet_values(row)
+            values.append(mineral_values)
+            for facet, facet_values_set in mineral_values.items():
+                for value in facet_values_set:
+                    positions[facet].setdefault(value, []).append(position)
+
+        size = len(keys)
+        self._keys = keys
+        self._pks = pks
+        self._positions = {pk: position for position, pk in enumerate(pks)}
+        self._values = values
+        self._bits = {facet: {value: bitmap(value_positions, size)
+                              for value, value_positions in facet_map.items()}
+                      for facet, facet_map in positions.items()}
+        self._all = (1 << size) - 1
+        self._built = True
+
+    def ensure_built(self):
+        with self._lock:
+            if not self._built:
+                self.build()
+
+    def update(self, mineral):
+        """
+        Moves the bits of a saved mineral to its current facets values,
+        a new or renamed mineral invalidates the index instead
+        """
+        with self._lock:
+            if not self._built:
+                return
+            position = self._positions.get(mineral.pk)
+            if position is None or self._keys[position][0] != mineral.name:
+                self.version += 1
+                self._built = False
+                return
+
+            row = tuple(getattr(mineral, column) for column in FACET_COLUMNS)
+            bit = 1 << position
+            new_values = facet_values(row)
+            for facet, old in self._values[position].items():
+                facet_bits = self._bits[facet]
+                for value in old - new_values[facet]:
+                    facet_bits[value] &= ~bit
+                for value in new_values[facet] - old:
+                    facet_bits[value] = facet_bits.get(value, 0) | bit
+            self._values[position] = new_values
+            self.version += 1
+
+    def remove(self, pk):
+        with self._lock:
+            if not self._built:
+                return
+            position = self._positions.pop(pk, None)
+            if position is None:
+                return
+            bit = 1 << position
+            self._all &= ~bit
+            for facet, values in self._values[position].items():
+                for value in values:
+                    self._bits[facet][value] &= ~bit
+            self._values[position] = {facet: set() for facet in FACETS}
+            self.version += 1
+
+    def mask(self, selection, exclude=None):
+        """
+        :param selection: a dict of facets to their selected value
+        :param exclude: a facet whose selection is ignored
+        :return: The bitmap of the minerals having all the selected values
+        """
+        self.ensure_built()
+        bits = self._all
+        for facet, value in selection.items():
+            if facet != exclude:
+                bits &= self._bits[facet].get(value, 0)
+        return bits
+
+    def mask_of(self, pks):
+        """
+        :return: The bitmap of the indexed minerals among pks
+        """
+        self.ensure_built()
+        positions = self._positions
+        return bitmap((positions[pk] for pk in pks if pk in positions),
+                      len(self._keys)) & self._all
+
+    def counts(self, selection, within=None):
+        """
+        Counts the minerals of every facet value, given the selected values
+        of the other facets, so the counts show the alternatives as well
+        :param selection: a dict of facets to their selected value
+        :param within: an optional bitmap the counted minerals belong to
+        :return: A dict of every facet to a sorted list of (value, count)
+        of the values having minerals
+        """
+        self.ensure_built()
+        counts = {}
+        for facet in FACETS:
+            base = self.mask(selection, exclude=facet)
+            if within is not None:
+                base &= within
+            # a copy, saves may add values meanwhile
+            facet_bits = list(self._bits[facet].items())
+            facet_counts = ((value, popcount(base & bits))
+                            for value, bits in facet_bits)
+            counts[facet] = sorted((value, count)
+                                   for value, count in facet_counts if count)
+        return counts
+
+    def page(self, bits, size, after=None, before=None):
+        """
+        Gets a page of the minerals of a bitmap, in (name, pk) order,
+        following the after key or preceding the before key
+        :return: A (keys list, has_more) tuple of the (name, pk) keys of the
+        page minerals, has_more tells whether there are more minerals past
+        the page, in the paging direction
+        """
+        self.ensure_built()
+        keys = self._keys
+        found = []
+        if before is not None:
+            bits &= (1 << bisect.bisect_left(keys, before)) - 1
+            while bits and len(found) <= size:
+                position = bits.bit_length() - 1
+                found.append(keys[position])
+                bits ^= 1 << position
+            return found[:size][::-1], len(found) > size
+
+        start = bisect.bisect_right(keys, after) if after else 0
+        bits >>= start
+        while bits and len(found) <= size:
+            lowest = bits & -bits
+            found.append(keys[start + lowest.bit_length() - 1])
+            bits ^= lowest
+        return found[:size], len(found) > size
+
+    def count(self, bits):
+        return popcount(bits)
+
+
+facet_index = FacetIndex()
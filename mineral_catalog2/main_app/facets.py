@@ -0,0 +1,83 @@
+"""
+Facets registry, an in-process cache of the sidebar facets
+(categories and streaks slugs)
+"""
+import threading
+
+from .models import Mineral
+
+
+class FacetRegistry:
+    """
+    Builds the sorted slugs lists of all the registered attributes with a
+    single query on the denormalized slug columns and keeps them until the
+    catalog changes.
+    Every invalidation bumps the registry version, the facets are rebuilt
+    lazily on the next access.
+    """
+    attributes = ('category', 'streak')
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._facets = None
+        self.version = 0
+        self.hits = 0
+        self.misses = 0
+
+    def invalidate(self):
+        """
+        Drops the cached facets, called whenever a Mineral is written
+        """
+        with self._lock:
+            self.version += 1
+            self._facets = None
+
+    def get(self, attribute_name):
+        """
+        Gets the facet of the requested attribute_name
+        :param attribute_name: String representation of the attribute name
+        :return: A sorted list of the attribute distinct slugs
+        """
+        return self.all()[attribute_name]
+
+    def all(self):
+        """
+        Gets the facets of all registered attributes, building them if needed
+        :return: A dict of attribute name to its sorted slugs list
+        """
+        facets = self._facets
+        if facets is not None:
+            self.hits += 1
+            return facets
+
+        self.misses += 1
+        version = self.version
+        facets = self._build()
+        with self._lock:
+            # a write during the build makes the result stale already
+            if version == self.version:
+                self._facets = facets
+        return facets
+
+    def stats(self):
+        """
+        :return: A dict of the registry version and its hit/miss counters
+        """
+        return {'version': self.version,
+                'hits': self.hits,
+                'misses': self.misses}
+
+    def _build(self):
+        slug_fields = [attribute + '_slug' for attribute in self.attributes]
+        rows = Mineral.objects.values_list(*slug_fields).distinct()
+        slugs = {attribute: set() for attribute in self.attributes}
+        for row in rows:
+            for attribute, slug in zip(self.attributes, row):
+                slugs[attribute].add(slug)
+
+        # removing all duplicates, having a unique ordered list
+        return {attribute: sorted(values)
+                for attribute, values in slugs.items()}
+
+
+facet_registry = FacetRegistry()
@@ -0,0 +1,104 @@
+"""
+In-process cache of the rendered layout fragments, the sidebar facets
+lists and the letters bar.
+A fragment only changes with the facets and the selected item, each
+selection variant is rendered once per facets version and then served
+as is, the templates loops and url reversals don't run per response.
+"""
+import string
+import threading
+
+from django.template import Context
+from django.urls import get_script_prefix
+from django.utils.safestring import mark_safe
+
+from .facets import facet_registry
+
+LETTERS = string.ascii_lowercase
+
+# the facets registry attributes of the sidebars, to their list URL name
+SIDEBARS = {
+    'category': 'minerals:list_by_category',
+    'streak': 'minerals:list_by_streak',
+}
+
+
+class FragmentCache:
+    """
+    The rendered fragments by (name, selection), all dropped when the
+    facets registry version changes. Only the known selections are keys,
+    so there are at most a variant per facet slug and letter
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._fragments = {}
+        self._version = None
+        self.hits = 0
+        self.misses = 0
+
+    def clear(self):
+        with self._lock:
+            self._fragments = {}
+
+    def get(self, key, render):
+        """
+        :param key: a hashable key of the fragment and its selection
+        :param render: a function rendering the fragment, on a miss
+        :return: The rendered fragment, a safe string
+        """
+        # read before the facets, a write meanwhile bumps it again
+        version = facet_registry.version
+        key = (get_script_prefix(), key)
+        fragments = self._fragments
+        if self._version == version and key in fragments:
+            self.hits += 1
+            return fragments[key]
+
+        self.misses += 1
+        fragment = mark_safe(render())
+        with self._lock:
+            if self._version != version:
+                self._fragments = {}
+                self._version = version
+            self._fragments[key] = fragment
+        return fragment
+
+
+fragment_cache = FragmentCache()
+
+
+def sidebar(engine, attribute, selected):
+    """
+    :param engine: the template engine rendering the page
+    :param attribute: one of the SIDEBARS facets
+    :param selected: the selected slug, None if there is none
+    :return: The facet sidebar items, the selected one highlighted
+    """
+    # the unknown slugs of the URLs highlight nothing, they aren't cached
+    # variants of their own
+    if selected not in facet_registry.get(attribute):
+        selected = None
+
+    def render():
+        return engine.get_template('main_app/fragments/sidebar.html').render(
+            Context({'slugs': facet_registry.get(attribute),
+                     'url_name': SIDEBARS[attribute],
+                     'selected': selected}))
+    return fragment_cache.get(('sidebar', attribute, selected), render)
+
+
+def letter_bar(engine, selected):
+    """
+    :param engine: the template engine rendering the page
+    :param selected: the selected letter, None if there is none
+    :return: The letters bar, the selected letter highlighted
+    """
+    selected = (selected or '').lower()
+    if len(selected) != 1 or selected not in LETTERS:
+        selected = None
+
+    def render():
+        return engine.get_template('main_app/fragments/letters.html').render(
+            Context({'letters': LETTERS, 'selected': selected}))
+    return fragment_cache.get(('letters', selected), render)
@@ -0,0 +1,120 @@
+"""
+Mineral image variants: resized JPEG/WebP/AVIF derivatives of the source
+images, built by the build_image_variants command and listed in a
+manifest the detail page renders its srcset from
+"""
+import hashlib
+import json
+import os
+import threading
+
+from django.conf import settings
+from django.templatetags.static import static
+
+# static path prefixes of the source images and their variants
+SOURCE_PREFIX = 'data/images/'
+VARIANTS_PREFIX = 'data/variants/'
+
+# file extension and content type of every variant format
+FORMATS = {
+    'jpeg': ('jpg', 'image/jpeg'),
+    'webp': ('webp', 'image/webp'),
+    'avif': ('avif', 'image/avif'),
+}
+
+_manifest_lock = threading.Lock()
+_manifest = {'stat': None, 'entries': {}}
+
+
+def manifest_path():
+    return os.path.join(settings.MINERAL_IMAGE_VARIANTS_DIR, 'manifest.json')
+
+
+def load_manifest():
+    """
+    Gets the variants manifest, reloaded whenever the file changes
+    :return: A dict of the source image filename to its manifest entry
+    """
+    path = manifest_path()
+    try:
+        stat = (path, os.stat(path).st_mtime_ns)
+    except OSError:
+        return {}
+
+    with _manifest_lock:
+        if _manifest['stat'] != stat:
+            with open(path, encoding='utf-8') as manifest:
+                _manifest['entries'] = json.load(manifest)
+            _manifest['stat'] = stat
+        return _manifest['entries']
+
+
+def file_hash(path):
+    """
+    :return: The sha1 hex digest of the file content
+    """
+    digest = hashlib.sha1()
+    with open(path, 'rb') as source:
+        for chunk in iter(lambda: source.read(1 << 16), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def build_variants(source_path, output_dir, source_hash, widths, formats,
+                   quality):
+    """
+    Resizes a source image to each of the widths it is wider than (and to
+    its own width), saved in every format under content hashed names.
+    Runs in the build_image_variants worker processes.
+    :return: The manifest entry of the source image
+    """
+    from PIL import Image
+
+    stem = os.path.splitext(os.path.basename(source_path))[0]
+    with Image.open(source_path) as image:
+        image = image.convert('RGB')
+        width, height = image.size
+        variants = {image_format: [] for image_format in formats}
+        for target_width in sorted({w for w in widths if w < width} |
+                                   {width}):
+            target_height = max(1, round(height * target_width / width))
+            resized = image if target_width == width else image.resize(
+                (target_width, target_height), Image.LANCZOS)
+            for image_format in formats:
+                filename = '{}-{}-{}.{}'.format(
+                    stem, source_hash[:10], target_width,
+                    FORMATS[image_format][0])
+                resized.save(os.path.join(output_dir, filename),
+                             image_format.upper(), quality=quality)
+                variants[image_format].append(
+                    [target_width, VARIANTS_PREFIX + filename])
+
+    return {'source_hash': source_hash, 'width': width, 'height': height,
+            'variants': variants}
+
+
+def image_sources(image_filename):
+    """
+    Gets the img/picture attributes of a mineral image
+    :param image_filename: the Mineral.image_filename
+    :return: A dict of the fallback src, width and height, the sizes and a
+    list of the (content type, srcset) sources, the best format first;
+    no sources if the image has no variants
+    """
+    entry = load_manifest().get(image_filename)
+    image = {'src': static(SOURCE_PREFIX + image_filename),
+             'sizes': settings.MINERAL_IMAGE_SIZES,
+             'sources': []}
+    if entry is None:
+        return image
+
+    image['width'] = entry['width']
+    image['height'] = entry['height']
+    for image_format in ('avif', 'webp', 'jpeg'):
+        variants = entry['variants'].get(image_format)
+        if variants:
+            image['sources'].append((
+                FORMATS[image_format][1],
+                ', '.join('{} {}w'.format(static(path), width)
+                          for width, path in variants)))
+    return image
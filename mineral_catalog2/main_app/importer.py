@@ -0,0 +1,200 @@
+"""
+Catalog importer, streams minerals records out of a JSON array file
+and inserts them in batches
+"""
+import json
+import time
+
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+from django.utils import timezone
+
+from .models import Mineral, derived_values, detail_snapshot
+from .parsing import ELEMENT_SYMBOLS, formula_elements, measured_ranges
+from .signals import catalog_changed
+
+
+def iter_json_array(stream, chunk_size=1 << 16):
+    """
+    Parses a JSON array incrementally, reading chunk_size characters at a
+    time, so only a single item is held in memory
+    :param stream: a text file object of a JSON array
+    :param chunk_size: number of characters read at a time
+    :return: A generator of the array items
+    """
+    decoder = json.JSONDecoder()
+    buffer = ''
+    position = 0
+    eof = False
+    started = False
+
+    while True:
+        if position == len(buffer):
+            if eof:
+                raise ValueError('Unexpected end of the JSON array')
+            buffer = stream.read(chunk_size)
+            position = 0
+            eof = not buffer
+            continue
+
+        char = buffer[position]
+        if char.isspace() or (started and char == ','):
+            position += 1
+            continue
+        if not started:
+            if char != '[':
+                raise ValueError('Expecting a JSON array')
+            started = True
+            position += 1
+            continue
+        if char == ']':
+            return
+
+        try:
+            item, end = decoder.raw_decode(buffer, position)
+        except json.JSONDecodeError:
+            if eof:
+                raise
+            end = None
+        # an item reaching the buffer end may be a truncated number
+        if end is None or (end == len(buffer) and not eof):
+            chunk = stream.read(chunk_size)
+            eof = not chunk
+            buffer = buffer[position:] + chunk
+            position = 0
+            continue
+
+        yield item
+        position = end
+
+
+def batched(items, batch_size):
+    """
+    :return: A generator of lists of up to batch_size items
+    """
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) == batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def build_mineral(model, record, field_names):
+    """
+    Builds an unsaved model object out of a record, setting its derived
+    values as Mineral.save() would, for the fields the model has
+    (historical migration models lack the later fields).
+    """
+    mineral = model(**record)
+    values = derived_values(mineral.name, mineral.category, mineral.streak)
+    values.update(measured_ranges(mineral))
+    values['detail_snapshot'] = detail_snapshot(mineral)
+    # bulk_update doesn't apply auto_now
+    values['updated_at'] = timezone.now()
+    for field_name, value in values.items():
+        if field_name in field_names:
+            setattr(mineral, field_name, value)
+    return mineral
+
+
+def existing_pks(objects, names):
+    """
+    Looks the names up in as many queries as the database bound parameters
+    limit takes, SQLite binding at most 999 until 3.32
+    :param objects: the minerals manager of the written database
+    :return: A dict of the existing names to their pks
+    """
+    chunk_size = connections[objects.db].ops.bulk_batch_size(['name'],
+                                                              names)
+    existing = {}
+    for offset in range(0, len(names), chunk_size):
+        existing.update(objects.filter(
+            name__in=names[offset:offset + chunk_size])
+            .values_list('name', 'pk'))
+    return existing
+
+
+def import_minerals(records, model=Mineral, batch_size=1000, upsert=False,
+                    using=DEFAULT_DB_ALIAS):
+    """
+    Inserts the minerals records with bulk_create, batch_size records at a
+    time, all inside a single transaction
+    :param records: an iterable of minerals records dicts
+    :param model: the Mineral model, a migration passes its historical one
+    :param batch_size: number of records inserted per query
+    :param upsert: update the existing minerals having the same name
+    instead of inserting duplicates
+    :param using: the database alias written, a migration passes its own
+    :return: A dict of the created and updated counts and the seconds taken
+    """
+    field_names = {field.attname for field in model._meta.concrete_fields}
+    created = updated = 0
+    start = time.perf_counter()
+
+    objects = model.objects.db_manager(using)
+    with transaction.atomic(using=using):
+        for batch in batched(records, batch_size):
+            minerals = [build_mineral(model, record, field_names)
+                        for record in batch]
+            if upsert:
+                existing = existing_pks(objects, [mineral.name
+                                                  for mineral in minerals])
+                for mineral in minerals:
+                    mineral.pk = existing.get(mineral.name)
+                to_update = [mineral for mineral in minerals if mineral.pk]
+                minerals = [mineral for mineral in minerals
+                            if not mineral.pk]
+                if to_update:
+                    # the similar minerals are only computed offline
+                    objects.bulk_update(
+                        to_update,
+                        [name for name in field_names
+                         if name not in ('id', 'similar_minerals')])
+                    updated += len(to_update)
+            objects.bulk_create(minerals)
+            created += len(minerals)
+
+        # bulk_create doesn't return the SQLite pks, the elements are
+        # indexed afterwards
+        index_formula_elements(model, batch_size=batch_size, using=using)
+
+    # bulk operations don't send the Mineral save signals
+    catalog_changed.send(sender=model)
+
+    return {'created': created,
+            'updated': updated,
+            'seconds': time.perf_counter() - start}
+
+
+def index_formula_elements(model=Mineral, batch_size=1000,
+                           using=DEFAULT_DB_ALIAS):
+    """
+    Rebuilds the elements of all the minerals formulas, creating the
+    elements table rows first
+    :param model: the Mineral model, a migration passes its historical one
+    (the models preceding the elements are skipped)
+    :param batch_size: number of rows inserted per query
+    :param using: the database alias written
+    """
+    if not any(field.name == 'elements'
+               for field in model._meta.many_to_many):
+        return
+    through = model.elements.through
+    element = model.elements.rel.model
+    element.objects.db_manager(using).bulk_create(
+        [element(number=number, symbol=symbol)
+         for number, symbol in enumerate(ELEMENT_SYMBOLS, 1)],
+        ignore_conflicts=True)
+
+    objects = through.objects.db_manager(using)
+    with transaction.atomic(using=using):
+        objects.all().delete()
+        rows = model.objects.db_manager(using).values_list(
+            'pk', 'formula').iterator()
+        links = (through(mineral_id=pk, element_id=number)
+                 for pk, formula in rows
+                 for number in formula_elements(formula))
+        for batch in batched(links, batch_size):
+            objects.bulk_create(batch)
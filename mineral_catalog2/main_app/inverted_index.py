@@ -0,0 +1,217 @@
+"""
+In-memory inverted index over all the searchable Mineral fields,
+a search backend for databases without a full text search index.
+"""
+import math
+import sys
+import threading
+from array import array
+from bisect import bisect_left, insort
+
+from .models import Mineral
+from .search import SEARCH_FIELDS, SearchBackend, tokenize
+
+
+def trigrams(token):
+    """
+    :return: A set of the trigrams of the padded token
+    """
+    padded = '  {} '.format(token)
+    return {padded[index:index + 3] for index in range(len(padded) - 2)}
+
+
+class InvertedIndex:
+    """
+    Maps every token to a sorted array of the pks of the minerals having it.
+    Tokens are interned and kept in a sorted vocabulary for prefix lookups,
+    a trigram index over the vocabulary serves typo tolerant lookups.
+    """
+    name_weight = 10.0
+    # minimal trigram Jaccard similarity of a fuzzy matching token
+    similarity_threshold = 0.3
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self.is_built = False
+        self._clear()
+
+    def _clear(self):
+        self._postings = {}
+        self._name_postings = {}
+        self._documents = {}
+        self._vocabulary = []
+        self._trigrams = {}
+
+    def build(self):
+        """
+        (Re)builds the whole index with a single query
+        """
+        rows = Mineral.objects.values_list('pk', *SEARCH_FIELDS) \
+            .order_by('pk').iterator()
+        with self._lock:
+            self._clear()
+            # rows come in pk order, postings are appended already sorted
+            # and the vocabulary is sorted once at the end
+            for pk, name, *fields in rows:
+                self._add(pk, name, fields, append=True)
+            self._vocabulary = sorted(self._postings)
+            self.is_built = True
+
+    def invalidate(self):
+        """
+        Drops the whole index, rebuilt on the next search
+        """
+        with self._lock:
+            self.is_built = False
+            self._clear()
+
+    def ensure_built(self):
+        if not self.is_built:
+            self.build()
+
+    def update(self, mineral):
+        """
+        Re-indexes a saved mineral, a no-op until the index is built
+        """
+        with self._lock:
+            if self.is_built:
+                self._remove(mineral.pk)
+                self._add(mineral.pk, mineral.name,
+                          [getattr(mineral, field)
+                           for field in SEARCH_FIELDS[1:]])
+
+    def remove(self, pk):
+        """
+        Drops a deleted mineral, a no-op until the index is built
+        """
+        with self._lock:
+            if self.is_built:
+                self._remove(pk)
+
+    def _add(self, pk, name, fields, append=False):
+        name_tokens = {sys.intern(token) for token in tokenize(name)}
+        tokens = set(name_tokens)
+        for value in fields:
+            tokens.update(sys.intern(token) for token in tokenize(value))
+
+        for token in tokens:
+            postings = self._postings.get(token)
+            if postings is None:
+                postings = self._postings[token] = array('q')
+                if not append:
+                    insort(self._vocabulary, token)
+                for trigram in trigrams(token):
+                    self._trigrams.setdefault(trigram, set()).add(token)
+            if append:
+                postings.append(pk)
+            else:
+                insort(postings, pk)
+        for token in name_tokens:
+            postings = self._name_postings.setdefault(token, array('q'))
+            if append:
+                postings.append(pk)
+            else:
+                insort(postings, pk)
+        self._documents[pk] = tuple(tokens)
+
+    def _remove(self, pk):
+        for token in self._documents.pop(pk, ()):
+            self._discard(self._name_postings, token, pk)
+            if not self._discard(self._postings, token, pk):
+                del self._vocabulary[bisect_left(self._vocabulary, token)]
+                for trigram in trigrams(token):
+                    tokens = self._trigrams[trigram]
+                    tokens.discard(token)
+                    if not tokens:
+                        del self._trigrams[trigram]
+
+    @staticmethod
+    def _discard(postings_map, token, pk):
+        """
+        :return: The number of postings left for the token
+        """
+        postings = postings_map.get(token)
+        if postings is None:
+            return 0
+        index = bisect_left(postings, pk)
+        if index < len(postings) and postings[index] == pk:
+            del postings[index]
+        if not postings:
+            del postings_map[token]
+        return len(postings)
+
+    def expand(self, query_token):
+        """
+        Gets the vocabulary tokens a query token matches: the tokens it
+        prefixes, otherwise the tokens similar enough by their trigrams
+        :return: A list of tokens
+        """
+        start = bisect_left(self._vocabulary, query_token)
+        end = bisect_left(self._vocabulary, query_token + '\uffff')
+        if start < end:
+            return self._vocabulary[start:end]
+
+        query_trigrams = trigrams(query_token)
+        shared = {}
+        for trigram in query_trigrams:
+            for token in self._trigrams.get(trigram, ()):
+                shared[token] = shared.get(token, 0) + 1
+        return [
+            token for token, count in shared.items()
+            if count / (len(query_trigrams) + len(trigrams(token)) - count)
+            >= self.similarity_threshold
+        ]
+
+    def search(self, term, limit=None):
+        """
+        Matches minerals having every word of the term, scoring each
+        matched token by its inverse document frequency
+        :param limit: maximal number of pks to return, None for all of them
+        :return: A list of pks ordered by score, None if the term has no words
+        """
+        query_tokens = tokenize(term)
+        if not query_tokens:
+            return None
+
+        with self._lock:
+            documents_count = len(self._documents) or 1
+            scores = None
+            for query_token in query_tokens:
+                token_scores = {}
+                for token in self.expand(query_token):
+                    postings = self._postings[token]
+                    idf = math.log(1 + documents_count / len(postings))
+                    for pk in postings:
+                        token_scores[pk] = token_scores.get(pk, 0) + idf
+                    for pk in self._name_postings.get(token, ()):
+                        token_scores[pk] += idf * (self.name_weight - 1)
+
+                if scores is None:
+                    scores = token_scores
+                else:
+                    scores = {pk: score + token_scores[pk]
+                              for pk, score in scores.items()
+                              if pk in token_scores}
+                if not scores:
+                    return []
+
+        return sorted(scores, key=lambda pk: (-scores[pk], pk))[:limit]
+
+
+inverted_index = InvertedIndex()
+
+
+class InvertedIndexSearchBackend(SearchBackend):
+    """
+    Searches the in-memory inverted index, built on the first search and
+    updated by the Mineral signals afterwards.
+    Set settings.MINERAL_SEARCH_BACKEND to
+    'main_app.inverted_index.InvertedIndexSearchBackend' to use it.
+    """
+
+    def __init__(self, index=inverted_index):
+        self.index = index
+
+    def search(self, term, limit=None):
+        self.index.ensure_built()
+        return self.index.search(term, limit)
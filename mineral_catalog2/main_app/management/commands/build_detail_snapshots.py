@@ -0,0 +1,49 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from main_app.models import DETAIL_ATTRIBUTES, Mineral, detail_snapshot
+from main_app.signals import catalog_changed
+
+
+class Command(BaseCommand):
+    help = 'Rebuilds the detail page snapshots of all the minerals, ' \
+           'writing only the changed ones'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=1000,
+            help='number of minerals read and updated per query')
+
+    def handle(self, *args, **options):
+        start = time.perf_counter()
+        rebuilt = unchanged = 0
+        minerals = Mineral.objects.order_by('pk').only(
+            'detail_snapshot', 'image_caption', *DETAIL_ATTRIBUTES)
+        last_pk = 0
+        with transaction.atomic():
+            while True:
+                # seeking by pk, each batch is read before it is written
+                batch = list(minerals.filter(pk__gt=last_pk)
+                             [:options['batch_size']])
+                if not batch:
+                    break
+                last_pk = batch[-1].pk
+                changed = []
+                for mineral in batch:
+                    snapshot = detail_snapshot(mineral)
+                    if snapshot != mineral.detail_snapshot:
+                        mineral.detail_snapshot = snapshot
+                        changed.append(mineral)
+                if changed:
+                    Mineral.objects.bulk_update(changed, ['detail_snapshot'])
+                rebuilt += len(changed)
+                unchanged += len(batch) - len(changed)
+
+        if rebuilt:
+            # bulk_update doesn't send the Mineral save signals
+            catalog_changed.send(sender=Mineral)
+        self.stdout.write(self.style.SUCCESS(
+            '{} snapshots rebuilt, {} unchanged in {:.2f}s'.format(
+                rebuilt, unchanged, time.perf_counter() - start)))
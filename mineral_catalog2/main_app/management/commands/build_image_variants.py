@@ -0,0 +1,145 @@
+import json
+import os
+import unicodedata
+from concurrent.futures import ProcessPoolExecutor
+
+from django.conf import settings
+from django.contrib.staticfiles import finders
+from django.core.management.base import BaseCommand, CommandError
+
+from main_app.images import (FORMATS, SOURCE_PREFIX, VARIANTS_PREFIX,
+                             build_variants, file_hash, load_manifest,
+                             manifest_path)
+from main_app.models import Mineral
+
+
+def comma_separated(value):
+    return [item.strip() for item in value.split(',') if item.strip()]
+
+
+class Command(BaseCommand):
+    help = 'Builds the resized and WebP/AVIF variants of the minerals ' \
+           'images, rebuilding only the changed source images'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--widths', type=comma_separated, default=['120', '240', '480'],
+            help='comma separated widths, images are never upscaled')
+        parser.add_argument(
+            '--formats', type=comma_separated, default=['jpeg', 'webp'],
+            help='comma separated formats out of {}'.format(
+                ', '.join(FORMATS)))
+        parser.add_argument('--quality', type=int, default=80)
+        parser.add_argument(
+            '--workers', type=int, default=None,
+            help='number of worker processes, the CPUs count by default')
+        parser.add_argument(
+            '--force', action='store_true',
+            help='rebuild the unchanged images as well')
+
+    def handle(self, *args, **options):
+        try:
+            from PIL import features
+        except ImportError:
+            raise CommandError('Building image variants requires Pillow')
+
+        formats = options['formats']
+        for image_format in formats:
+            if image_format not in FORMATS:
+                raise CommandError('Unknown format: ' + image_format)
+            if image_format != 'jpeg' and not features.check(image_format):
+                raise CommandError(
+                    'Pillow was built without {} support'.format(
+                        image_format))
+        widths = sorted(int(width) for width in options['widths'])
+        build_options = {'widths': widths, 'formats': formats,
+                         'quality': options['quality']}
+
+        output_dir = settings.MINERAL_IMAGE_VARIANTS_DIR
+        os.makedirs(output_dir, exist_ok=True)
+        old_manifest = load_manifest()
+        manifest = {}
+        jobs = {}
+
+        filenames = Mineral.objects.values_list('image_filename', flat=True) \
+            .distinct().order_by('image_filename')
+        for filename in filenames:
+            source_path = self.find_source(filename)
+            if source_path is None:
+                self.stderr.write('Missing image: {}'.format(filename))
+                continue
+
+            source_hash = file_hash(source_path)
+            entry = old_manifest.get(filename)
+            if (not options['force'] and entry and
+                    entry['source_hash'] == source_hash and
+                    entry.get('options') == build_options and
+                    self.variants_exist(entry)):
+                manifest[filename] = entry
+            else:
+                jobs[filename] = (source_path, source_hash)
+
+        with ProcessPoolExecutor(options['workers']) as executor:
+            futures = {
+                filename: executor.submit(
+                    build_variants, source_path, output_dir, source_hash,
+                    widths, formats, options['quality'])
+                for filename, (source_path, source_hash) in jobs.items()
+            }
+            for filename, future in futures.items():
+                manifest[filename] = dict(future.result(),
+                                          options=build_options)
+
+        self.write_manifest(manifest)
+        removed = self.remove_stale_variants(old_manifest, manifest)
+        self.stdout.write(self.style.SUCCESS(
+            '{} images built, {} unchanged, {} stale variants removed'
+            .format(len(jobs), len(manifest) - len(jobs), removed)))
+
+    @staticmethod
+    def find_source(filename):
+        """
+        Finds the source image in the static files, some of the images
+        files are named in the decomposed unicode form
+        :return: The source image path, None if not found
+        """
+        if not filename:
+            return None
+        for form in ('NFC', 'NFD'):
+            source_path = finders.find(
+                SOURCE_PREFIX + unicodedata.normalize(form, filename))
+            if source_path is not None:
+                return source_path
+        return None
+
+    @staticmethod
+    def variant_paths(entry):
+        output_dir = settings.MINERAL_IMAGE_VARIANTS_DIR
+        return {
+            os.path.join(output_dir, path[len(VARIANTS_PREFIX):])
+            for variants in entry['variants'].values()
+            for _, path in variants
+        }
+
+    def variants_exist(self, entry):
+        return all(os.path.exists(path) for path in self.variant_paths(entry))
+
+    def remove_stale_variants(self, old_manifest, manifest):
+        kept = set()
+        for entry in manifest.values():
+            kept |= self.variant_paths(entry)
+        removed = 0
+        for entry in old_manifest.values():
+            for path in self.variant_paths(entry) - kept:
+                if os.path.exists(path):
+                    os.remove(path)
+                    removed += 1
+        return removed
+
+    @staticmethod
+    def write_manifest(manifest):
+        # written aside and renamed, readers never see a partial manifest
+        path = manifest_path()
+        with open(path + '.tmp', 'w', encoding='utf-8') as output:
+            json.dump(manifest, output, indent=1, sort_keys=True)
+        os.replace(path + '.tmp', path)
@@ -0,0 +1,61 @@
+import os
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from main_app.models import Mineral
+from main_app.signals import catalog_changed
+from main_app.similarity import FEATURE_FIELDS, feature_vectors, \
+    nearest_neighbours, numpy, similar_minerals_json
+
+
+class Command(BaseCommand):
+    help = 'Computes the most similar minerals of every mineral, writing ' \
+           'only the changed lists'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--limit', type=int, default=settings.MINERAL_SIMILAR_LIMIT,
+            help='number of similar minerals per mineral')
+        parser.add_argument(
+            '--workers', type=int, default=os.cpu_count() or 1,
+            help='number of processes scoring the minerals')
+        parser.add_argument(
+            '--batch-size', type=int, default=256,
+            help='number of minerals scored against the catalog at a time')
+
+    def handle(self, *args, **options):
+        if numpy is None:
+            self.stderr.write(self.style.WARNING(
+                'NumPy is not installed, scoring the minerals in pure '
+                'Python, a large catalog takes a long time'))
+        start = time.perf_counter()
+        minerals = list(Mineral.objects.order_by('pk').values(
+            'pk', 'name', 'similar_minerals', *FEATURE_FIELDS))
+        columns, vectors = feature_vectors(minerals)
+        neighbours = nearest_neighbours(
+            columns, vectors, options['limit'], workers=options['workers'],
+            batch_size=options['batch_size'])
+
+        changed = []
+        for mineral, similar in zip(minerals, neighbours):
+            similar_minerals = similar_minerals_json(
+                (minerals[index]['pk'], minerals[index]['name'])
+                for index, _ in similar)
+            if similar_minerals != mineral['similar_minerals']:
+                changed.append(Mineral(pk=mineral['pk'],
+                                       similar_minerals=similar_minerals))
+        with transaction.atomic():
+            Mineral.objects.bulk_update(changed, ['similar_minerals'],
+                                        batch_size=1000)
+
+        if changed:
+            # bulk_update doesn't send the Mineral save signals
+            catalog_changed.send(sender=Mineral)
+        self.stdout.write(self.style.SUCCESS(
+            '{} similar lists rebuilt, {} unchanged in {:.2f}s ({})'.format(
+                len(changed), len(minerals) - len(changed),
+                time.perf_counter() - start,
+                'numpy' if numpy is not None else 'pure python')))
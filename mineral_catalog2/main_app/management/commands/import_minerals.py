@@ -0,0 +1,40 @@
+import os
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from main_app.importer import import_minerals, iter_json_array
+
+
+class Command(BaseCommand):
+    help = 'Imports minerals out of a JSON array file, streaming it ' \
+           'and inserting the minerals in batches'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'path', nargs='?',
+            default=os.path.join(settings.BASE_DIR,
+                                 'assets/data/minerals.json'),
+            help='JSON array file of minerals records')
+        parser.add_argument(
+            '--batch-size', type=int, default=1000,
+            help='number of minerals inserted per query')
+        parser.add_argument(
+            '--upsert', action='store_true',
+            help='update the existing minerals having the same name')
+
+    def handle(self, *args, **options):
+        try:
+            with open(options['path'], encoding='utf-8') as data:
+                stats = import_minerals(iter_json_array(data),
+                                        batch_size=options['batch_size'],
+                                        upsert=options['upsert'])
+        except (OSError, ValueError, TypeError) as e:
+            raise CommandError(
+                "Error in input file: {}\n{}".format(options['path'], e))
+
+        total = stats['created'] + stats['updated']
+        self.stdout.write(self.style.SUCCESS(
+            '{} created, {} updated in {:.2f}s ({:.0f} minerals/s)'.format(
+                stats['created'], stats['updated'], stats['seconds'],
+                total / stats['seconds'] if stats['seconds'] else total)))
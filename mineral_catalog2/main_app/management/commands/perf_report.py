@@ -0,0 +1,55 @@
+import json
+
+from django.core.management.base import BaseCommand
+
+from main_app.perf import PERCENTILES, clear_stats, load_stats
+
+
+class Command(BaseCommand):
+    help = 'Reports the per view percentiles recorded by PerfMiddleware ' \
+           'in every server process'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--json', action='store_true',
+            help='output the full summary as JSON')
+        parser.add_argument(
+            '--reset', action='store_true',
+            help='remove the recorded snapshots after reporting')
+
+    def handle(self, *args, **options):
+        stats = load_stats()
+        summary = {view_name: view_stats.summary()
+                   for view_name, view_stats in sorted(stats.items())}
+
+        if options['json']:
+            self.stdout.write(json.dumps(summary, indent=2))
+        elif not summary:
+            self.stdout.write('No requests recorded')
+        else:
+            self.write_table(summary)
+
+        if options['reset']:
+            clear_stats()
+
+    def write_table(self, summary):
+        columns = ['p{}'.format(percent) for percent in PERCENTILES] + ['max']
+        header = '{:<28} {:<15} {:>7} '.format('view', 'metric', 'count') + \
+            ' '.join('{:>10}'.format(column) for column in columns)
+        self.stdout.write(header)
+        for view_name, view_summary in summary.items():
+            for metric in ('wall_ms', 'queries', 'query_ms', 'template_ms',
+                           'response_bytes'):
+                if metric not in view_summary:
+                    continue
+                values = view_summary[metric]
+                self.stdout.write(
+                    '{:<28} {:<15} {:>7} '.format(
+                        view_name, metric, values['count']) +
+                    ' '.join('{:>10}'.format(values[column])
+                             for column in columns))
+            for flag in ('duplicates', 'n_plus_one'):
+                for sql, times in view_summary[flag].items():
+                    self.stdout.write(self.style.WARNING(
+                        '{:<28} {} x{}: {}'.format(view_name, flag, times,
+                                                   sql)))
@@ -0,0 +1,101 @@
+from django.db import migrations
+
+# a frozen copy of the search index of main_app.search at this migration,
+# later changes of the index need a migration of their own
+SEARCH_FIELDS = (
+    'name',
+    'image_caption',
+    'category',
+    'formula',
+    'strunz_classification',
+    'color',
+    'crystal_system',
+    'unit_cell',
+    'crystal_symmetry',
+    'cleavage',
+    'mohs_scale_hardness',
+    'luster',
+    'streak',
+    'diaphaneity',
+    'optical_properties',
+    'refractive_index',
+    'crystal_habit',
+    'specific_gravity',
+    'group',
+)
+
+TABLE = 'main_app_mineral'
+FTS_TABLE = 'main_app_mineral_fts'
+FTS_TRIGGERS = ('main_app_mineral_fts_insert',
+                'main_app_mineral_fts_delete',
+                'main_app_mineral_fts_update')
+POSTGRES_INDEX = 'main_app_mineral_search_idx'
+POSTGRES_DOCUMENT = "to_tsvector('simple', {})".format(
+    " || ' ' || ".join('"{}"'.format(field) for field in SEARCH_FIELDS)
+)
+
+
+def install_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'postgresql':
+        schema_editor.execute(
+            'CREATE INDEX IF NOT EXISTS {index} ON {table} '
+            'USING GIN (({document}))'.format(
+                index=POSTGRES_INDEX, table=TABLE,
+                document=POSTGRES_DOCUMENT))
+    if vendor != 'sqlite':
+        return
+
+    columns = ', '.join('"{}"'.format(field) for field in SEARCH_FIELDS)
+    new_values = ', '.join('new."{}"'.format(field) for field in SEARCH_FIELDS)
+    old_values = ', '.join('old."{}"'.format(field) for field in SEARCH_FIELDS)
+    delete_old = (
+        "INSERT INTO {fts}({fts}, rowid, {columns}) "
+        "VALUES ('delete', old.id, {old_values});"
+    )
+    insert_new = (
+        "INSERT INTO {fts}(rowid, {columns}) "
+        "VALUES (new.id, {new_values});"
+    )
+    statements = [
+        "CREATE VIRTUAL TABLE IF NOT EXISTS {fts} USING fts5("
+        "{columns}, content='{table}', content_rowid='id', "
+        "tokenize='unicode61 remove_diacritics 2', prefix='1 2 3')",
+        "CREATE TRIGGER IF NOT EXISTS {fts}_insert "
+        "AFTER INSERT ON {table} BEGIN " + insert_new + " END",
+        "CREATE TRIGGER IF NOT EXISTS {fts}_delete "
+        "AFTER DELETE ON {table} BEGIN " + delete_old + " END",
+        "CREATE TRIGGER IF NOT EXISTS {fts}_update "
+        "AFTER UPDATE ON {table} BEGIN " + delete_old + insert_new + " END",
+        "INSERT INTO {fts}({fts}) VALUES ('rebuild')",
+    ]
+    for statement in statements:
+        schema_editor.execute(statement.format(
+            fts=FTS_TABLE, table=TABLE, columns=columns,
+            new_values=new_values, old_values=old_values))
+
+
+def uninstall_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'postgresql':
+        schema_editor.execute(
+            'DROP INDEX IF EXISTS {}'.format(POSTGRES_INDEX))
+    elif vendor == 'sqlite':
+        for trigger in FTS_TRIGGERS:
+            schema_editor.execute('DROP TRIGGER IF EXISTS {}'.format(trigger))
+        schema_editor.execute('DROP TABLE IF EXISTS {}'.format(FTS_TABLE))
+
+
+class Migration(migrations.Migration):
+    """
+    Creates the search index of the database vendor: an FTS5 table kept
+    in sync by triggers on SQLite, a GIN expression index on PostgreSQL
+    """
+
+    dependencies = [
+        ('main_app', '0002_auto_20190610_1807'),
+    ]
+
+    operations = [
+        migrations.RunPython(install_search_index, uninstall_search_index),
+    ]
@@ -0,0 +1,59 @@
+# Generated by Django 2.2.5 on 2026-10-18 15:27
+
+from django.db import migrations, models
+from django.template.defaultfilters import slugify
+
+DERIVED_FIELDS = ['category_slug', 'streak_slug', 'name_initial']
+
+
+def derived_values(name, category, streak):
+    """
+    A frozen copy of main_app.models.derived_values at this migration
+    """
+    return {
+        'category_slug': slugify(category),
+        'streak_slug': slugify(streak),
+        'name_initial': name[:1].lower(),
+    }
+
+
+def backfill_derived_values(apps, schema_editor):
+    Mineral = apps.get_model('main_app', 'Mineral')
+    objects = Mineral.objects.db_manager(schema_editor.connection.alias)
+    minerals = list(objects.only('name', 'category', 'streak'))
+    for mineral in minerals:
+        for field_name, value in derived_values(mineral.name,
+                                                mineral.category,
+                                                mineral.streak).items():
+            setattr(mineral, field_name, value)
+    objects.bulk_update(minerals, DERIVED_FIELDS, batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main_app', '0003_mineral_search_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='mineral',
+            name='category_slug',
+            field=models.SlugField(default='', editable=False, max_length=255),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name='mineral',
+            name='name_initial',
+            field=models.CharField(db_index=True, default='', editable=False, max_length=1),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name='mineral',
+            name='streak_slug',
+            field=models.SlugField(default='', editable=False, max_length=255),
+            preserve_default=False,
+        ),
+        migrations.RunPython(backfill_derived_values,
+                             migrations.RunPython.noop),
+    ]
@@ -0,0 +1,45 @@
+# Generated by Django 2.2.5 on 2026-10-18 15:28
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main_app', '0004_mineral_slugs'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='mineral',
+            name='category_slug',
+            field=models.SlugField(db_index=False, editable=False, max_length=255),
+        ),
+        migrations.AlterField(
+            model_name='mineral',
+            name='name',
+            field=models.CharField(db_index=True, max_length=255),
+        ),
+        migrations.AlterField(
+            model_name='mineral',
+            name='name_initial',
+            field=models.CharField(editable=False, max_length=1),
+        ),
+        migrations.AlterField(
+            model_name='mineral',
+            name='streak_slug',
+            field=models.SlugField(db_index=False, editable=False, max_length=255),
+        ),
+        migrations.AddIndex(
+            model_name='mineral',
+            index=models.Index(fields=['category_slug', 'name'], name='main_app_mi_categor_fffe00_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='mineral',
+            index=models.Index(fields=['streak_slug', 'name'], name='main_app_mi_streak__574b58_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='mineral',
+            index=models.Index(fields=['name_initial', 'name'], name='main_app_mi_name_in_c7b217_idx'),
+        ),
+    ]
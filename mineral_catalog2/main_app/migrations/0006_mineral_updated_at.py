@@ -0,0 +1,18 @@
+# Generated by Django 2.2.5 on 2026-10-18 15:37
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main_app', '0005_browse_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='mineral',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, db_index=True),
+        ),
+    ]
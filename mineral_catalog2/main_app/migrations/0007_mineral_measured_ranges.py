@@ -0,0 +1,118 @@
+# Generated by Django 2.2.5 on 2026-10-18 15:58
+
+import re
+
+from django.db import migrations, models
+
+# a frozen copy of the main_app.parsing measured ranges at this migration,
+# the parser may change, the backfill must not
+NUMBER_RE = re.compile(r'\d+(?:\.\d+)?½?|½')
+
+# units, angles (2V = 37°), uncertainties such as '1.818(3)' or
+# '(+/- .030)' and crystal planes, whose numbers aren't property values
+NOISE_RE = re.compile(r'g\s*/\s*cm\S*|\b2V\b|\d+(?:\.\d+)?\s*°|\(\d+\)'
+                      r'|\(\s*[+\-±][^)]*\)|\{[^}]*\}')
+
+# the measured property field: (range fields prefix, min and max plausible
+# values), numbers outside of the plausible values are something else
+MEASURED_PROPERTIES = {
+    'mohs_scale_hardness': ('hardness', 0.0, 10.0),
+    'specific_gravity': ('specific_gravity', 0.5, 25.0),
+    'refractive_index': ('refractive_index', 1.0, 3.5),
+}
+
+
+def parse_number(text):
+    """
+    :return: The float value of a number token, '½' is a half
+    """
+    if text.endswith('½'):
+        return float(text[:-1] or 0) + 0.5
+    return float(text)
+
+
+def parse_range(text, low, high):
+    """
+    Extracts the range of the numbers in text
+    :param text: a free text measure, e.g. '6.8–7.1 (measured)'
+    :param low: the minimal plausible value
+    :param high: the maximal plausible value
+    :return: A (min, max) tuple of floats, (None, None) if text has no
+    plausible number
+    """
+    values = [value for value in map(parse_number,
+                                     NUMBER_RE.findall(
+                                         NOISE_RE.sub(' ', text or '')))
+              if low <= value <= high]
+    if not values:
+        return None, None
+    return min(values), max(values)
+
+
+def measured_ranges(mineral):
+    """
+    Parses the measured properties of a mineral
+    :param mineral: a Mineral object, or any object having its fields
+    :return: A dict of the numeric range field names and values
+    """
+    ranges = {}
+    for field_name, (prefix, low, high) in MEASURED_PROPERTIES.items():
+        ranges[prefix + '_min'], ranges[prefix + '_max'] = parse_range(
+            getattr(mineral, field_name), low, high)
+    return ranges
+
+
+def backfill_measured_ranges(apps, schema_editor):
+    Mineral = apps.get_model('main_app', 'Mineral')
+    objects = Mineral.objects.db_manager(schema_editor.connection.alias)
+    minerals = list(objects.only(*MEASURED_PROPERTIES))
+    range_fields = set()
+    for mineral in minerals:
+        ranges = measured_ranges(mineral)
+        range_fields.update(ranges)
+        for field_name, value in ranges.items():
+            setattr(mineral, field_name, value)
+    if minerals:
+        objects.bulk_update(minerals, sorted(range_fields), batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main_app', '0006_mineral_updated_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='mineral',
+            name='hardness_max',
+            field=models.FloatField(db_index=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='mineral',
+            name='hardness_min',
+            field=models.FloatField(db_index=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='mineral',
+            name='refractive_index_max',
+            field=models.FloatField(db_index=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='mineral',
+            name='refractive_index_min',
+            field=models.FloatField(db_index=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='mineral',
+            name='specific_gravity_max',
+            field=models.FloatField(db_index=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='mineral',
+            name='specific_gravity_min',
+            field=models.FloatField(db_index=True, editable=False, null=True),
+        ),
+        migrations.RunPython(backfill_measured_ranges,
+                             migrations.RunPython.noop),
+    ]
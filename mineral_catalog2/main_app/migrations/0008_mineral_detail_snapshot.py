@@ -0,0 +1,63 @@
+# Generated by Django 2.2.5 on 2026-10-18 16:09
+
+import json
+
+from django.db import migrations, models
+from django.template.defaultfilters import title
+
+# a frozen copy of the main_app.models detail snapshot at this migration
+DETAIL_ATTRIBUTES = (
+    'category',
+    'group',
+    'formula',
+    'strunz_classification',
+    'crystal_system',
+    'mohs_scale_hardness',
+    'luster',
+    'color',
+    'specific_gravity',
+    'cleavage',
+    'diaphaneity',
+    'crystal_habit',
+    'streak',
+    'optical_properties',
+    'refractive_index',
+    'unit_cell',
+    'crystal_symmetry',
+)
+
+
+def detail_snapshot(mineral):
+    return json.dumps({
+        'caption': mineral.image_caption,
+        'attributes': [[title(name), getattr(mineral, name)]
+                       for name in DETAIL_ATTRIBUTES
+                       if getattr(mineral, name)],
+    }, ensure_ascii=False, separators=(',', ':'))
+
+
+def backfill_detail_snapshots(apps, schema_editor):
+    Mineral = apps.get_model('main_app', 'Mineral')
+    objects = Mineral.objects.db_manager(schema_editor.connection.alias)
+    minerals = list(objects.only('image_caption', *DETAIL_ATTRIBUTES))
+    for mineral in minerals:
+        mineral.detail_snapshot = detail_snapshot(mineral)
+    if minerals:
+        objects.bulk_update(minerals, ['detail_snapshot'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main_app', '0007_mineral_measured_ranges'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='mineral',
+            name='detail_snapshot',
+            field=models.TextField(default='', editable=False),
+        ),
+        migrations.RunPython(backfill_detail_snapshots,
+                             migrations.RunPython.noop),
+    ]
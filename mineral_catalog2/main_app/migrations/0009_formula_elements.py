@@ -0,0 +1,86 @@
+# Generated by Django 2.2.5 on 2026-10-18 16:14
+
+import re
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+# a frozen copy of the main_app.parsing formula elements at this migration
+ELEMENT_SYMBOLS = (
+    'H', 'He', 'Li', 'Be', 'B', 'C', 'N', 'O', 'F', 'Ne', 'Na', 'Mg', 'Al',
+    'Si', 'P', 'S', 'Cl', 'Ar', 'K', 'Ca', 'Sc', 'Ti', 'V', 'Cr', 'Mn', 'Fe',
+    'Co', 'Ni', 'Cu', 'Zn', 'Ga', 'Ge', 'As', 'Se', 'Br', 'Kr', 'Rb', 'Sr',
+    'Y', 'Zr', 'Nb', 'Mo', 'Tc', 'Ru', 'Rh', 'Pd', 'Ag', 'Cd', 'In', 'Sn',
+    'Sb', 'Te', 'I', 'Xe', 'Cs', 'Ba', 'La', 'Ce', 'Pr', 'Nd', 'Pm', 'Sm',
+    'Eu', 'Gd', 'Tb', 'Dy', 'Ho', 'Er', 'Tm', 'Yb', 'Lu', 'Hf', 'Ta', 'W',
+    'Re', 'Os', 'Ir', 'Pt', 'Au', 'Hg', 'Tl', 'Pb', 'Bi', 'Po', 'At', 'Rn',
+    'Fr', 'Ra', 'Ac', 'Th', 'Pa', 'U', 'Np', 'Pu', 'Am', 'Cm', 'Bk', 'Cf',
+    'Es', 'Fm', 'Md', 'No', 'Lr', 'Rf', 'Db', 'Sg', 'Bh', 'Hs', 'Mt', 'Ds',
+    'Rg', 'Cn', 'Nh', 'Fl', 'Mc', 'Lv', 'Ts', 'Og',
+)
+ATOMIC_NUMBERS = {symbol: number
+                  for number, symbol in enumerate(ELEMENT_SYMBOLS, 1)}
+FORMULA_WORD_RE = re.compile(r'([A-Z][a-z]?)([a-z]*)')
+MARKUP_RE = re.compile(r'<[^>]*>')
+FORMULA_VARIABLES = set('xyzn')
+
+
+def formula_elements(formula):
+    numbers = set()
+    for symbol, tail in FORMULA_WORD_RE.findall(
+            MARKUP_RE.sub('', formula or '')):
+        if symbol not in ATOMIC_NUMBERS and symbol[1:] in FORMULA_VARIABLES:
+            symbol, tail = symbol[0], symbol[1:] + tail
+        if symbol in ATOMIC_NUMBERS and set(tail) <= FORMULA_VARIABLES:
+            numbers.add(ATOMIC_NUMBERS[symbol])
+    return sorted(numbers)
+
+
+def backfill_formula_elements(apps, schema_editor):
+    Element = apps.get_model('main_app', 'Element')
+    Mineral = apps.get_model('main_app', 'Mineral')
+    MineralElement = apps.get_model('main_app', 'MineralElement')
+    using = schema_editor.connection.alias
+    Element.objects.using(using).bulk_create(
+        [Element(number=number, symbol=symbol)
+         for number, symbol in enumerate(ELEMENT_SYMBOLS, 1)])
+    MineralElement.objects.using(using).bulk_create(
+        [MineralElement(mineral_id=pk, element_id=number)
+         for pk, formula in Mineral.objects.using(using)
+         .values_list('pk', 'formula').iterator()
+         for number in formula_elements(formula)])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main_app', '0008_mineral_detail_snapshot'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Element',
+            fields=[
+                ('number', models.PositiveSmallIntegerField(primary_key=True, serialize=False)),
+                ('symbol', models.CharField(max_length=3, unique=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='MineralElement',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('element', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='main_app.Element')),
+                ('mineral', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='main_app.Mineral')),
+            ],
+            options={
+                'unique_together': {('element', 'mineral')},
+            },
+        ),
+        migrations.AddField(
+            model_name='mineral',
+            name='elements',
+            field=models.ManyToManyField(editable=False, related_name='minerals', through='main_app.MineralElement', to='main_app.Element'),
+        ),
+        migrations.RunPython(backfill_formula_elements,
+                             migrations.RunPython.noop),
+    ]
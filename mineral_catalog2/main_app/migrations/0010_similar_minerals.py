@@ -0,0 +1,18 @@
+# Generated by Django 2.2.5 on 2026-10-18 16:18
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main_app', '0009_formula_elements'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='mineral',
+            name='similar_minerals',
+            field=models.TextField(default='', editable=False),
+        ),
+    ]
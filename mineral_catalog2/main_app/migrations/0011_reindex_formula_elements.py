@@ -0,0 +1,64 @@
+import re
+
+from django.db import migrations
+
+# a frozen copy of the main_app.parsing formula elements at this migration,
+# the elements rows of 0009 are numbered by ELEMENT_SYMBOLS
+ELEMENT_SYMBOLS = (
+    'H', 'He', 'Li', 'Be', 'B', 'C', 'N', 'O', 'F', 'Ne', 'Na', 'Mg', 'Al',
+    'Si', 'P', 'S', 'Cl', 'Ar', 'K', 'Ca', 'Sc', 'Ti', 'V', 'Cr', 'Mn', 'Fe',
+    'Co', 'Ni', 'Cu', 'Zn', 'Ga', 'Ge', 'As', 'Se', 'Br', 'Kr', 'Rb', 'Sr',
+    'Y', 'Zr', 'Nb', 'Mo', 'Tc', 'Ru', 'Rh', 'Pd', 'Ag', 'Cd', 'In', 'Sn',
+    'Sb', 'Te', 'I', 'Xe', 'Cs', 'Ba', 'La', 'Ce', 'Pr', 'Nd', 'Pm', 'Sm',
+    'Eu', 'Gd', 'Tb', 'Dy', 'Ho', 'Er', 'Tm', 'Yb', 'Lu', 'Hf', 'Ta', 'W',
+    'Re', 'Os', 'Ir', 'Pt', 'Au', 'Hg', 'Tl', 'Pb', 'Bi', 'Po', 'At', 'Rn',
+    'Fr', 'Ra', 'Ac', 'Th', 'Pa', 'U', 'Np', 'Pu', 'Am', 'Cm', 'Bk', 'Cf',
+    'Es', 'Fm', 'Md', 'No', 'Lr', 'Rf', 'Db', 'Sg', 'Bh', 'Hs', 'Mt', 'Ds',
+    'Rg', 'Cn', 'Nh', 'Fl', 'Mc', 'Lv', 'Ts', 'Og',
+)
+ATOMIC_NUMBERS = {symbol: number
+                  for number, symbol in enumerate(ELEMENT_SYMBOLS, 1)}
+FORMULA_WORD_RE = re.compile(r'([A-Z][a-z]?)([a-z]*)')
+MARKUP_RE = re.compile(r'<[^>]*>')
+OXIDATION_STATE_RE = re.compile(r'\([IVX]+(?:,[IVX]+)*\)')
+PROSE_PREFIX_RE = re.compile(
+    r'^\s*[^\W\d_]+\([IVX]+(?:,[IVX]+)*\)(?:\s+[^\W\d_]+)*\s*[,:]\s*')
+FORMULA_VARIABLES = set('xyzn')
+
+
+def formula_elements(formula):
+    formula = PROSE_PREFIX_RE.sub('', MARKUP_RE.sub('', formula or ''))
+    numbers = set()
+    for symbol, tail in FORMULA_WORD_RE.findall(
+            OXIDATION_STATE_RE.sub('', formula)):
+        if symbol not in ATOMIC_NUMBERS and symbol[1:] in FORMULA_VARIABLES:
+            symbol, tail = symbol[0], symbol[1:] + tail
+        if symbol in ATOMIC_NUMBERS and set(tail) <= FORMULA_VARIABLES:
+            numbers.add(ATOMIC_NUMBERS[symbol])
+    return sorted(numbers)
+
+
+def reindex_formula_elements(apps, schema_editor):
+    # the links indexed before the oxidation states were skipped had
+    # iodine and vanadium false matches
+    Mineral = apps.get_model('main_app', 'Mineral')
+    MineralElement = apps.get_model('main_app', 'MineralElement')
+    using = schema_editor.connection.alias
+    MineralElement.objects.using(using).all().delete()
+    MineralElement.objects.using(using).bulk_create(
+        [MineralElement(mineral_id=pk, element_id=number)
+         for pk, formula in Mineral.objects.using(using)
+         .values_list('pk', 'formula').iterator()
+         for number in formula_elements(formula)])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main_app', '0010_similar_minerals'),
+    ]
+
+    operations = [
+        migrations.RunPython(reindex_formula_elements,
+                             migrations.RunPython.noop),
+    ]
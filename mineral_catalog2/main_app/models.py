@@ -1,11 +1,93 @@
 """
 Models definition, fields and methods
 """
-from django.db import models
+import json
+
+from django.db import models, router, transaction
+from django.template.defaultfilters import slugify, title
+
+from .parsing import measured_ranges
+
+# the attributes of the detail page, the most common first
+DETAIL_ATTRIBUTES = (
+    'category',
+    'group',
+    'formula',
+    'strunz_classification',
+    'crystal_system',
+    'mohs_scale_hardness',
+    'luster',
+    'color',
+    'specific_gravity',
+    'cleavage',
+    'diaphaneity',
+    'crystal_habit',
+    'streak',
+    'optical_properties',
+    'refractive_index',
+    'unit_cell',
+    'crystal_symmetry',
+)
+
+
+# the fields set_derived_values() computes, written along with any saved
+# field, and updated_at (auto_now)
+DERIVED_FIELDS = (
+    'category_slug',
+    'streak_slug',
+    'name_initial',
+    'hardness_min',
+    'hardness_max',
+    'specific_gravity_min',
+    'specific_gravity_max',
+    'refractive_index_min',
+    'refractive_index_max',
+    'detail_snapshot',
+    'updated_at',
+)
+
+
+def derived_values(name, category, streak):
+    """
+    Computes the denormalized browsing values of a mineral
+    :return: A dict of the derived field names and values
+    """
+    return {
+        'category_slug': slugify(category),
+        'streak_slug': slugify(streak),
+        'name_initial': name[:1].lower(),
+    }
+
+
+def detail_snapshot(mineral):
+    """
+    Serializes what the detail page shows of a mineral besides its name
+    and image, so a detail request doesn't assemble it
+    :param mineral: a Mineral object, or any object having its fields
+    :return: A compact JSON string of the image caption and the
+    [label, value] pairs of the non empty DETAIL_ATTRIBUTES, in order
+    """
+    return json.dumps({
+        'caption': mineral.image_caption,
+        'attributes': [[title(name), getattr(mineral, name)]
+                       for name in DETAIL_ATTRIBUTES
+                       if getattr(mineral, name)],
+    }, ensure_ascii=False, separators=(',', ':'))
+
+
+class Element(models.Model):
+    """
+    A chemical element, its atomic number as primary key
+    """
+    number = models.PositiveSmallIntegerField(primary_key=True)
+    symbol = models.CharField(max_length=3, unique=True)
+
+    def __str__(self):
+        return self.symbol
 
 
 class Mineral(models.Model):
-    name = models.CharField(max_length=255)
+    name = models.CharField(max_length=255, db_index=True)
     image_filename = models.CharField(max_length=255)
     image_caption = models.CharField(max_length=511)
     category = models.CharField(max_length=255)
@@ -25,9 +107,70 @@ class Mineral(models.Model):
     crystal_habit = models.CharField(max_length=511)
     specific_gravity = models.CharField(max_length=255)
     group = models.CharField(max_length=255)
+    # denormalized browsing values, maintained by save()
+    category_slug = models.SlugField(max_length=255, db_index=False,
+                                     editable=False)
+    streak_slug = models.SlugField(max_length=255, db_index=False,
+                                   editable=False)
+    name_initial = models.CharField(max_length=1, editable=False)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
+    # numeric ranges parsed out of the measured properties texts by save(),
+    # None when the text has no value, for indexed range queries
+    hardness_min = models.FloatField(null=True, editable=False,
+                                     db_index=True)
+    hardness_max = models.FloatField(null=True, editable=False,
+                                     db_index=True)
+    specific_gravity_min = models.FloatField(null=True, editable=False,
+                                             db_index=True)
+    specific_gravity_max = models.FloatField(null=True, editable=False,
+                                             db_index=True)
+    refractive_index_min = models.FloatField(null=True, editable=False,
+                                             db_index=True)
+    refractive_index_max = models.FloatField(null=True, editable=False,
+                                             db_index=True)
+    # the detail page content, see detail_snapshot
+    detail_snapshot = models.TextField(editable=False, default='')
+    # a JSON list of the [pk, name] of the most similar minerals, written
+    # by the build_similar_minerals command
+    similar_minerals = models.TextField(editable=False, default='')
+    # the elements of the formula, maintained by the post_save signal
+    elements = models.ManyToManyField(Element, through='MineralElement',
+                                      related_name='minerals', editable=False)
 
+    class Meta:
+        # browsing lookups seeking their pages in (name, pk) order
+        indexes = [
+            models.Index(fields=['category_slug', 'name']),
+            models.Index(fields=['streak_slug', 'name']),
+            models.Index(fields=['name_initial', 'name']),
+        ]
 
+    def set_derived_values(self):
+        values = derived_values(self.name, self.category, self.streak)
+        values.update(measured_ranges(self))
+        values['detail_snapshot'] = detail_snapshot(self)
+        for field_name, value in values.items():
+            setattr(self, field_name, value)
 
+    def save(self, *args, update_fields=None, **kwargs):
+        self.set_derived_values()
+        if update_fields is not None:
+            update_fields = set(update_fields) | set(DERIVED_FIELDS)
+        # the post_save receivers link the formula elements, along with
+        # the row in a single transaction
+        using = kwargs.get('using') or router.db_for_write(type(self),
+                                                           instance=self)
+        with transaction.atomic(using=using):
+            super().save(*args, update_fields=update_fields, **kwargs)
 
 
+class MineralElement(models.Model):
+    """
+    The elements of every mineral formula, the unique index leading by the
+    element serves the minerals by element lookups
+    """
+    mineral = models.ForeignKey(Mineral, on_delete=models.CASCADE)
+    element = models.ForeignKey(Element, on_delete=models.CASCADE)
 
+    class Meta:
+        unique_together = [('element', 'mineral')]
@@ -0,0 +1,222 @@
+"""
+Full page cache of the catalog views.
+Every cached page is tagged by the catalog parts it depends on, each tag
+has a version kept in the cache itself, and the page cache key includes
+the versions of its tags. Writing a mineral bumps the versions of its
+tags only, so exactly the pages depending on it are missed afterwards.
+Pages are stored without their random mineral link, a fresh one is
+injected into every response served from the cache.
+The same tags versions make the pages strong ETags, and a global catalog
+version, bumped on every write, dates their Last-Modified.
+"""
+import functools
+import hashlib
+import re
+import uuid
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db.models import Max
+from django.http import HttpResponse
+from django.urls import reverse
+from django.utils import timezone
+
+from .models import Mineral
+from .random_picker import random_mineral_picker
+
+# tags every page depends on: the whole catalog (bulk writes) and the
+# sidebar facets
+COMMON_TAGS = ('catalog', 'facets')
+
+RANDOM_LINK_RE = re.compile(rb'(id="random-mineral" class="[^"]*" href=")'
+                            rb'[^"]*(")')
+RANDOM_LINK_PLACEHOLDER = b'__random_mineral_url__'
+
+CATALOG_STATE_KEY = 'catalog-state'
+
+
+def get_cache():
+    return caches[settings.MINERAL_PAGE_CACHE]
+
+
+def tag_key(tag):
+    return 'page-tag:{}'.format(tag)
+
+
+def tag_versions(tags):
+    """
+    Gets the current version of every tag, versioning the unknown tags
+    :return: A list of the tags versions, in the tags order
+    """
+    cache = get_cache()
+    keys = [tag_key(tag) for tag in tags]
+    versions = cache.get_many(keys)
+    for key in keys:
+        if key not in versions:
+            # a tag evicted from the cache gets a new version as well,
+            # its pages may be stale
+            version = uuid.uuid4().hex
+            cache.add(key, version, None)
+            # a cache keeping nothing (DummyCache) misses every page
+            versions[key] = cache.get(key) or version
+    return [versions[key] for key in keys]
+
+
+def invalidate_tags(tags):
+    """
+    Bumps the tags versions, all the pages tagged by them are missed
+    """
+    get_cache().set_many({tag_key(tag): uuid.uuid4().hex for tag in tags},
+                         None)
+
+
+def page_digest(request, tags):
+    """
+    Digests the request path and the tags versions, memoized per request
+    as both the page ETag and its cache key need it
+    :return: A hex digest string
+    """
+    digests = request.__dict__.setdefault('_page_digests', {})
+    if tags not in digests:
+        versions = tag_versions(tags)
+        digests[tags] = hashlib.md5(
+            '\n'.join([request.get_full_path()] + versions).encode()
+        ).hexdigest()
+    return digests[tags]
+
+
+def catalog_state():
+    """
+    Gets the global catalog version and its last modification time,
+    dated by the latest Mineral.updated_at when not cached
+    :return: A (version, last modified datetime) tuple
+    """
+    cache = get_cache()
+    state = cache.get(CATALOG_STATE_KEY)
+    if state is None:
+        last_modified = Mineral.objects.aggregate(
+            Max('updated_at'))['updated_at__max'] or timezone.now()
+        state = (uuid.uuid4().hex, last_modified)
+        cache.add(CATALOG_STATE_KEY, state, None)
+        state = cache.get(CATALOG_STATE_KEY) or state
+    return state
+
+
+def bump_catalog_version():
+    """
+    Marks the whole catalog as modified now
+    """
+    get_cache().set(CATALOG_STATE_KEY, (uuid.uuid4().hex, timezone.now()),
+                    None)
+
+
+def catalog_last_modified(request, *args, **kwargs):
+    """
+    The Last-Modified of every page, any write may change a page sidebar
+    """
+    return catalog_state()[1]
+
+
+def page_etag(get_tags):
+    """
+    :param get_tags: the page tags function, see cache_page_by
+    :return: An ETag function of the view, for the condition decorator
+    """
+    def etag(request, *args, **kwargs):
+        return page_digest(request, COMMON_TAGS + tuple(get_tags(**kwargs)))
+    return etag
+
+
+def inject_random_link(content):
+    """
+    :return: The page content with a fresh random mineral link
+    """
+    if RANDOM_LINK_PLACEHOLDER not in content:
+        return content
+    random_mineral = random_mineral_picker.pick()
+    url = reverse('minerals:detail', kwargs={'pk': random_mineral.pk}) \
+        if random_mineral else ''
+    return content.replace(RANDOM_LINK_PLACEHOLDER, url.encode())
+
+
+def cache_page_by(get_tags):
+    """
+    Caches the GET responses of the decorated view, keyed by the request
+    path and the versions of the page tags
+    :param get_tags: a function of the view kwargs returning the tags the
+    page depends on, besides COMMON_TAGS
+    """
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if request.method not in ('GET', 'HEAD'):
+                return view(request, *args, **kwargs)
+
+            cache = get_cache()
+            key = 'page:{}'.format(page_digest(
+                request, COMMON_TAGS + tuple(get_tags(**kwargs))))
+            entry = cache.get(key)
+            if entry is not None:
+                content, content_type = entry
+                response = HttpResponse(inject_random_link(content),
+                                        content_type=content_type)
+                response['X-Page-Cache'] = 'hit'
+                return response
+
+            response = view(request, *args, **kwargs)
+            if response.status_code == 200 and not response.streaming:
+                content = RANDOM_LINK_RE.sub(
+                    rb'\1' + RANDOM_LINK_PLACEHOLDER + rb'\2',
+                    response.content)
+                cache.set(key, (content, response['Content-Type']),
+                          settings.MINERAL_PAGE_CACHE_TIMEOUT)
+                response['X-Page-Cache'] = 'miss'
+            return response
+        return wrapper
+    return decorator
+
+
+def list_tags(letter='a', selected_category=None, selected_streak=None):
+    """
+    :return: The tags of a minerals list page
+    """
+    if selected_category:
+        return ['category:{}'.format(selected_category)]
+    if selected_streak:
+        return ['streak:{}'.format(selected_streak)]
+    return ['letter:{}'.format(letter.lower())]
+
+
+def search_tags():
+    """
+    :return: The tags of a search results page, any write may change them
+    """
+    return ['search']
+
+
+def element_tags(symbols):
+    """
+    :return: The tags of a minerals by element page, any write may change
+    a formula
+    """
+    return ['search']
+
+
+def detail_tags(pk):
+    """
+    :return: The tags of a mineral detail page
+    """
+    return ['mineral:{}'.format(pk)]
+
+
+def mineral_tags(values):
+    """
+    Gets the tags of the pages listing or showing a mineral
+    :param values: a dict of the mineral pk, name_initial, category_slug
+    and streak_slug values
+    :return: A set of tags
+    """
+    return {'mineral:{}'.format(values['pk']),
+            'letter:{}'.format(values['name_initial']),
+            'category:{}'.format(values['category_slug']),
+            'streak:{}'.format(values['streak_slug'])}
@@ -0,0 +1,140 @@
+"""
+Keyset (seek) pagination of minerals ordered by (name, pk)
+"""
+import base64
+import json
+
+from django.conf import settings
+from django.db.models import Q
+
+from .facet_index import facet_index
+from .projections import MineralRow, project
+
+
+def encode_cursor(name, pk):
+    """
+    :return: An url safe string of the (name, pk) key
+    """
+    key = json.dumps([name, pk], separators=(',', ':'))
+    return base64.urlsafe_b64encode(key.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """
+    :return: The (name, pk) key of the cursor, None if the cursor is invalid
+    """
+    try:
+        key = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        name, pk = json.loads(key.decode())
+    except (ValueError, TypeError):
+        return None
+    if not isinstance(name, str) or not isinstance(pk, int):
+        return None
+    return name, pk
+
+
+def get_page_size(request):
+    """
+    Gets the requested page_size bounded by settings.MINERALS_MAX_PAGE_SIZE
+    :return: The page size, settings.MINERALS_PAGE_SIZE if not requested
+    """
+    try:
+        page_size = int(request.GET.get('page_size',
+                                        settings.MINERALS_PAGE_SIZE))
+    except ValueError:
+        page_size = settings.MINERALS_PAGE_SIZE
+    return max(1, min(page_size, settings.MINERALS_MAX_PAGE_SIZE))
+
+
+class KeysetPage:
+    """
+    A single page of minerals with the cursors of its neighbour pages
+    """
+
+    def __init__(self, request, object_list, has_previous, has_next):
+        self.object_list = object_list
+        self.has_previous = has_previous and bool(object_list)
+        self.has_next = has_next and bool(object_list)
+        self._query = request.GET.copy()
+        for param in ('after', 'before'):
+            self._query.pop(param, None)
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def _querystring(self, param, mineral):
+        query = self._query.copy()
+        query[param] = encode_cursor(mineral.name, mineral.pk)
+        return query.urlencode()
+
+    @property
+    def previous_query(self):
+        """
+        :return: The querystring of the previous page
+        """
+        return self._querystring('before', self.object_list[0])
+
+    @property
+    def next_query(self):
+        """
+        :return: The querystring of the next page
+        """
+        return self._querystring('after', self.object_list[-1])
+
+
+def paginate(request, queryset, row_class=MineralRow):
+    """
+    Gets the page of the queryset following the request 'after' cursor,
+    or preceding its 'before' cursor, the first page if there is none.
+    Seeking by the (name, pk) key instead of an offset keeps pages stable
+    under inserts and the queries cost independent of the page position.
+    :param request: the request holding the cursor and page_size params
+    :param queryset: A Mineral Queryset
+    :param row_class: the projected row class of the page, having pk and name
+    :return: A KeysetPage object
+    """
+    page_size = get_page_size(request)
+    after = decode_cursor(request.GET.get('after', ''))
+    before = decode_cursor(request.GET.get('before', ''))
+
+    if before:
+        name, pk = before
+        rows = project(queryset.filter(Q(name__lt=name) |
+                                       Q(name=name, pk__lt=pk))
+                       .order_by('-name', '-pk')[:page_size + 1], row_class)
+        has_previous = len(rows) > page_size
+        return KeysetPage(request, rows[:page_size][::-1],
+                          has_previous=has_previous, has_next=True)
+
+    if after:
+        name, pk = after
+        queryset = queryset.filter(Q(name__gt=name) | Q(name=name, pk__gt=pk))
+    rows = project(queryset.order_by('name', 'pk')[:page_size + 1],
+                   row_class)
+    return KeysetPage(request, rows[:page_size],
+                      has_previous=bool(after),
+                      has_next=len(rows) > page_size)
+
+
+def paginate_bitmap(request, bits):
+    """
+    Gets the page of the minerals of a facet index bitmap, following the
+    request 'after' cursor or preceding its 'before' cursor, as paginate
+    does for a queryset. The rows come out of the index, without a query.
+    :return: A KeysetPage object
+    """
+    page_size = get_page_size(request)
+    after = decode_cursor(request.GET.get('after', ''))
+    before = decode_cursor(request.GET.get('before', ''))
+
+    keys, has_more = facet_index.page(bits, page_size, after=after,
+                                      before=before)
+    rows = [MineralRow(pk, name) for name, pk in keys]
+    if before:
+        return KeysetPage(request, rows, has_previous=has_more,
+                          has_next=True)
+    return KeysetPage(request, rows, has_previous=bool(after),
+                      has_next=has_more)
@@ -0,0 +1,172 @@
+"""
+Parsing of the free text measured properties of the minerals into
+numeric (min, max) ranges, e.g. the hardness '2½ to 3' is (2.5, 3.0)
+"""
+import re
+
+NUMBER_RE = re.compile(r'\d+(?:\.\d+)?½?|½')
+
+# units, angles (2V = 37°), uncertainties such as '1.818(3)' or
+# '(+/- .030)' and crystal planes, whose numbers aren't property values
+NOISE_RE = re.compile(r'g\s*/\s*cm\S*|\b2V\b|\d+(?:\.\d+)?\s*°|\(\d+\)'
+                      r'|\(\s*[+\-±][^)]*\)|\{[^}]*\}')
+
+# the measured property field: (range fields prefix, min and max plausible
+# values), numbers outside of the plausible values are something else
+MEASURED_PROPERTIES = {
+    'mohs_scale_hardness': ('hardness', 0.0, 10.0),
+    'specific_gravity': ('specific_gravity', 0.5, 25.0),
+    'refractive_index': ('refractive_index', 1.0, 3.5),
+}
+
+
+def parse_number(text):
+    """
+    :return: The float value of a number token, '½' is a half
+    """
+    if text.endswith('½'):
+        return float(text[:-1] or 0) + 0.5
+    return float(text)
+
+
+def parse_range(text, low, high):
+    """
+    Extracts the range of the numbers in text
+    :param text: a free text measure, e.g. '6.8–7.1 (measured)'
+    :param low: the minimal plausible value
+    :param high: the maximal plausible value
+    :return: A (min, max) tuple of floats, (None, None) if text has no
+    plausible number
+    """
+    values = [value for value in map(parse_number,
+                                     NUMBER_RE.findall(
+                                         NOISE_RE.sub(' ', text or '')))
+              if low <= value <= high]
+    if not values:
+        return None, None
+    return min(values), max(values)
+
+
+def measured_ranges(mineral):
+    """
+    Parses the measured properties of a mineral
+    :param mineral: a Mineral object, or any object having its fields
+    :return: A dict of the numeric range field names and values
+    """
+    ranges = {}
+    for field_name, (prefix, low, high) in MEASURED_PROPERTIES.items():
+        ranges[prefix + '_min'], ranges[prefix + '_max'] = parse_range(
+            getattr(mineral, field_name), low, high)
+    return ranges
+
+
+CRYSTAL_SYSTEMS = ('triclinic', 'monoclinic', 'orthorhombic', 'tetragonal',
+                   'trigonal', 'hexagonal', 'cubic', 'amorphous')
+
+# synonyms of the CRYSTAL_SYSTEMS
+CRYSTAL_SYSTEM_ALIASES = {'isometric': 'cubic'}
+
+LUSTERS = ('adamantine', 'subadamantine', 'metallic', 'submetallic',
+           'vitreous', 'subvitreous', 'resinous', 'pearly', 'silky',
+           'greasy', 'waxy', 'dull', 'earthy', 'splendent')
+
+WORD_RE = re.compile(r'[a-z]+')
+
+
+def keywords(text, vocabulary, aliases=None):
+    """
+    Finds the vocabulary words of a free text, 'sub-metallic' and
+    'sub metallic' being 'submetallic'
+    :return: A sorted list of the distinct words found
+    """
+    aliases = aliases or {}
+    text = re.sub(r'\bsub[\s\-]+', 'sub', (text or '').lower())
+    found = {aliases.get(word, word) for word in WORD_RE.findall(text)}
+    return sorted(found.intersection(vocabulary))
+
+
+def crystal_systems(text):
+    """
+    :return: The crystal systems named by a crystal_system text, e.g.
+    ['monoclinic'] for 'Monoclinic - Prismatic 2/m'
+    """
+    return keywords(text, CRYSTAL_SYSTEMS, CRYSTAL_SYSTEM_ALIASES)
+
+
+def lusters(text):
+    """
+    :return: The lusters named by a luster text, e.g. ['pearly',
+    'vitreous'] for 'Vitreous, pearly on cleavages'
+    """
+    return keywords(text, LUSTERS)
+
+
+COLORS = ('colorless', 'white', 'gray', 'black', 'brown', 'red', 'pink',
+          'orange', 'yellow', 'green', 'blue', 'violet', 'purple', 'gold',
+          'silver', 'bronze')
+
+# synonyms and shades of the COLORS
+COLOR_ALIASES = {'colourless': 'colorless', 'grey': 'gray',
+                 'grayish': 'gray', 'greyish': 'gray', 'whitish': 'white',
+                 'blackish': 'black', 'brownish': 'brown', 'reddish': 'red',
+                 'pinkish': 'pink', 'yellowish': 'yellow',
+                 'greenish': 'green', 'bluish': 'blue', 'golden': 'gold',
+                 'purplish': 'purple'}
+
+
+def colors(text):
+    """
+    :return: The colors named by a color or streak text, e.g. ['gray',
+    'white'] for 'White to greyish'
+    """
+    return keywords(text, COLORS, COLOR_ALIASES)
+
+
+# the chemical elements symbols, in atomic number order
+ELEMENT_SYMBOLS = (
+    'H', 'He', 'Li', 'Be', 'B', 'C', 'N', 'O', 'F', 'Ne', 'Na', 'Mg', 'Al',
+    'Si', 'P', 'S', 'Cl', 'Ar', 'K', 'Ca', 'Sc', 'Ti', 'V', 'Cr', 'Mn', 'Fe',
+    'Co', 'Ni', 'Cu', 'Zn', 'Ga', 'Ge', 'As', 'Se', 'Br', 'Kr', 'Rb', 'Sr',
+    'Y', 'Zr', 'Nb', 'Mo', 'Tc', 'Ru', 'Rh', 'Pd', 'Ag', 'Cd', 'In', 'Sn',
+    'Sb', 'Te', 'I', 'Xe', 'Cs', 'Ba', 'La', 'Ce', 'Pr', 'Nd', 'Pm', 'Sm',
+    'Eu', 'Gd', 'Tb', 'Dy', 'Ho', 'Er', 'Tm', 'Yb', 'Lu', 'Hf', 'Ta', 'W',
+    'Re', 'Os', 'Ir', 'Pt', 'Au', 'Hg', 'Tl', 'Pb', 'Bi', 'Po', 'At', 'Rn',
+    'Fr', 'Ra', 'Ac', 'Th', 'Pa', 'U', 'Np', 'Pu', 'Am', 'Cm', 'Bk', 'Cf',
+    'Es', 'Fm', 'Md', 'No', 'Lr', 'Rf', 'Db', 'Sg', 'Bh', 'Hs', 'Mt', 'Ds',
+    'Rg', 'Cn', 'Nh', 'Fl', 'Mc', 'Lv', 'Ts', 'Og',
+)
+
+ATOMIC_NUMBERS = {symbol: number
+                  for number, symbol in enumerate(ELEMENT_SYMBOLS, 1)}
+
+# a capitalized word, the symbol candidate and its lower case tail
+FORMULA_WORD_RE = re.compile(r'([A-Z][a-z]?)([a-z]*)')
+MARKUP_RE = re.compile(r'<[^>]*>')
+
+# the roman oxidation states of the prose names, e.g. 'iron(II,III)', and
+# the whole prose prefix of a formula, e.g. 'mercury(II) sulfide, ', the
+# I, V and X numerals aren't iodine, vanadium and variables
+OXIDATION_STATE_RE = re.compile(r'\([IVX]+(?:,[IVX]+)*\)')
+PROSE_PREFIX_RE = re.compile(
+    r'^\s*[^\W\d_]+\([IVX]+(?:,[IVX]+)*\)(?:\s+[^\W\d_]+)*\s*[,:]\s*')
+
+# the lower case variables of the formulas, e.g. Ag1-xSbx or nH2O
+FORMULA_VARIABLES = set('xyzn')
+
+
+def formula_elements(formula):
+    """
+    Extracts the chemical elements of a free text formula, e.g. Cu and S
+    out of 'Cu<sub>2</sub>S', skipping the words such as 'Lead carbonate'
+    or 'iron(III) oxide' prefixing some formulas
+    :return: A sorted list of the atomic numbers of the elements
+    """
+    formula = PROSE_PREFIX_RE.sub('', MARKUP_RE.sub('', formula or ''))
+    numbers = set()
+    for symbol, tail in FORMULA_WORD_RE.findall(
+            OXIDATION_STATE_RE.sub('', formula)):
+        if symbol not in ATOMIC_NUMBERS and symbol[1:] in FORMULA_VARIABLES:
+            symbol, tail = symbol[0], symbol[1:] + tail
+        if symbol in ATOMIC_NUMBERS and set(tail) <= FORMULA_VARIABLES:
+            numbers.add(ATOMIC_NUMBERS[symbol])
+    return sorted(numbers)
@@ -0,0 +1,414 @@
+"""
+Request level performance instrumentation.
+PerfMiddleware records, per URL name, the wall time, the database queries
+count and time, the template render time and the response size of every
+request into in-process HDR style histograms, and flags the requests
+repeating a query (duplicates, same SQL and parameters) or running the
+same SQL over and over with different parameters (N+1).
+Each process writes its histograms to MINERAL_PERF_SNAPSHOT_DIR every
+MINERAL_PERF_SNAPSHOT_INTERVAL seconds, the perf_report command merges
+the snapshots of all the processes.
+"""
+import json
+import logging
+import os
+import re
+import tempfile
+import threading
+import time
+from collections import Counter
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.db import connections
+from django.template.backends.django import DjangoTemplates
+
+logger = logging.getLogger(__name__)
+
+# the recorded metrics and the unit their values are stored in
+METRICS = (
+    ('wall_ms', 1000),       # microseconds
+    ('queries', 1),
+    ('query_ms', 1000),      # microseconds
+    ('template_ms', 1000),   # microseconds
+    ('response_bytes', 1),
+)
+
+PERCENTILES = (50, 95, 99)
+
+# the number of flagged SQL statements kept per view
+MAX_FLAGGED_QUERIES = 20
+
+NUMBERS_RE = re.compile(r'\b\d+\b')
+
+
+class Histogram:
+    """
+    A log-linear histogram of non negative integers, in the HDR histogram
+    fashion: values below 2 ** SUB_BUCKET_BITS are counted exactly, the
+    larger ones within a relative error of 2 ** -(SUB_BUCKET_BITS - 1),
+    whatever their magnitude.
+    """
+    SUB_BUCKET_BITS = 7
+
+    __slots__ = ('counts', 'count', 'total', 'min', 'max')
+
+    def __init__(self):
+        self.counts = Counter()
+        self.count = 0
+        self.total = 0
+        self.min = None
+        self.max = None
+
+    @classmethod
+    def bucket(cls, value):
+        """
+        :return: The bucket index of value, buckets indexes are ordered as
+        their values
+        """
+        shift = max(0, value.bit_length() - cls.SUB_BUCKET_BITS)
+        return (shift << cls.SUB_BUCKET_BITS) | (value >> shift)
+
+    @classmethod
+    def bucket_value(cls, bucket):
+        """
+        :return: The middle value of a bucket
+        """
+        shift = bucket >> cls.SUB_BUCKET_BITS
+        low = (bucket & ((1 << cls.SUB_BUCKET_BITS) - 1)) << shift
+        return low + ((1 << shift) - 1) // 2
+
+    def record(self, value):
+        value = max(0, int(value))
+        self.counts[self.bucket(value)] += 1
+        self.count += 1
+        self.total += value
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+
+    def percentile(self, percent):
+        """
+        :return: The value below which percent of the values fall, None if
+        nothing was recorded
+        """
+        if not self.count:
+            return None
+        rank = max(1, -(-self.count * percent // 100))
+        seen = 0
+        for bucket in sorted(self.counts):
+            seen += self.counts[bucket]
+            if seen >= rank:
+                return min(max(self.bucket_value(bucket), self.min), self.max)
+
+    def merge(self, other):
+        self.counts.update(other.counts)
+        self.count += other.count
+        self.total += other.total
+        for value in (other.min, other.max):
+            if value is not None:
+                self.min = value if self.min is None else min(self.min, value)
+                self.max = value if self.max is None else max(self.max, value)
+
+    def to_dict(self):
+        return {'counts': sorted(self.counts.items()), 'count': self.count,
+                'total': self.total, 'min': self.min, 'max': self.max}
+
+    @classmethod
+    def from_dict(cls, data):
+        histogram = cls()
+        histogram.counts.update(dict(data['counts']))
+        histogram.count = data['count']
+        histogram.total = data['total']
+        histogram.min = data['min']
+        histogram.max = data['max']
+        return histogram
+
+
+class ViewStats:
+    """
+    The histograms and the flagged queries of a single URL name
+    """
+    __slots__ = ('histograms', 'duplicates', 'n_plus_one')
+
+    def __init__(self):
+        self.histograms = {name: Histogram() for name, _ in METRICS}
+        self.duplicates = Counter()
+        self.n_plus_one = Counter()
+
+    def merge(self, other):
+        for name, histogram in other.histograms.items():
+            self.histograms[name].merge(histogram)
+        self.duplicates.update(other.duplicates)
+        self.n_plus_one.update(other.n_plus_one)
+
+    def to_dict(self):
+        return {
+            'histograms': {name: histogram.to_dict()
+                           for name, histogram in self.histograms.items()},
+            'duplicates': dict(self.duplicates.most_common(
+                MAX_FLAGGED_QUERIES)),
+            'n_plus_one': dict(self.n_plus_one.most_common(
+                MAX_FLAGGED_QUERIES)),
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        stats = cls()
+        for name, histogram in data['histograms'].items():
+            stats.histograms[name] = Histogram.from_dict(histogram)
+        stats.duplicates.update(data['duplicates'])
+        stats.n_plus_one.update(data['n_plus_one'])
+        return stats
+
+    def summary(self):
+        """
+        :return: A dict of the count, mean, max and percentiles of every
+        metric, the times in milliseconds
+        """
+        summary = {}
+        for name, scale in METRICS:
+            histogram = self.histograms[name]
+            if not histogram.count:
+                continue
+            summary[name] = dict(
+                count=histogram.count,
+                mean=round(histogram.total / histogram.count / scale, 3),
+                max=round(histogram.max / scale, 3),
+                **{'p{}'.format(percent):
+                   round(histogram.percentile(percent) / scale, 3)
+                   for percent in PERCENTILES})
+        summary['duplicates'] = dict(self.duplicates.most_common(
+            MAX_FLAGGED_QUERIES))
+        summary['n_plus_one'] = dict(self.n_plus_one.most_common(
+            MAX_FLAGGED_QUERIES))
+        return summary
+
+
+class PerfRecorder:
+    """
+    The in-process stats of every URL name
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.views = {}
+        self.last_snapshot = time.monotonic()
+
+    def record(self, view_name, measures, duplicates, n_plus_one):
+        with self.lock:
+            stats = self.views.get(view_name)
+            if stats is None:
+                stats = self.views[view_name] = ViewStats()
+            for name, value in measures.items():
+                if value is not None:
+                    stats.histograms[name].record(value)
+            stats.duplicates.update(duplicates)
+            stats.n_plus_one.update(n_plus_one)
+
+    def reset(self):
+        with self.lock:
+            self.views = {}
+
+    def to_dict(self):
+        with self.lock:
+            return {view_name: stats.to_dict()
+                    for view_name, stats in self.views.items()}
+
+    def snapshot_path(self):
+        return os.path.join(snapshot_dir(), '{}.json'.format(os.getpid()))
+
+    def write_snapshot(self):
+        """
+        Writes the stats of this process, atomically, to the snapshot dir
+        """
+        self.last_snapshot = time.monotonic()
+        directory = snapshot_dir()
+        os.makedirs(directory, exist_ok=True)
+        data = self.to_dict()
+        descriptor, temp_path = tempfile.mkstemp(dir=directory,
+                                                 suffix='.tmp')
+        with os.fdopen(descriptor, 'w') as snapshot:
+            json.dump(data, snapshot)
+        os.replace(temp_path, self.snapshot_path())
+
+    def maybe_write_snapshot(self):
+        interval = settings.MINERAL_PERF_SNAPSHOT_INTERVAL
+        if (interval is not None
+                and time.monotonic() - self.last_snapshot >= interval):
+            try:
+                self.write_snapshot()
+            except OSError:
+                logger.exception('Cannot write the perf snapshot')
+
+
+perf_recorder = PerfRecorder()
+
+
+def snapshot_dir():
+    return settings.MINERAL_PERF_SNAPSHOT_DIR or os.path.join(
+        tempfile.gettempdir(), 'mineral_catalog2-perf')
+
+
+def load_stats():
+    """
+    Merges the snapshots of all the processes with the stats of this one
+    :return: A dict of the URL names to their ViewStats
+    """
+    merged = {}
+    own_path = perf_recorder.snapshot_path()
+    snapshots = [perf_recorder.to_dict()]
+    directory = snapshot_dir()
+    if os.path.isdir(directory):
+        for filename in sorted(os.listdir(directory)):
+            path = os.path.join(directory, filename)
+            if not filename.endswith('.json') or path == own_path:
+                continue
+            try:
+                with open(path) as snapshot:
+                    snapshots.append(json.load(snapshot))
+            except (OSError, ValueError):
+                continue
+
+    for snapshot in snapshots:
+        for view_name, data in snapshot.items():
+            stats = ViewStats.from_dict(data)
+            if view_name in merged:
+                merged[view_name].merge(stats)
+            else:
+                merged[view_name] = stats
+    return merged
+
+
+def clear_stats():
+    """
+    Resets the stats of this process and removes every snapshot
+    """
+    perf_recorder.reset()
+    directory = snapshot_dir()
+    if os.path.isdir(directory):
+        for filename in os.listdir(directory):
+            if filename.endswith(('.json', '.tmp')):
+                os.remove(os.path.join(directory, filename))
+
+
+class RequestMeasures(threading.local):
+    """
+    The measures of the request being served by the current thread
+    """
+    template_seconds = None
+
+
+request_measures = RequestMeasures()
+
+
+class QueryRecorder:
+    """
+    A connection.execute_wrapper timing and keeping the queries
+    """
+
+    def __init__(self):
+        self.seconds = 0.0
+        self.queries = []
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.seconds += time.perf_counter() - start
+            self.queries.append((sql, repr(params)))
+
+    def flagged(self):
+        """
+        :return: The (duplicates, n_plus_one) Counters of the SQL run more
+        than once with the same parameters, and of the SQL run at least
+        MINERAL_PERF_N_PLUS_ONE_THRESHOLD times with different ones
+        """
+        duplicates = Counter()
+        for (sql, _), times in Counter(self.queries).items():
+            if times > 1:
+                duplicates[sql] += times - 1
+        variants = Counter(NUMBERS_RE.sub('?', sql)
+                           for sql, _ in set(self.queries))
+        n_plus_one = Counter()
+        for sql, times in variants.items():
+            if times >= settings.MINERAL_PERF_N_PLUS_ONE_THRESHOLD:
+                n_plus_one[sql] = times
+        return duplicates, n_plus_one
+
+
+class PerfMiddleware:
+    """
+    Records the measures of every request, keep it first in MIDDLEWARE
+    to time the whole middleware chain as well
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not settings.MINERAL_PERF_ENABLED:
+            return self.get_response(request)
+
+        queries = QueryRecorder()
+        request_measures.template_seconds = 0.0
+        start = time.perf_counter()
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(queries))
+            response = self.get_response(request)
+        wall_seconds = time.perf_counter() - start
+
+        match = request.resolver_match
+        view_name = match.view_name if match else '<unresolved>'
+        duplicates, n_plus_one = queries.flagged()
+        if duplicates or n_plus_one:
+            logger.warning('%s ran %d duplicate and %d N+1 queries',
+                           view_name, sum(duplicates.values()),
+                           sum(n_plus_one.values()))
+        perf_recorder.record(view_name, {
+            'wall_ms': wall_seconds * 1e6,
+            'queries': len(queries.queries),
+            'query_ms': queries.seconds * 1e6,
+            'template_ms': request_measures.template_seconds * 1e6,
+            'response_bytes': (None if response.streaming
+                               else len(response.content)),
+        }, duplicates, n_plus_one)
+        request_measures.template_seconds = None
+        perf_recorder.maybe_write_snapshot()
+        return response
+
+
+class TimedTemplate:
+    """
+    A template of the DjangoTemplates backend adding its render time to
+    the measures of the current request
+    """
+
+    def __init__(self, template):
+        self.template = template
+
+    def __getattr__(self, name):
+        return getattr(self.template, name)
+
+    def render(self, context=None, request=None):
+        if request_measures.template_seconds is None:
+            return self.template.render(context, request)
+        start = time.perf_counter()
+        try:
+            return self.template.render(context, request)
+        finally:
+            request_measures.template_seconds += time.perf_counter() - start
+
+
+class TimedDjangoTemplates(DjangoTemplates):
+    """
+    The DjangoTemplates backend with the render time of its templates
+    measured for PerfMiddleware
+    """
+
+    def from_string(self, template_code):
+        return TimedTemplate(super().from_string(template_code))
+
+    def get_template(self, template_name):
+        return TimedTemplate(super().get_template(template_name))
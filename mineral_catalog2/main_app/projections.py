@@ -0,0 +1,73 @@
+"""
+Lightweight mineral rows, fetching only the columns a template renders
+instead of whole Mineral objects
+"""
+import functools
+
+from .models import Mineral
+
+
+class MineralRow:
+    """
+    A read-only mineral row holding its pk and name only.
+    Compares equal to the Mineral object of the same pk, note that
+    Mineral.__eq__ itself doesn't know about rows, compare rows first.
+    """
+    __slots__ = ('pk', 'name')
+    fields = ('pk', 'name')
+
+    def __init__(self, pk, name=None):
+        self.pk = pk
+        self.name = name
+
+    def __eq__(self, other):
+        if isinstance(other, (MineralRow, Mineral)):
+            return self.pk is not None and self.pk == other.pk
+        return NotImplemented
+
+    def __hash__(self):
+        return hash(self.pk)
+
+    def __repr__(self):
+        return '<MineralRow: {} {}>'.format(self.pk, self.name)
+
+
+def project(queryset, row_class=MineralRow):
+    """
+    Fetches the queryset rows with only the columns of the row_class
+    :param queryset: A Mineral Queryset, possibly sliced
+    :param row_class: the row class to build, MineralRow by default
+    :return: A list of row_class objects
+    """
+    return [row_class(*values)
+            for values in queryset.values_list(*row_class.fields)]
+
+
+class FieldsRow(MineralRow):
+    """
+    A mineral row holding its pk, name and the values of more fields,
+    see fields_row_class
+    """
+    __slots__ = ('values',)
+    fields = ('pk', 'name')
+
+    def __init__(self, pk, name=None, *values):
+        super().__init__(pk, name)
+        self.values = values
+
+    def as_dict(self):
+        """
+        :return: A dict of the row fields names and values, its pk as id
+        """
+        return dict(zip(('id',) + self.fields[1:],
+                        (self.pk, self.name) + self.values))
+
+
+@functools.lru_cache(maxsize=64)
+def fields_row_class(fields):
+    """
+    :param fields: a tuple of Mineral field names besides pk and name
+    :return: A FieldsRow class fetching those fields as well
+    """
+    return type('FieldsRow', (FieldsRow,),
+                {'__slots__': (), 'fields': ('pk', 'name') + fields})
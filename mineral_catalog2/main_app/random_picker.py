@@ -0,0 +1,63 @@
+"""
+Random mineral picker, chooses a random mineral out of a cached compact
+array of the minerals primary keys
+"""
+import random
+import threading
+from array import array
+
+from .models import Mineral
+
+
+class RandomMineralPicker:
+    """
+    Keeps the primary keys of all minerals in an array of integers,
+    so picking a random mineral doesn't have to fetch the minerals table.
+    The array is dropped whenever a mineral is written and reloaded
+    lazily with a single pk only query.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pks = None
+        self.version = 0
+
+    def invalidate(self):
+        """
+        Drops the cached primary keys, called whenever a Mineral is written
+        """
+        with self._lock:
+            self.version += 1
+            self._pks = None
+
+    def pks(self):
+        """
+        :return: An array of all minerals primary keys
+        """
+        pks = self._pks
+        if pks is not None:
+            return pks
+
+        version = self.version
+        pks = array('q', Mineral.objects.values_list('pk', flat=True)
+                    .order_by('pk').iterator())
+        with self._lock:
+            # a write during the load makes the result stale already
+            if version == self.version:
+                self._pks = pks
+        return pks
+
+    def pick(self):
+        """
+        Chooses a random mineral
+        :return: A Mineral object having only its pk loaded, all other
+        fields are deferred, None if there are no minerals
+        """
+        pks = self.pks()
+        if not pks:
+            return None
+
+        return Mineral.from_db(None, ['id'], [random.choice(pks)])
+
+
+random_mineral_picker = RandomMineralPicker()
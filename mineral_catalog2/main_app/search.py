@@ -0,0 +1,372 @@
+"""
+Search backends, all share the same interface: a backend gets a search
+term and returns the pks of the matching minerals ordered by relevance.
+The SQLite FTS5 and the PostgreSQL full text backends use the database
+search index, the icontains backend is the fallback scanning every field.
+"""
+import contextlib
+import re
+import time
+
+from django.conf import settings
+from django.db import OperationalError, connection
+from django.db.models import Q
+from django.dispatch import receiver
+from django.test.signals import setting_changed
+from django.utils.module_loading import import_string
+
+from .models import Mineral
+
+# all the Mineral fields a search term is looked up in
+SEARCH_FIELDS = (
+    'name',
+    'image_caption',
+    'category',
+    'formula',
+    'strunz_classification',
+    'color',
+    'crystal_system',
+    'unit_cell',
+    'crystal_symmetry',
+    'cleavage',
+    'mohs_scale_hardness',
+    'luster',
+    'streak',
+    'diaphaneity',
+    'optical_properties',
+    'refractive_index',
+    'crystal_habit',
+    'specific_gravity',
+    'group',
+)
+
+TOKEN_RE = re.compile(r'\w+')
+
+# SQLite virtual machine instructions run between two deadline checks
+PROGRESS_HANDLER_INSTRUCTIONS = 1000
+
+
+class SearchTimeout(Exception):
+    """
+    Raised when a search runs past settings.MINERAL_SEARCH_TIMEOUT
+    """
+
+
+def tokenize(term):
+    """
+    Splits a search term into its lower cased words
+    :param term: String of the search term
+    :return: A list of tokens, empty if the term has no words
+    """
+    return TOKEN_RE.findall(term.lower())
+
+
+class SearchBackend:
+    """
+    Base class of the search backends
+    """
+
+    def is_available(self):
+        """
+        :return: True if the backend can be used on the current database
+        """
+        return True
+
+    def search(self, term, limit=None):
+        """
+        Looks up the term in all the SEARCH_FIELDS
+        :param term: String of the search term
+        :param limit: maximal number of pks to return, None for all of them
+        :return: A list of the matching minerals pks ordered by relevance,
+        None if the backend can't handle the term
+        """
+        raise NotImplementedError
+
+
+class IContainsSearchBackend(SearchBackend):
+    """
+    Matches any field containing the term, a full scan of the minerals table
+    """
+
+    def search(self, term, limit=None):
+        # filter using Q objects for OR relation search
+        query = Q()
+        for field in SEARCH_FIELDS:
+            query |= Q(**{field + '__icontains': term})
+
+        return list(Mineral.objects.filter(query)
+                    .values_list('pk', flat=True)[:limit])
+
+
+class SQLiteFTSSearchBackend(SearchBackend):
+    """
+    Prefix matches every word of the term using an FTS5 virtual table,
+    ranked by bm25 with the name weighted above all other fields.
+    The index is an external content table kept in sync by triggers.
+    """
+    vendor = 'sqlite'
+    table = 'main_app_mineral_fts'
+    triggers = ('main_app_mineral_fts_insert',
+                'main_app_mineral_fts_delete',
+                'main_app_mineral_fts_update')
+    name_weight = 10.0
+
+    def __init__(self):
+        self._available = None
+
+    def is_available(self):
+        if self._available is None:
+            self._available = (connection.vendor == self.vendor and
+                               self.table in connection.introspection
+                               .table_names())
+        return self._available
+
+    @staticmethod
+    def match_expression(term):
+        """
+        :return: FTS5 query string prefix matching all the term words,
+        empty if the term has no words
+        """
+        return ' '.join('"{}"*'.format(token) for token in tokenize(term))
+
+    def search(self, term, limit=None):
+        match = self.match_expression(term)
+        if not match:
+            return None
+
+        weights = ', '.join([str(self.name_weight)] +
+                            ['1.0'] * (len(SEARCH_FIELDS) - 1))
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'SELECT rowid FROM {table} WHERE {table} MATCH %s '
+                'ORDER BY bm25({table}, {weights}) LIMIT %s'
+                .format(table=self.table, weights=weights),
+                [match, -1 if limit is None else limit]
+            )
+            return [row[0] for row in cursor.fetchall()]
+
+    @classmethod
+    def install(cls, db_connection):
+        """
+        Creates the FTS5 table and its triggers if any of them is missing
+        and rebuilds the index from the minerals table.
+        Rebuilding is needed after SQLite migrations remaking the minerals
+        table, as dropping the old table drops its triggers as well.
+        """
+        table_name = Mineral._meta.db_table
+        with db_connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT name FROM sqlite_master WHERE name IN ({})"
+                .format(', '.join(['%s'] * (len(cls.triggers) + 1))),
+                [cls.table, *cls.triggers]
+            )
+            if len(cursor.fetchall()) == len(cls.triggers) + 1:
+                return
+
+            columns = ', '.join('"{}"'.format(field)
+                                for field in SEARCH_FIELDS)
+            new_values = ', '.join('new."{}"'.format(field)
+                                   for field in SEARCH_FIELDS)
+            old_values = ', '.join('old."{}"'.format(field)
+                                   for field in SEARCH_FIELDS)
+            delete_old = (
+                "INSERT INTO {fts}({fts}, rowid, {columns}) "
+                "VALUES ('delete', old.id, {old_values});"
+            )
+            insert_new = (
+                "INSERT INTO {fts}(rowid, {columns}) "
+                "VALUES (new.id, {new_values});"
+            )
+            statements = [
+                "CREATE VIRTUAL TABLE IF NOT EXISTS {fts} USING fts5("
+                "{columns}, content='{table}', content_rowid='id', "
+                "tokenize='unicode61 remove_diacritics 2', prefix='1 2 3')",
+                "CREATE TRIGGER IF NOT EXISTS {fts}_insert "
+                "AFTER INSERT ON {table} BEGIN " + insert_new + " END",
+                "CREATE TRIGGER IF NOT EXISTS {fts}_delete "
+                "AFTER DELETE ON {table} BEGIN " + delete_old + " END",
+                "CREATE TRIGGER IF NOT EXISTS {fts}_update "
+                "AFTER UPDATE ON {table} BEGIN " + delete_old + insert_new +
+                " END",
+                "INSERT INTO {fts}({fts}) VALUES ('rebuild')",
+            ]
+            for statement in statements:
+                cursor.execute(statement.format(
+                    fts=cls.table, table=table_name, columns=columns,
+                    new_values=new_values, old_values=old_values))
+
+    @classmethod
+    def uninstall(cls, db_connection):
+        with db_connection.cursor() as cursor:
+            for trigger in cls.triggers:
+                cursor.execute('DROP TRIGGER IF EXISTS {}'.format(trigger))
+            cursor.execute('DROP TABLE IF EXISTS {}'.format(cls.table))
+
+
+class PostgresSearchBackend(SearchBackend):
+    """
+    Prefix matches every word of the term using a GIN indexed tsvector
+    expression over all the SEARCH_FIELDS, ranked by ts_rank.
+    The queries repeat the exact indexed expression so the planner uses
+    the index, no extra column nor sync is needed.
+    """
+    vendor = 'postgresql'
+    index = 'main_app_mineral_search_idx'
+    document = "to_tsvector('simple', {})".format(
+        " || ' ' || ".join('"{}"'.format(field) for field in SEARCH_FIELDS)
+    )
+
+    def is_available(self):
+        return connection.vendor == self.vendor
+
+    def search(self, term, limit=None):
+        tokens = tokenize(term)
+        if not tokens:
+            return None
+
+        query = ' & '.join('{}:*'.format(token) for token in tokens)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT id FROM {table} "
+                "WHERE {document} @@ to_tsquery('simple', %s) "
+                "ORDER BY ts_rank({document}, to_tsquery('simple', %s)) DESC "
+                "LIMIT %s"
+                .format(table=Mineral._meta.db_table,
+                        document=self.document),
+                [query, query, limit]
+            )
+            return [row[0] for row in cursor.fetchall()]
+
+    @classmethod
+    def install(cls, db_connection):
+        with db_connection.cursor() as cursor:
+            cursor.execute(
+                'CREATE INDEX IF NOT EXISTS {index} ON {table} '
+                'USING GIN (({document}))'.format(
+                    index=cls.index, table=Mineral._meta.db_table,
+                    document=cls.document))
+
+    @classmethod
+    def uninstall(cls, db_connection):
+        with db_connection.cursor() as cursor:
+            cursor.execute('DROP INDEX IF EXISTS {}'.format(cls.index))
+
+
+# the database search index backends, by the database vendor
+INDEXED_BACKENDS = {
+    SQLiteFTSSearchBackend.vendor: SQLiteFTSSearchBackend,
+    PostgresSearchBackend.vendor: PostgresSearchBackend,
+}
+
+fallback_backend = IContainsSearchBackend()
+_backend = None
+
+
+def install_search_index(db_connection):
+    """
+    Creates the search index of the database vendor, if it has one
+    """
+    backend_class = INDEXED_BACKENDS.get(db_connection.vendor)
+    if backend_class is not None:
+        backend_class.install(db_connection)
+
+
+def uninstall_search_index(db_connection):
+    backend_class = INDEXED_BACKENDS.get(db_connection.vendor)
+    if backend_class is not None:
+        backend_class.uninstall(db_connection)
+
+
+def get_search_backend():
+    """
+    Gets the search backend set by settings.MINERAL_SEARCH_BACKEND,
+    by default the search index backend of the database vendor
+    :return: A SearchBackend object
+    """
+    global _backend
+    if _backend is None:
+        backend_path = getattr(settings, 'MINERAL_SEARCH_BACKEND', None)
+        if backend_path:
+            _backend = import_string(backend_path)()
+        else:
+            backend_class = INDEXED_BACKENDS.get(connection.vendor,
+                                                 IContainsSearchBackend)
+            _backend = backend_class()
+    return _backend
+
+
+@receiver(setting_changed)
+def reset_search_backend(setting, **kwargs):
+    global _backend
+    if setting == 'MINERAL_SEARCH_BACKEND':
+        _backend = None
+
+
+@contextlib.contextmanager
+def query_deadline(seconds):
+    """
+    Interrupts the queries of the default connection still running
+    seconds from now, SQLite queries by a progress handler checking the
+    clock, PostgreSQL ones by a statement_timeout
+    :param seconds: the time allowed, None for no deadline
+    :raise SearchTimeout: if a query was interrupted
+    """
+    if seconds is None or connection.vendor not in ('sqlite', 'postgresql'):
+        yield
+        return
+
+    connection.ensure_connection()
+    if connection.vendor == 'sqlite':
+        deadline = time.monotonic() + seconds
+        connection.connection.set_progress_handler(
+            lambda: time.monotonic() > deadline,
+            PROGRESS_HANDLER_INSTRUCTIONS)
+    else:
+        with connection.cursor() as cursor:
+            cursor.execute('SET statement_timeout = %s',
+                           [max(1, int(seconds * 1000))])
+    try:
+        yield
+    except OperationalError as error:
+        # 'interrupted' (SQLite) or 'canceling statement due to statement
+        # timeout' (PostgreSQL)
+        if 'interrupt' in str(error) or 'timeout' in str(error):
+            raise SearchTimeout(str(error)) from error
+        raise
+    finally:
+        if connection.vendor == 'sqlite':
+            connection.connection.set_progress_handler(None, 0)
+        else:
+            with connection.cursor() as cursor:
+                cursor.execute('SET statement_timeout = DEFAULT')
+
+
+def search_pks(term, limit=None):
+    """
+    Gets the pks of all the minerals whose any field matches the search term,
+    falls back to the icontains backend when the selected backend is not
+    available or can't handle the term.
+    The search is interrupted after settings.MINERAL_SEARCH_TIMEOUT
+    seconds, a slow term can't hold the worker any longer.
+    :param term: String of the search term
+    :param limit: maximal number of pks to return, None for all of them
+    :return: A list of pks ordered by relevance
+    :raise SearchTimeout: if the search ran out of time
+    """
+    backend = get_search_backend()
+    with query_deadline(settings.MINERAL_SEARCH_TIMEOUT):
+        pks = backend.search(term, limit) if backend.is_available() \
+            else None
+        if pks is None:
+            pks = fallback_backend.search(term, limit)
+    return pks
+
+
+def search_minerals(term, limit=None):
+    """
+    Gets the minerals matching the search term, see search_pks
+    :return: A list of Mineral objects ordered by relevance
+    """
+    pks = search_pks(term, limit)
+    minerals = Mineral.objects.in_bulk(pks)
+    return [minerals[pk] for pk in pks if pk in minerals]
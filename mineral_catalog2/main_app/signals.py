@@ -0,0 +1,161 @@
+"""
+Signal receivers keeping the in-process catalog caches in sync
+with the Mineral table
+"""
+import json
+
+from django.db import connections
+from django.db.models.signals import (post_delete, post_migrate, post_save,
+                                      pre_save)
+from django.dispatch import Signal, receiver
+
+from .facet_index import facet_index
+from .facets import facet_registry
+from .inverted_index import inverted_index
+from .models import Mineral
+from .page_cache import (bump_catalog_version, detail_tags, invalidate_tags,
+                         mineral_tags)
+from .parsing import formula_elements
+from .random_picker import random_mineral_picker
+from .search import install_search_index
+from .similarity import similar_minerals_json
+from .suggest_index import suggest_index
+
+# sent after bulk writes to the minerals table, which skip the
+# post_save/post_delete signals
+catalog_changed = Signal()
+
+
+@receiver(catalog_changed)
+def reset_catalog_caches(sender, **kwargs):
+    """
+    Drops all the in-process catalog caches, rebuilt on their next use
+    """
+    facet_registry.invalidate()
+    facet_index.invalidate()
+    random_mineral_picker.invalidate()
+    inverted_index.invalidate()
+    suggest_index.invalidate()
+    invalidate_tags(['catalog'])
+    bump_catalog_version()
+
+
+@receiver(post_save, sender=Mineral)
+def link_formula_elements(sender, instance, update_fields=None, raw=False,
+                          **kwargs):
+    """
+    Links a saved mineral to the elements of its formula, connected before
+    the receivers below, the purged pages are rendered with the new links
+    """
+    if not raw and (update_fields is None or 'formula' in update_fields):
+        instance.elements.set(formula_elements(instance.formula))
+
+
+@receiver([post_save, post_delete], sender=Mineral)
+def invalidate_facets(sender, **kwargs):
+    """
+    Any written mineral may add or remove a category or a streak
+    """
+    facet_registry.invalidate()
+
+
+@receiver([post_save, post_delete], sender=Mineral)
+def invalidate_random_picker(sender, signal, created=False, **kwargs):
+    """
+    Only added or deleted minerals change the primary keys
+    """
+    if created or signal is post_delete:
+        random_mineral_picker.invalidate()
+
+
+@receiver(post_save, sender=Mineral)
+def index_saved_mineral(sender, instance, **kwargs):
+    inverted_index.update(instance)
+    facet_index.update(instance)
+    suggest_index.update(instance)
+
+
+@receiver(post_delete, sender=Mineral)
+def unindex_deleted_mineral(sender, instance, **kwargs):
+    inverted_index.remove(instance.pk)
+    facet_index.remove(instance.pk)
+    suggest_index.remove(instance.pk)
+
+
+PAGE_TAG_FIELDS = ('pk', 'name_initial', 'category_slug', 'streak_slug')
+
+
+@receiver(pre_save, sender=Mineral)
+def remember_page_tags(sender, instance, **kwargs):
+    """
+    Keeps the tags of the pages the mineral belonged to before the save,
+    a renamed or recategorized mineral leaves those pages
+    """
+    old_values = None
+    if instance.pk is not None:
+        old_values = Mineral.objects.filter(pk=instance.pk) \
+            .values('name', *PAGE_TAG_FIELDS).first()
+    instance._old_page_tags = mineral_tags(old_values) if old_values \
+        else set()
+    instance._old_name = old_values['name'] if old_values else None
+
+
+@receiver([post_save, post_delete], sender=Mineral)
+def invalidate_pages(sender, instance, signal, created=False, **kwargs):
+    """
+    Purges the cached pages listing or showing the written mineral,
+    any written field may change the search results
+    """
+    old_tags = getattr(instance, '_old_page_tags', set())
+    new_tags = mineral_tags({field: getattr(instance, field)
+                             for field in PAGE_TAG_FIELDS})
+    tags = old_tags | new_tags | {'search'}
+    # a new, deleted or moved mineral may add or remove a sidebar facet
+    if created or signal is post_delete or \
+            {tag for tag in old_tags ^ new_tags
+             if tag.startswith(('category:', 'streak:'))}:
+        tags.add('facets')
+    invalidate_tags(tags)
+    bump_catalog_version()
+
+
+@receiver([post_save, post_delete], sender=Mineral)
+def update_similar_lists(sender, instance, signal, created=False, raw=False,
+                         **kwargs):
+    """
+    Drops a deleted mineral out of the similar minerals lists and renames a
+    renamed one, purging the detail pages showing them, until the
+    build_similar_minerals command runs again
+    """
+    deleted = signal is post_delete
+    renamed = not created and not raw and getattr(
+        instance, '_old_name', None) not in (None, instance.name)
+    if not deleted and not renamed:
+        return
+
+    written = []
+    # the lists are [[pk,"name"],...], only an item starts by '[pk,'
+    lists = Mineral.objects.filter(
+        similar_minerals__contains='[{},'.format(instance.pk)) \
+        .values_list('pk', 'similar_minerals')
+    for pk, similar in lists:
+        pairs = [(similar_pk, instance.name if similar_pk == instance.pk
+                  else name) for similar_pk, name in json.loads(similar)
+                 if not (deleted and similar_pk == instance.pk)]
+        Mineral.objects.filter(pk=pk).update(
+            similar_minerals=similar_minerals_json(pairs))
+        written.append(pk)
+    if written:
+        invalidate_tags([tag for pk in written for tag in detail_tags(pk)])
+
+
+@receiver(post_migrate)
+def ensure_search_index(sender, using, **kwargs):
+    """
+    SQLite migrations remaking the minerals table drop the search index
+    triggers, making sure they are back after every migrate
+    """
+    db_connection = connections[using]
+    if (sender.label == 'main_app' and Mineral._meta.db_table in
+            db_connection.introspection.table_names()):
+        install_search_index(db_connection)
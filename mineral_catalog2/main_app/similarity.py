@@ -0,0 +1,232 @@
+"""
+Similar minerals: the nearest neighbours of every mineral by the cosine
+similarity of feature vectors of its category, crystal systems, streak,
+lusters, colors, formula elements, hardness and specific gravity.
+Computed offline over the whole catalog by the build_similar_minerals
+command. Batches of rows are multiplied by the whole NumPy feature
+matrix at once. Without NumPy, a degraded mode scores the sparse vectors
+through postings lists of their features, quadratic in the catalog size,
+which only suits the smaller catalogs.
+Nothing here touches the database, so the worker processes only import
+this module and the parsing one.
+"""
+import heapq
+import json
+import math
+import multiprocessing
+from collections import defaultdict
+
+from .parsing import colors, crystal_systems, formula_elements, lusters
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+# the Mineral fields the features are computed from
+FEATURE_FIELDS = ('category', 'crystal_system', 'streak', 'luster', 'color',
+                  'formula', 'hardness_min', 'hardness_max',
+                  'specific_gravity_min', 'specific_gravity_max')
+
+# the share of every features group in the similarity, the values of a
+# group split its weight
+FEATURE_WEIGHTS = {
+    'category': 3.0,
+    'crystal_system': 1.0,
+    'streak': 1.0,
+    'luster': 1.0,
+    'color': 1.0,
+    'element': 3.0,
+    'hardness': 1.0,
+    'specific_gravity': 1.0,
+}
+
+# the numeric groups bins widths, a value is shared by its two nearest
+# bins, so close values still have a common feature
+BIN_WIDTHS = {'hardness': 1.0, 'specific_gravity': 0.5}
+
+
+def similar_minerals_json(pairs):
+    """
+    :param pairs: the (pk, name) pairs of the similar minerals, in order
+    :return: The compact JSON of a Mineral.similar_minerals list
+    """
+    return json.dumps([[pk, name] for pk, name in pairs],
+                      ensure_ascii=False, separators=(',', ':'))
+
+
+def midpoint(low, high):
+    """
+    :return: The middle of a measured range, None if it has no value
+    """
+    if low is None:
+        return None
+    return (low + (low if high is None else high)) / 2
+
+
+def binned(value, width):
+    """
+    :return: A dict of the bins of a value to their shares, e.g. {2: 0.75,
+    3: 0.25} for 2.25 with bins of width 1
+    """
+    if value is None:
+        return {}
+    position = value / width
+    low = math.floor(position)
+    share = position - low
+    return {bin_: weight for bin_, weight in ((low, 1 - share),
+                                              (low + 1, share)) if weight}
+
+
+def mineral_features(mineral):
+    """
+    :param mineral: a dict of the FEATURE_FIELDS values of a mineral
+    :return: A dict of the (group, value) features of the mineral to their
+    weights, a vector of unit norm where every group present has its
+    FEATURE_WEIGHTS share
+    """
+    category = (mineral['category'] or '').strip().lower()
+    groups = {
+        'category': [category] if category else [],
+        'crystal_system': crystal_systems(mineral['crystal_system']),
+        'streak': colors(mineral['streak']),
+        'luster': lusters(mineral['luster']),
+        'color': colors(mineral['color']),
+        'element': formula_elements(mineral['formula'] or ''),
+    }
+    groups = {group: dict.fromkeys(values, 1.0)
+              for group, values in groups.items()}
+    for group, width in BIN_WIDTHS.items():
+        groups[group] = binned(midpoint(mineral[group + '_min'],
+                                        mineral[group + '_max']), width)
+
+    features = {}
+    for group, values in groups.items():
+        norm = math.sqrt(sum(weight * weight for weight in values.values()))
+        scale = math.sqrt(FEATURE_WEIGHTS[group]) / norm if norm else 0
+        for value, weight in values.items():
+            features[group, value] = weight * scale
+    norm = math.sqrt(sum(weight * weight for weight in features.values()))
+    return {feature: weight / norm for feature, weight in features.items()}
+
+
+def feature_vectors(minerals):
+    """
+    :param minerals: an iterable of the FEATURE_FIELDS dicts of minerals
+    :return: A (number of columns, vectors) tuple, a sparse vector per
+    mineral, a list of its (column, weight) pairs
+    """
+    columns = {}
+    vectors = []
+    for mineral in minerals:
+        vectors.append([(columns.setdefault(feature, len(columns)), weight)
+                        for feature, weight
+                        in sorted(mineral_features(mineral).items())])
+    return len(columns), vectors
+
+
+class NeighbourFinder:
+    """
+    Scores vectors against all the others, the vectors being of unit norm
+    their dot products are their cosine similarities
+    :param columns: the number of columns of the vectors
+    :param vectors: the sparse vectors, see feature_vectors
+    :param use_numpy: None to use NumPy when it is installed
+    """
+
+    def __init__(self, columns, vectors, use_numpy=None):
+        self.count = len(vectors)
+        self.use_numpy = numpy is not None if use_numpy is None \
+            else use_numpy
+        if self.use_numpy:
+            self.matrix = numpy.zeros((self.count, max(columns, 1)),
+                                      dtype=numpy.float32)
+            for index, vector in enumerate(vectors):
+                for column, weight in vector:
+                    self.matrix[index, column] = weight
+        else:
+            self.vectors = vectors
+            self.postings = defaultdict(list)
+            for index, vector in enumerate(vectors):
+                for column, weight in vector:
+                    self.postings[column].append((index, weight))
+
+    def neighbours(self, start, stop, limit):
+        """
+        :return: A list, per vector of the [start, stop) range, of up to
+        limit (index, similarity) pairs of its nearest neighbours, the most
+        similar first, the lower indexes first among the equally similar.
+        The vectors sharing no feature aren't neighbours.
+        """
+        if self.use_numpy:
+            return self.numpy_neighbours(start, stop, limit)
+        return [self.python_neighbours(index, limit)
+                for index in range(start, stop)]
+
+    def numpy_neighbours(self, start, stop, limit):
+        scores = self.matrix[start:stop] @ self.matrix.T
+        rows = numpy.arange(stop - start)
+        # a mineral isn't its own neighbour
+        scores[rows, rows + start] = 0
+        limit = min(limit, self.count - 1)
+        if limit <= 0:
+            return [[] for _ in rows]
+        best = numpy.argpartition(-scores, limit - 1, axis=1)[:, :limit]
+        neighbours = []
+        for row, indexes in zip(rows, best):
+            similarities = scores[row, indexes]
+            order = numpy.lexsort((indexes, -similarities))
+            neighbours.append([(int(indexes[i]), float(similarities[i]))
+                               for i in order if similarities[i] > 0])
+        return neighbours
+
+    def python_neighbours(self, index, limit):
+        scores = defaultdict(float)
+        for column, weight in self.vectors[index]:
+            for other, other_weight in self.postings[column]:
+                scores[other] += weight * other_weight
+        scores.pop(index, None)
+        best = heapq.nsmallest(limit, ((-score, other) for other, score
+                                       in scores.items() if score > 0))
+        return [(other, -score) for score, other in best]
+
+
+# the NeighbourFinder of a worker process
+_finder = None
+
+
+def _start_worker(columns, vectors, use_numpy):
+    global _finder
+    _finder = NeighbourFinder(columns, vectors, use_numpy)
+
+
+def _worker_neighbours(args):
+    return _finder.neighbours(*args)
+
+
+def nearest_neighbours(columns, vectors, limit, workers=1, batch_size=256,
+                       use_numpy=None):
+    """
+    Finds the nearest neighbours of all the vectors, batch_size vectors at
+    a time, the batches shared by a pool of worker processes
+    :param columns: the number of columns of the vectors
+    :param vectors: the sparse vectors, see feature_vectors
+    :param limit: the number of neighbours of a vector
+    :param workers: the number of processes, a single batch is always
+    computed in process
+    :param batch_size: the number of vectors scored at a time, a NumPy
+    batch allocates batch_size floats per vector
+    :param use_numpy: None to use NumPy when it is installed
+    :return: A list of the NeighbourFinder.neighbours of every vector
+    """
+    batches = [(start, min(start + batch_size, len(vectors)), limit)
+               for start in range(0, len(vectors), batch_size)]
+    if workers > 1 and len(batches) > 1:
+        with multiprocessing.Pool(
+                min(workers, len(batches)), initializer=_start_worker,
+                initargs=(columns, vectors, use_numpy)) as pool:
+            results = pool.map(_worker_neighbours, batches, chunksize=1)
+    else:
+        finder = NeighbourFinder(columns, vectors, use_numpy)
+        results = [finder.neighbours(*batch) for batch in batches]
+    return [neighbours for batch in results for neighbours in batch]
@@ -0,0 +1,168 @@
+"""
+In-memory prefix index of the search suggestions: the minerals names,
+their synonyms, e.g. 'lead glance' of 'Galena (lead glance)', and their
+formulas. Every kind of entry is a sorted list of (normalized text, pk)
+tuples, the entries a prefix matches are a contiguous range found by
+bisect, so the first suggestions cost two binary searches whatever the
+catalog size.
+"""
+import re
+import threading
+import unicodedata
+from bisect import bisect_left, insort
+
+from .models import Mineral
+
+# the suggestions kinds, the best ones first
+KINDS = ('name', 'synonym', 'formula')
+
+# a name and its parenthesized synonym, the Levinson suffixes such as
+# 'Alum-(K)' are part of the name
+SYNONYM_RE = re.compile(r'^(.*?)\s+\(([^)]+)\)$')
+TAG_RE = re.compile(r'<[^>]*>')
+NON_WORD_RE = re.compile(r'[\W_]+')
+
+
+def normalize(text):
+    """
+    :return: The lower cased words of text, without accents, separated by
+    single spaces
+    """
+    text = unicodedata.normalize('NFKD', text)
+    text = ''.join(char for char in text if not unicodedata.combining(char))
+    return NON_WORD_RE.sub(' ', text.lower()).strip()
+
+
+def normalize_formula(formula):
+    """
+    :return: The formula text without its markup and spaces, lower cased,
+    e.g. 'fe2o3' for 'Fe<sub>2</sub>O<sub>3</sub>'
+    """
+    return ''.join(TAG_RE.sub('', formula).lower().split())
+
+
+def suggestion_entries(name, formula):
+    """
+    :return: A set of the (kind, normalized text, display text) entries
+    of a mineral
+    """
+    entries = set()
+    for part in name.split(','):
+        part = part.strip()
+        match = SYNONYM_RE.match(part)
+        if match:
+            part, synonym = match.groups()
+            entries.add(('synonym', normalize(synonym), synonym))
+        entries.add(('name', normalize(part), part))
+    if formula:
+        entries.add(('formula', normalize_formula(formula),
+                     TAG_RE.sub('', formula)))
+    return {entry for entry in entries if entry[1]}
+
+
+class SuggestIndex:
+    """
+    The sorted entries of every kind, built lazily with a single query,
+    then updated by the Mineral signals
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self.is_built = False
+        self._clear()
+
+    def _clear(self):
+        self._entries = {kind: [] for kind in KINDS}
+        self._texts = {}
+        self._names = {}
+        self._documents = {}
+
+    def build(self):
+        rows = Mineral.objects.values_list('pk', 'name', 'formula') \
+            .iterator()
+        with self._lock:
+            self._clear()
+            for pk, name, formula in rows:
+                self._add(pk, name, formula, append=True)
+            for entries in self._entries.values():
+                entries.sort()
+            self.is_built = True
+
+    def invalidate(self):
+        with self._lock:
+            self.is_built = False
+            self._clear()
+
+    def ensure_built(self):
+        if not self.is_built:
+            self.build()
+
+    def update(self, mineral):
+        """
+        Re-indexes a saved mineral, a no-op until the index is built
+        """
+        with self._lock:
+            if self.is_built:
+                self._remove(mineral.pk)
+                self._add(mineral.pk, mineral.name, mineral.formula)
+
+    def remove(self, pk):
+        with self._lock:
+            if self.is_built:
+                self._remove(pk)
+
+    def _add(self, pk, name, formula, append=False):
+        entries = suggestion_entries(name, formula)
+        for kind, key, text in entries:
+            if append:
+                self._entries[kind].append((key, pk))
+            else:
+                insort(self._entries[kind], (key, pk))
+            self._texts[kind, key, pk] = text
+        self._names[pk] = name
+        self._documents[pk] = [(kind, key) for kind, key, _ in entries]
+
+    def _remove(self, pk):
+        for kind, key in self._documents.pop(pk, ()):
+            entries = self._entries[kind]
+            index = bisect_left(entries, (key, pk))
+            if index < len(entries) and entries[index] == (key, pk):
+                del entries[index]
+            del self._texts[kind, key, pk]
+        self._names.pop(pk, None)
+
+    def suggest(self, term, limit=10):
+        """
+        Gets the minerals having an entry the normalized term prefixes,
+        the names matches first, then the synonyms and the formulas ones,
+        each kind in the entries order
+        :return: A list of up to limit dicts of the mineral id and name,
+        the matched text and its kind
+        """
+        self.ensure_built()
+        prefixes = {'name': normalize(term), 'synonym': normalize(term),
+                    'formula': normalize_formula(term)}
+        suggestions = []
+        seen = set()
+        with self._lock:
+            for kind in KINDS:
+                prefix = prefixes[kind]
+                if not prefix:
+                    continue
+                entries = self._entries[kind]
+                index = bisect_left(entries, (prefix,))
+                while len(suggestions) < limit and index < len(entries):
+                    key, pk = entries[index]
+                    if not key.startswith(prefix):
+                        break
+                    index += 1
+                    if pk in seen:
+                        continue
+                    seen.add(pk)
+                    suggestions.append({'id': pk, 'name': self._names[pk],
+                                        'match': self._texts[kind, key, pk],
+                                        'kind': kind})
+        return suggestions
+
+
+suggest_index = SuggestIndex()
@@ -0,0 +1,25 @@
+"""
+Template tags of the cached layout fragments, see main_app.fragments
+"""
+from django import template
+
+from .. import fragments
+
+register = template.Library()
+
+
+@register.simple_tag(takes_context=True)
+def facet_sidebar(context, attribute, selected=None):
+    """
+    {% facet_sidebar 'category' selected_category %}
+    """
+    return fragments.sidebar(context.template.engine, attribute,
+                             selected or None)
+
+
+@register.simple_tag(takes_context=True)
+def letter_bar(context, selected=None):
+    """
+    {% letter_bar selected_letter %}
+    """
+    return fragments.letter_bar(context.template.engine, selected or None)
@@ -1,13 +1,69 @@
-from django.test import TestCase
-from django.urls import reverse
+import asyncio
+import difflib
+import io
+import json
+import os
+import re
+import sqlite3
+import tempfile
+import threading
+import time
+import unittest
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import get_resolver, reverse
 from django.template.defaultfilters import slugify
-from django.db import models
+from django.db import connection, models
+from django.test.utils import CaptureQueriesContext
+
+from mineral_catalog2.sqlite_backend.base import DatabaseWrapper
+from mineral_catalog2.static_wsgi import StaticFilesMiddleware
+from mineral_catalog2.wsgi_to_asgi import WsgiToAsgi
+
+from . import api
+from .models import (DERIVED_FIELDS, Mineral, derived_values,
+                     detail_snapshot)
+from .signals import catalog_changed
+from .similarity import (feature_vectors, mineral_features,
+                         nearest_neighbours, numpy)
+from .facet_index import facet_index
+from .facets import facet_registry
+from .fragments import fragment_cache
+from .images import file_hash, image_sources
+from .importer import (import_minerals, index_formula_elements,
+                       iter_json_array)
+from .inverted_index import inverted_index
+from .page_cache import catalog_state, invalidate_tags
+from .parsing import (colors, crystal_systems, formula_elements, lusters,
+                      measured_ranges, parse_range)
+from .perf import Histogram, QueryRecorder, clear_stats, perf_recorder
+from .projections import MineralRow
+from .random_picker import random_mineral_picker
+from .suggest_index import suggest_index
+from .search import (IContainsSearchBackend, SearchTimeout,
+                     SQLiteFTSSearchBackend, get_search_backend,
+                     query_deadline, search_minerals)
+from .views import get_minerals_in_ranges
 
-from .models import Mineral
 
+class CatalogTestCase(TestCase):
+    """
+    Test rollbacks don't send the Mineral signals, starting every test
+    with empty page and in-process catalog caches
+    """
 
-class MineralViewTests(TestCase):
     def setUp(self):
+        cache.clear()
+        catalog_changed.send(sender=Mineral)
+
+
+class MineralViewTests(CatalogTestCase):
+    def setUp(self):
+        super().setUp()
         self.default_organic_gray_mineral = Mineral.objects.create(
             # A default mineral name should starts with 'A' letter
             name="Aowan",
@@ -164,10 +220,1652 @@ class MineralViewTests(TestCase):
                          response.context['minerals'])
 
 
-class ModelTests(TestCase):
+class FacetRegistryTests(CatalogTestCase):
+    def setUp(self):
+        super().setUp()
+        Mineral.objects.create(name="Aowan", category='Organic',
+                               streak='light gray')
+        Mineral.objects.create(name="Beeri", category='organic',
+                               streak='haze')
+
+    def test_facets_slugs(self):
+        self.assertEqual(facet_registry.get('category'), ['organic'])
+        self.assertEqual(facet_registry.get('streak'),
+                         ['haze', 'light-gray'])
+
+    def test_facets_are_cached_until_a_mineral_is_written(self):
+        facet_registry.all()
+        stats = facet_registry.stats()
+        with self.assertNumQueries(0):
+            facet_registry.all()
+        self.assertEqual(facet_registry.stats()['hits'], stats['hits'] + 1)
+
+        Mineral.objects.create(name="Coral", category='new', streak='red')
+        self.assertEqual(facet_registry.stats()['version'],
+                         stats['version'] + 1)
+        self.assertIn('new', facet_registry.get('category'))
+        self.assertEqual(facet_registry.stats()['misses'],
+                         stats['misses'] + 1)
+
+    def test_deleted_mineral_facets_are_removed(self):
+        Mineral.objects.get(name="Beeri").delete()
+        self.assertEqual(facet_registry.get('streak'), ['light-gray'])
+
+
+class RandomMineralPickerTests(CatalogTestCase):
+    def setUp(self):
+        super().setUp()
+        self.minerals = [Mineral.objects.create(name=name)
+                         for name in ("Aowan", "Beeri", "borkani")]
+
+    def test_pick_does_not_query_once_loaded(self):
+        random_mineral_picker.pick()
+        with self.assertNumQueries(0):
+            random_mineral = random_mineral_picker.pick()
+        self.assertIn(random_mineral, self.minerals)
+
+    def test_picker_follows_added_and_deleted_minerals(self):
+        added = Mineral.objects.create(name="Coral")
+        self.assertIn(added.pk, random_mineral_picker.pks())
+
+        for mineral in self.minerals:
+            mineral.delete()
+        self.assertEqual(random_mineral_picker.pick(), added)
+
+        added.delete()
+        self.assertIsNone(random_mineral_picker.pick())
+
+
+class SearchTests(CatalogTestCase):
+    def setUp(self):
+        super().setUp()
+        self.galena = Mineral.objects.create(
+            name="Galena", category='Sulfide', color='Lead grey',
+            streak='Lead grey')
+        self.grey = Mineral.objects.create(
+            name="Greyite", category='Oxide', color='Pale green')
+        self.copper = Mineral.objects.create(
+            name="Copper", category='Native element', color='Copper red',
+            formula='Cu')
+
+    def test_sqlite_uses_the_fts_backend(self):
+        backend = get_search_backend()
+        self.assertIsInstance(backend, SQLiteFTSSearchBackend)
+        self.assertTrue(backend.is_available())
+
+    def test_prefix_match_ranks_names_first(self):
+        self.assertEqual(search_minerals('gre'),
+                         [self.grey, self.galena])
+        self.assertEqual(search_minerals('lead gr'), [self.galena])
+
+    def test_index_follows_updated_and_deleted_minerals(self):
+        self.copper.color = 'Orange'
+        self.copper.save()
+        self.assertEqual(search_minerals('red'), [])
+
+        self.galena.delete()
+        self.assertEqual(search_minerals('lead'), [])
+
+    def test_terms_without_words_fall_back_to_icontains(self):
+        self.assertEqual(SQLiteFTSSearchBackend().search('-'), None)
+        self.assertEqual(search_minerals(''),
+                         [self.galena, self.grey, self.copper])
+
+    def test_icontains_backend_matches_substrings(self):
+        self.assertEqual(IContainsSearchBackend().search('ead'),
+                         [self.galena.pk])
+
+
+@override_settings(MINERAL_SEARCH_BACKEND='main_app.inverted_index'
+                                         '.InvertedIndexSearchBackend')
+class InvertedIndexTests(CatalogTestCase):
+    def setUp(self):
+        super().setUp()
+        self.galena = Mineral.objects.create(
+            name="Galena", category='Sulfide', color='Lead grey')
+        self.grey = Mineral.objects.create(
+            name="Greyite", category='Oxide', color='Pale green')
+        inverted_index.build()
+
+    def test_token_and_prefix_lookups_rank_names_first(self):
+        self.assertEqual(search_minerals('sulfide'), [self.galena])
+        self.assertEqual(search_minerals('gre'), [self.grey, self.galena])
+        self.assertEqual(search_minerals('lead gr'), [self.galena])
+
+    def test_trigram_lookup_tolerates_typos(self):
+        self.assertEqual(search_minerals('gallena'), [self.galena])
+        self.assertEqual(search_minerals('qwerty'), [])
+
+    def test_index_is_updated_incrementally(self):
+        with self.assertNumQueries(0):
+            self.assertEqual(inverted_index.search('pale'), [self.grey.pk])
+
+        self.grey.color = 'Red'
+        self.grey.save()
+        copper = Mineral.objects.create(name="Copper", color='Pale red')
+        self.galena.delete()
+        with self.assertNumQueries(0):
+            self.assertEqual(inverted_index.search('pale'), [copper.pk])
+            self.assertEqual(inverted_index.search('red'),
+                             [self.grey.pk, copper.pk])
+            self.assertEqual(inverted_index.search('lead'), [])
+
+
+@override_settings(MINERALS_PAGE_SIZE=2)
+class PaginationTests(CatalogTestCase):
+    def setUp(self):
+        super().setUp()
+        for name in ("Aowan", "Abelsonite", "Adamite", "Azurite", "Amber"):
+            Mineral.objects.create(name=name, color='gray')
+
+    def names(self, response):
+        return [mineral.name for mineral in response.context['minerals']]
+
+    def test_keyset_pages_follow_name_order(self):
+        response = self.client.get(reverse('minerals:list'))
+        self.assertEqual(self.names(response), ["Abelsonite", "Adamite"])
+        page = response.context['page']
+        self.assertFalse(page.has_previous)
+        self.assertContains(response, page.next_query)
+
+        response = self.client.get(reverse('minerals:list') + '?' +
+                                   page.next_query)
+        self.assertEqual(self.names(response), ["Amber", "Aowan"])
+
+        # inserting before the cursor doesn't shift the following pages
+        Mineral.objects.create(name="Actinolite")
+        page = response.context['page']
+        response = self.client.get(reverse('minerals:list') + '?' +
+                                   page.next_query)
+        self.assertEqual(self.names(response), ["Azurite"])
+        self.assertFalse(response.context['page'].has_next)
+
+        response = self.client.get(reverse('minerals:list') + '?' +
+                                   response.context['page'].previous_query)
+        self.assertEqual(self.names(response), ["Amber", "Aowan"])
+        self.assertTrue(response.context['page'].has_previous)
+
+    def test_search_pages_keep_the_term(self):
+        response = self.client.get(reverse('minerals:search'),
+                                   {'q': 'gray', 'page_size': 3})
+        self.assertEqual(self.names(response),
+                         ["Abelsonite", "Adamite", "Amber"])
+        self.assertIn('q=gray', response.context['page'].next_query)
+
+    @override_settings(MINERALS_MAX_PAGE_SIZE=3)
+    def test_page_size_is_bounded_and_bad_cursors_ignored(self):
+        response = self.client.get(reverse('minerals:list'),
+                                   {'page_size': 50, 'after': '!!'})
+        self.assertEqual(len(response.context['minerals']), 3)
+
+
+class ProjectionTests(CatalogTestCase):
+    def setUp(self):
+        super().setUp()
+        self.mineral = Mineral.objects.create(
+            name="Aowan", formula='C<sub>31</sub>H<sub>32</sub>',
+            unit_cell='a = 8.508 Å', streak='gray')
+
+    def selected_columns(self, url, params=None):
+        """
+        :return: The sets of columns of every minerals table SELECT
+        """
+        random_mineral_picker.pks()
+        facet_registry.all()
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(url, params)
+        return [
+            {column.strip().split('.')[-1].strip('"') for column in
+             query['sql'][len('SELECT '):query['sql'].index(' FROM ')]
+             .split(',')}
+            for query in queries.captured_queries
+            if query['sql'].startswith('SELECT') and
+            ' FROM "main_app_mineral" ' in query['sql']
+        ]
+
+    def test_list_pages_fetch_pk_and_name_only(self):
+        self.assertEqual(self.selected_columns(reverse('minerals:list')),
+                         [{'id', 'name'}])
+        self.assertEqual(self.selected_columns(reverse('minerals:search'),
+                                               {'q': 'gray'}),
+                         [{'id', 'name'}])
+
+    def test_rows_compare_equal_to_their_mineral(self):
+        self.assertEqual(MineralRow(self.mineral.pk), self.mineral)
+        self.assertNotEqual(MineralRow(None), Mineral())
+
+    def test_random_pick_loads_the_pk_only(self):
+        random_mineral = random_mineral_picker.pick()
+        self.assertEqual(random_mineral, self.mineral)
+        self.assertEqual(random_mineral.get_deferred_fields(),
+                         {field.attname for field in Mineral._meta.fields
+                          if field.attname != 'id'})
+
+
+class ImporterTests(CatalogTestCase):
+    records = [
+        {'name': "Aowan", 'category': 'Organic', 'streak': 'light gray',
+         'formula': 'C<sub>31</sub>'},
+        {'name': "Beeri", 'category': 'Organic', 'streak': 'haze'},
+        {'name': "Coral", 'category': 'New', 'streak': 'red'},
+    ]
+
+    def test_json_array_is_parsed_incrementally(self):
+        data = json.dumps(self.records + [12345, [1, 2], "s"], indent=2)
+        for chunk_size in (1, 7, 1 << 16):
+            self.assertEqual(
+                list(iter_json_array(io.StringIO(data), chunk_size)),
+                self.records + [12345, [1, 2], "s"])
+        self.assertEqual(list(iter_json_array(io.StringIO(' [ ] '))), [])
+        with self.assertRaises(ValueError):
+            list(iter_json_array(io.StringIO('[{"name": "Aowan"}')))
+
+    def test_import_in_batches_and_upsert_by_name(self):
+        # 2 batch inserts, then the formulas elements index rebuilt with
+        # a constant number of queries
+        with self.assertNumQueries(10):
+            stats = import_minerals(iter(self.records), batch_size=2)
+        self.assertEqual((stats['created'], stats['updated']), (3, 0))
+        self.assertEqual(Mineral.objects.get(name="Coral").category_slug,
+                         'new')
+        self.assertEqual(facet_registry.get('streak'),
+                         ['haze', 'light-gray', 'red'])
+
+        stats = import_minerals(
+            [{'name': "Coral", 'category': 'Oxide', 'streak': 'red'},
+             {'name': "Dune", 'category': 'Oxide', 'streak': 'red'}],
+            upsert=True)
+        self.assertEqual((stats['created'], stats['updated']), (1, 1))
+        self.assertEqual(Mineral.objects.count(), 4)
+        self.assertEqual(
+            Mineral.objects.filter(category_slug='oxide').count(), 2)
+        self.assertNotIn('new', facet_registry.get('category'))
+
+    def test_upsert_looks_the_names_up_within_the_parameters_limit(self):
+        import_minerals(iter(self.records))
+        with mock.patch.object(connection.ops, 'bulk_batch_size',
+                               return_value=2), \
+                CaptureQueriesContext(connection) as queries:
+            stats = import_minerals(iter(self.records), upsert=True)
+        self.assertEqual((stats['created'], stats['updated']), (0, 3))
+        self.assertEqual(len([query for query in queries
+                              if '"name" IN' in query['sql']]), 2)
+
+    def test_import_minerals_command(self):
+        with tempfile.NamedTemporaryFile('w', suffix='.json') as data:
+            json.dump(self.records, data)
+            data.flush()
+            out = io.StringIO()
+            call_command('import_minerals', data.name, batch_size=2,
+                         stdout=out)
+        self.assertIn('3 created, 0 updated', out.getvalue())
+        self.assertEqual(search_minerals('coral'),
+                         [Mineral.objects.get(name="Coral")])
+
+
+class PageCacheTests(CatalogTestCase):
+    def setUp(self):
+        super().setUp()
+        self.aowan = Mineral.objects.create(name="Aowan", category='Oxide',
+                                            streak='red')
+        self.beeri = Mineral.objects.create(name="Beeri", category='Oxide',
+                                            streak='white')
+
+    def get(self, name, **kwargs):
+        return self.client.get(reverse(name, kwargs=kwargs))
+
+    def test_pages_are_served_from_the_cache(self):
+        detail = {'pk': self.aowan.pk}
+        self.assertEqual(self.get('minerals:list')['X-Page-Cache'], 'miss')
+        self.assertEqual(self.get('minerals:detail', **detail)
+                         ['X-Page-Cache'], 'miss')
+        with self.assertNumQueries(0):
+            response = self.get('minerals:list')
+            self.assertEqual(response['X-Page-Cache'], 'hit')
+            self.assertContains(response, "Aowan")
+            response = self.get('minerals:detail', **detail)
+            self.assertEqual(response['X-Page-Cache'], 'hit')
+
+    def test_a_non_canonical_pk_page_is_purged_by_a_write(self):
+        url = '/mineral/0{}/'.format(self.aowan.pk)
+        etag = self.client.get(url)['ETag']
+        self.aowan.image_caption = 'A red crystal'
+        self.aowan.save()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['X-Page-Cache'], 'miss')
+        self.assertContains(response, 'A red crystal')
+
+    @override_settings(CACHES={'default': {
+        'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}})
+    def test_pages_are_rendered_without_a_storing_cache(self):
+        for _ in range(2):
+            response = self.get('minerals:list')
+            self.assertEqual(response['X-Page-Cache'], 'miss')
+            self.assertContains(response, "Aowan")
+
+    def test_random_link_is_injected_on_every_hit(self):
+        self.get('minerals:list')
+        links = set()
+        for _ in range(30):
+            content = self.get('minerals:list').content.decode()
+            self.assertNotIn('__random_mineral_url__', content)
+            links.add(re.search(r'id="random-mineral" class="[^"]*" '
+                                r'href="([^"]*)"', content).group(1))
+        self.assertEqual(links, {
+            reverse('minerals:detail', kwargs={'pk': mineral.pk})
+            for mineral in (self.aowan, self.beeri)})
+
+    def test_writes_purge_only_the_dependent_pages(self):
+        letter_b = {'letter': 'b'}
+        category = {'selected_category': 'oxide'}
+        for name, kwargs in (('minerals:list', {}),
+                             ('minerals:list_by_letter', letter_b),
+                             ('minerals:list_by_category', category)):
+            self.get(name, **kwargs)
+
+        # no other letter nor facet changes
+        self.beeri.color = 'green'
+        self.beeri.save()
+        self.assertEqual(self.get('minerals:list')['X-Page-Cache'], 'hit')
+        self.assertEqual(self.get('minerals:list_by_letter', **letter_b)
+                         ['X-Page-Cache'], 'miss')
+        self.assertEqual(self.get('minerals:list_by_category', **category)
+                         ['X-Page-Cache'], 'miss')
+
+        # moving to letter a purges the old and new letter pages
+        self.beeri.name = "Amber"
+        self.beeri.save()
+        self.assertNotContains(
+            self.get('minerals:list_by_letter', **letter_b), "Beeri")
+        self.assertContains(self.get('minerals:list'), "Amber")
+
+    @override_settings(CACHES={'default': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': tempfile.mkdtemp(),
+    }})
+    def test_file_based_cache_backend(self):
+        self.get('minerals:list')
+        self.assertEqual(self.get('minerals:list')['X-Page-Cache'], 'hit')
+        self.aowan.delete()
+        response = self.get('minerals:list')
+        self.assertEqual(response['X-Page-Cache'], 'miss')
+        self.assertNotContains(response, "Aowan")
+
+
+class ConditionalGetTests(CatalogTestCase):
+    def setUp(self):
+        super().setUp()
+        self.aowan = Mineral.objects.create(name="Aowan", streak='red')
+        self.beeri = Mineral.objects.create(name="Beeri", streak='red')
+
+    def test_matching_etag_is_not_modified(self):
+        for url in (reverse('minerals:list'),
+                    reverse('minerals:detail', kwargs={'pk': self.aowan.pk}),
+                    reverse('minerals:search') + '?q=red'):
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            etag = response['ETag']
+            self.assertTrue(etag.startswith('"'))
+            # clearing the cache renews the tags versions, so the old ETag
+            # doesn't match anymore
+            cache.clear()
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(response.status_code, 200)
+
+            # answered before any query or rendering
+            etag = response['ETag']
+            with self.assertNumQueries(0):
+                response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(response.status_code, 304)
+            self.assertEqual(response.content, b'')
+
+    def test_etags_change_with_the_page_dependencies(self):
+        detail = reverse('minerals:detail', kwargs={'pk': self.aowan.pk})
+        list_etag = self.client.get(reverse('minerals:list'))['ETag']
+        detail_etag = self.client.get(detail)['ETag']
+
+        self.beeri.color = 'green'
+        self.beeri.save()
+        self.assertEqual(self.client.get(reverse('minerals:list'))['ETag'],
+                         list_etag)
+        self.assertEqual(self.client.get(detail)['ETag'], detail_etag)
+
+        self.aowan.color = 'green'
+        self.aowan.save()
+        self.assertEqual(self.client.get(
+            reverse('minerals:list'), HTTP_IF_NONE_MATCH=list_etag
+        ).status_code, 200)
+        self.assertNotEqual(self.client.get(detail)['ETag'], detail_etag)
+
+    def test_if_modified_since(self):
+        response = self.client.get(reverse('minerals:list'))
+        last_modified = response['Last-Modified']
+        self.assertEqual(self.client.get(
+            reverse('minerals:list'), HTTP_IF_MODIFIED_SINCE=last_modified
+        ).status_code, 304)
+
+    def test_writes_update_the_mineral_and_catalog_timestamps(self):
+        updated_at = self.aowan.updated_at
+        version, last_modified = catalog_state()
+        self.aowan.save()
+        self.assertGreater(self.aowan.updated_at, updated_at)
+        self.assertNotEqual(catalog_state()[0], version)
+        self.assertGreaterEqual(catalog_state()[1], self.aowan.updated_at)
+
+
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
+
+
+@unittest.skipIf(Image is None, 'requires Pillow')
+class ImageVariantsTests(CatalogTestCase):
+    def setUp(self):
+        super().setUp()
+        self.static_dir = tempfile.TemporaryDirectory()
+        self.variants_dir = tempfile.TemporaryDirectory()
+        os.makedirs(os.path.join(self.static_dir.name, 'data', 'images'))
+        Image.new('RGB', (300, 200), 'red').save(os.path.join(
+            self.static_dir.name, 'data', 'images', 'Testite.jpg'))
+        self.mineral = Mineral.objects.create(
+            name="Testite", image_filename='Testite.jpg')
+        settings_override = override_settings(
+            STATICFILES_DIRS=[self.static_dir.name],
+            MINERAL_IMAGE_VARIANTS_DIR=self.variants_dir.name)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.addCleanup(self.static_dir.cleanup)
+        self.addCleanup(self.variants_dir.cleanup)
+
+    def build(self, *args):
+        out = io.StringIO()
+        call_command('build_image_variants', '--workers=1', *args,
+                     stdout=out)
+        return out.getvalue()
+
+    def test_variants_are_built_incrementally(self):
+        self.assertIn('1 images built, 0 unchanged', self.build())
+        self.assertEqual(
+            sorted(name for name in os.listdir(self.variants_dir.name)
+                   if name != 'manifest.json'),
+            ['Testite-{}-{}.{}'.format(file_hash(os.path.join(
+                self.static_dir.name, 'data', 'images', 'Testite.jpg'))[:10],
+                width, extension)
+             for width in (120, 240, 300) for extension in ('jpg', 'webp')])
+        self.assertIn('0 images built, 1 unchanged', self.build())
+
+        Image.new('RGB', (100, 100), 'blue').save(os.path.join(
+            self.static_dir.name, 'data', 'images', 'Testite.jpg'))
+        self.assertIn('1 images built, 0 unchanged, 6 stale variants '
+                      'removed', self.build())
+
+    def test_detail_page_renders_the_srcset(self):
+        image = image_sources('Testite.jpg')
+        self.assertEqual(image['sources'], [])
+        self.assertTrue(image['src'].endswith('data/images/Testite.jpg'))
+
+        self.build('--widths=100')
+        response = self.client.get(
+            reverse('minerals:detail', kwargs={'pk': self.mineral.pk}))
+        self.assertContains(response, 'type="image/webp"')
+        self.assertRegex(response.content.decode(),
+                         r'srcset="[^"]*Testite-\w+-100.webp 100w, '
+                         r'[^"]*Testite-\w+-300.webp 300w"')
+
+
+class StaticFilesTests(CatalogTestCase):
+    def setUp(self):
+        super().setUp()
+        self.assets_dir = tempfile.TemporaryDirectory()
+        self.static_root = tempfile.TemporaryDirectory()
+        self.addCleanup(self.assets_dir.cleanup)
+        self.addCleanup(self.static_root.cleanup)
+        os.makedirs(os.path.join(self.assets_dir.name, 'css'))
+        with open(os.path.join(self.assets_dir.name, 'css', 'site.css'),
+                  'w') as css:
+            css.write('.minerals__anchor { color: #333; }\n' * 100)
+        settings_override = override_settings(
+            STATICFILES_DIRS=[self.assets_dir.name],
+            STATIC_ROOT=self.static_root.name)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        call_command('collectstatic', interactive=False, verbosity=0)
+        self.application = StaticFilesMiddleware(self.wrapped_application)
+
+    @staticmethod
+    def wrapped_application(environ, start_response):
+        start_response('200 OK', [])
+        return [b'application']
+
+    def request(self, path, **environ):
+        """
+        Calls the middleware directly
+        :return: The (status, headers dict, body) of the response
+        """
+        response = {}
+
+        def start_response(status, headers):
+            response.update(status=status, headers=dict(headers))
+
+        environ.setdefault('REQUEST_METHOD', 'GET')
+        body = b''.join(self.application(
+            dict(environ, PATH_INFO=path),
+            start_response))
+        return response['status'], response['headers'], body
+
+    def hashed_name(self):
+        with open(os.path.join(self.static_root.name,
+                               'staticfiles.json')) as manifest:
+            return json.load(manifest)['paths']['css/site.css']
+
+    def test_collectstatic_writes_hashed_and_compressed_files(self):
+        hashed_name = self.hashed_name()
+        self.assertRegex(hashed_name, r'^css/site\.\w{12}\.css$')
+        for name in (hashed_name, hashed_name + '.gz', 'css/site.css.gz'):
+            self.assertTrue(os.path.exists(
+                os.path.join(self.static_root.name, name)), name)
+
+    def test_hashed_files_are_served_compressed_and_immutable(self):
+        status, headers, body = self.request(
+            '/static/' + self.hashed_name(), HTTP_ACCEPT_ENCODING='gzip, br')
+        self.assertEqual(status, "200 OK", body[:3000])
+        self.assertEqual(headers['Content-Encoding'], 'gzip')
+        self.assertEqual(headers['Vary'], 'Accept-Encoding')
+        self.assertIn('immutable', headers['Cache-Control'])
+        self.assertEqual(int(headers['Content-Length']), len(body))
+
+        status, _, body = self.request(
+            '/static/' + self.hashed_name(),
+            HTTP_IF_NONE_MATCH=headers['ETag'], HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual((status, body), ('304 Not Modified', b''))
+
+    def test_unhashed_and_unknown_paths(self):
+        status, headers, body = self.request('/static/css/site.css')
+        self.assertNotIn('Content-Encoding', headers)
+        self.assertNotIn('immutable', headers['Cache-Control'])
+        self.assertTrue(body.startswith(b'.minerals__anchor'))
+
+        for path in ('/', '/static/css/missing.css'):
+            self.assertEqual(self.request(path)[2], b'application')
+
+
+class PerfTests(CatalogTestCase):
+    def setUp(self):
+        super().setUp()
+        self.snapshot_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.snapshot_dir.cleanup)
+        settings_override = override_settings(
+            MINERAL_PERF_SNAPSHOT_DIR=self.snapshot_dir.name,
+            MINERAL_PERF_ENDPOINT=True)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        clear_stats()
+        self.addCleanup(clear_stats)
+        Mineral.objects.create(name="Aowan", category='Silicate')
+
+    def test_histogram_percentiles(self):
+        histogram = Histogram()
+        for value in range(1, 100001):
+            histogram.record(value)
+        for percent in (50, 95, 99):
+            expected = percent * 1000
+            self.assertAlmostEqual(histogram.percentile(percent), expected,
+                                   delta=expected / 64)
+        self.assertEqual((histogram.min, histogram.max), (1, 100000))
+
+        merged = Histogram.from_dict(json.loads(json.dumps(
+            histogram.to_dict())))
+        merged.merge(histogram)
+        self.assertEqual(merged.count, 200000)
+        self.assertEqual(merged.percentile(50), histogram.percentile(50))
+
+    def test_requests_are_recorded_per_view(self):
+        self.client.get(reverse('minerals:list'))
+        self.client.get(reverse('minerals:list'))
+        self.client.get(reverse('minerals:search'), {'q': 'aowan'})
+
+        views = perf_recorder.views
+        self.assertEqual(views['minerals:list'].histograms['wall_ms'].count,
+                         2)
+        rendered = views['minerals:search'].histograms
+        self.assertGreater(rendered['queries'].max, 0)
+        self.assertGreater(rendered['template_ms'].max, 0)
+        self.assertGreater(rendered['response_bytes'].max, 0)
+
+    def test_duplicate_and_n_plus_one_queries_are_flagged(self):
+        queries = QueryRecorder()
+        with connection.execute_wrapper(queries):
+            for mineral in Mineral.objects.all():
+                Mineral.objects.get(pk=mineral.pk)
+                Mineral.objects.get(pk=mineral.pk)
+            for pk in range(-5, 0):
+                list(Mineral.objects.filter(pk=pk))
+        duplicates, n_plus_one = queries.flagged()
+        self.assertEqual(list(duplicates.values()), [1])
+        # the same SQL ran with 6 different pks
+        self.assertEqual(list(n_plus_one.values()), [6])
+
+    def test_report_merges_the_process_snapshots(self):
+        self.client.get(reverse('minerals:list'))
+        perf_recorder.write_snapshot()
+        with open(os.path.join(self.snapshot_dir.name, '1.json'),
+                  'w') as snapshot:
+            json.dump(perf_recorder.to_dict(), snapshot)
+
+        out = io.StringIO()
+        call_command('perf_report', '--json', stdout=out)
+        report = json.loads(out.getvalue())
+        self.assertEqual(report['minerals:list']['wall_ms']['count'], 2)
+        self.assertEqual(set(report['minerals:list']['wall_ms']),
+                         {'count', 'mean', 'max', 'p50', 'p95', 'p99'})
+
+    def test_endpoint_is_staff_only(self):
+        self.client.get(reverse('minerals:list'))
+        response = self.client.get(reverse('minerals:perf'))
+        self.assertEqual(response.status_code, 302)
+
+        User.objects.create_user('admin', password='secret', is_staff=True)
+        self.client.login(username='admin', password='secret')
+        response = self.client.get(reverse('minerals:perf'))
+        self.assertIn('minerals:list', response.json())
+
+        with self.settings(MINERAL_PERF_ENDPOINT=False):
+            response = self.client.get(reverse('minerals:perf'))
+        self.assertEqual(response.status_code, 404)
+
+
+class QueryBudgetTests(CatalogTestCase):
+    """
+    Pins the SQL run by every route on a page cache miss, the in-process
+    caches being warm, whatever the catalog size. The expected SQL is
+    recorded in query_budgets.json, rewrite it after an intended change:
+        UPDATE_QUERY_BUDGETS=1 python manage.py test \\
+            main_app.tests.QueryBudgetTests
+    """
+    budgets_path = os.path.join(os.path.dirname(__file__),
+                                'query_budgets.json')
+    catalog_sizes = (3, 250)
+    # the staff only perf endpoint is disabled by default, the export
+    # streams the whole catalog by design
+    exempt_routes = {'minerals:perf', 'api:export'}
+
+    def setUp(self):
+        super().setUp()
+        with open(self.budgets_path) as budgets:
+            self.budgets = json.load(budgets)
+
+    def seed(self, count):
+        """
+        Grows the catalog to count minerals
+        """
+        categories = ['Oxide', 'Silicate', 'Sulfide']
+        streaks = ['White', 'Red']
+        minerals = [
+            Mineral(name='{}{:04}ite'.format('ABC'[i % 3], i),
+                    category=categories[i % 3], streak=streaks[i % 2],
+                    category_slug=slugify(categories[i % 3]),
+                    streak_slug=slugify(streaks[i % 2]),
+                    name_initial='abc'[i % 3], formula='Fe2O3',
+                    hardness_min=i % 7, hardness_max=i % 7 + 1,
+                    specific_gravity_min=3.5, specific_gravity_max=3.5)
+            for i in range(Mineral.objects.count(), count)]
+        for mineral in minerals:
+            mineral.detail_snapshot = detail_snapshot(mineral)
+        Mineral.objects.bulk_create(minerals)
+        index_formula_elements()
+        catalog_changed.send(sender=Mineral)
+
+    def route_paths(self):
+        mineral = Mineral.objects.order_by('pk').first()
+        return {
+            'minerals:list': reverse('minerals:list'),
+            'minerals:list_by_letter': reverse(
+                'minerals:list_by_letter', kwargs={'letter': 'b'}),
+            'minerals:list_by_category': reverse(
+                'minerals:list_by_category',
+                kwargs={'selected_category': 'oxide'}),
+            'minerals:list_by_streak': reverse(
+                'minerals:list_by_streak',
+                kwargs={'selected_streak': 'red'}),
+            'minerals:list_by_element': reverse(
+                'minerals:list_by_element', kwargs={'symbols': 'Fe,O'}),
+            'minerals:detail': reverse('minerals:detail',
+                                       kwargs={'pk': mineral.pk}),
+            'minerals:search': reverse('minerals:search') + '?q=fe2o3',
+            'minerals:suggest': reverse('minerals:suggest') + '?q=a0',
+            'minerals:filter': reverse('minerals:filter') +
+            '?hardness_min=2&hardness_max=6&sg_min=3',
+            'api:list': reverse('api:list'),
+            'api:list_by_letter': reverse(
+                'api:list_by_letter', kwargs={'letter': 'b'}),
+            'api:list_by_category': reverse(
+                'api:list_by_category',
+                kwargs={'selected_category': 'oxide'}),
+            'api:list_by_streak': reverse(
+                'api:list_by_streak', kwargs={'selected_streak': 'red'}),
+            'api:detail': reverse('api:detail', kwargs={'pk': mineral.pk}),
+            'api:search': reverse('api:search') + '?q=fe2o3',
+            'api:filter': reverse('api:filter') +
+            '?hardness_min=2&hardness_max=6&sg_min=3&fields=formula',
+        }
+
+    @staticmethod
+    def normalize(sql):
+        # IN lists grow with the catalog, not the number of queries
+        return re.sub(r'\(%s(, %s)*\)', '(...)', sql)
+
+    def captured_queries(self, path):
+        """
+        Requests path once to warm the in-process caches, then again with
+        the pages purged
+        :return: A list of the (sql, params) run by the second request
+        """
+        self.client.get(path)
+        invalidate_tags(['catalog'])
+        queries = []
+
+        def capture(execute, sql, params, many, context):
+            queries.append((sql, params))
+            return execute(sql, params, many, context)
+
+        with connection.execute_wrapper(capture):
+            self.assertEqual(self.client.get(path).status_code, 200)
+        return queries
+
+    @staticmethod
+    def fetched_bytes(queries):
+        """
+        Runs the SELECT queries again
+        :return: The size of the values they fetch
+        """
+        fetched = 0
+        with connection.cursor() as cursor:
+            for sql, params in queries:
+                if sql.lstrip().upper().startswith('SELECT'):
+                    cursor.execute(sql, params)
+                    fetched += sum(len(str(value).encode())
+                                   for row in cursor.fetchall()
+                                   for value in row if value is not None)
+        return fetched
+
+    def assertQueryBudget(self, name, queries):
+        budget = self.budgets[name]
+        captured = [self.normalize(sql) for sql, _ in queries]
+        if os.environ.get('UPDATE_QUERY_BUDGETS'):
+            budget['queries'] = captured
+            return
+        if captured != budget['queries']:
+            self.fail('{} ran {} queries, its budget is {}:\n{}'.format(
+                name, len(captured), len(budget['queries']),
+                '\n'.join(difflib.unified_diff(
+                    budget['queries'], captured, 'budget', 'captured',
+                    lineterm=''))))
+        fetched = self.fetched_bytes(queries)
+        self.assertLessEqual(fetched, budget['max_bytes'],
+                             '{} fetched {} bytes'.format(name, fetched))
+
+    def test_every_route_has_a_budget(self):
+        self.seed(1)
+        routes = {'{}:{}'.format(namespace, pattern.name)
+                  for namespace, urlconf in (('minerals', 'main_app.urls'),
+                                             ('api', 'main_app.api_urls'))
+                  for pattern in get_resolver(urlconf).url_patterns}
+        self.assertEqual(routes - self.exempt_routes, set(self.budgets))
+        self.assertEqual(set(self.route_paths()), set(self.budgets))
+
+    def test_views_stay_within_their_query_budgets(self):
+        for size in self.catalog_sizes:
+            self.seed(size)
+            for name, path in self.route_paths().items():
+                with self.subTest(size=size, route=name):
+                    self.assertQueryBudget(name,
+                                           self.captured_queries(path))
+                    # a page cache hit runs no query
+                    with self.assertNumQueries(0):
+                        self.client.get(path)
+
+        if os.environ.get('UPDATE_QUERY_BUDGETS'):
+            with open(self.budgets_path, 'w') as budgets:
+                json.dump(self.budgets, budgets, indent=2, sort_keys=True)
+                budgets.write('\n')
+
+
+class SQLiteBackendTests(TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        self.path = os.path.join(self.directory.name, 'catalog.sqlite3')
+
+    def connect(self, **options):
+        wrapper = DatabaseWrapper(dict(connection.settings_dict,
+                                       NAME=self.path, OPTIONS=options))
+        wrapper.ensure_connection()
+        self.addCleanup(wrapper.close)
+        return wrapper.connection
+
+    def pragma(self, database, name):
+        return database.execute('PRAGMA {}'.format(name)).fetchone()[0]
+
+    def test_connections_are_tuned(self):
+        database = self.connect(pragmas={'cache_size': -1024})
+        self.assertEqual(self.pragma(database, 'journal_mode'), 'wal')
+        self.assertEqual(self.pragma(database, 'cache_size'), -1024)
+        self.assertEqual(self.pragma(database, 'mmap_size'), 256 << 20)
+        self.assertEqual(self.pragma(database, 'temp_store'), 2)
+        self.assertEqual(self.pragma(database, 'query_only'), 0)
+
+    def test_read_only_connections_cannot_write(self):
+        database = self.connect()
+        database.execute('CREATE TABLE mineral (name TEXT)')
+        database.execute("INSERT INTO mineral VALUES ('Aowan')")
+        database.commit()
+        database.close()
+
+        database = self.connect(read_only=True)
+        self.assertEqual(self.pragma(database, 'query_only'), 1)
+        self.assertEqual(
+            database.execute('SELECT name FROM mineral').fetchall(),
+            [('Aowan',)])
+        with self.assertRaises(sqlite3.OperationalError):
+            database.execute("INSERT INTO mineral VALUES ('Beeri')")
+
+
+class MeasuredRangesTests(CatalogTestCase):
+    def setUp(self):
+        super().setUp()
+        self.soft = Mineral.objects.create(
+            name="Aowan", mohs_scale_hardness='2½ to 3',
+            specific_gravity='3.41\xa0g/cm3', refractive_index='Opaque')
+        self.hard = Mineral.objects.create(
+            name="Beeri", mohs_scale_hardness='6–6.5 (defining mineral)',
+            specific_gravity='2.874(5) (meas.) 2.87 - 2.90 (calc.)',
+            refractive_index='nα = 1.818(3) nβ = 1.866(3); 2V = 37°')
+
+    def test_parse_range(self):
+        for text, expected in (('2½ to 3', (2.5, 3.0)),
+                               ('7 - 7.5', (7.0, 7.5)),
+                               ('3.5 on {001}, 6 at angle', (3.5, 6.0)),
+                               ('Soft', (None, None)),
+                               ('', (None, None))):
+            self.assertEqual(parse_range(text, 0, 10), expected)
+        self.assertEqual(parse_range('1.790 (+/- .030) ', 1, 3.5),
+                         (1.79, 1.79))
+
+    def test_ranges_are_maintained_on_save_and_import(self):
+        self.assertEqual(
+            (self.hard.hardness_min, self.hard.hardness_max,
+             self.hard.specific_gravity_min,
+             self.hard.specific_gravity_max,
+             self.hard.refractive_index_min,
+             self.hard.refractive_index_max),
+            (6.0, 6.5, 2.87, 2.9, 1.818, 1.866))
+        self.assertIsNone(self.soft.refractive_index_min)
+
+        self.soft.mohs_scale_hardness = '4'
+        self.soft.save(update_fields=['mohs_scale_hardness'])
+        self.soft.refresh_from_db()
+        self.assertEqual(self.soft.hardness_max, 4.0)
+
+        import_minerals([{'name': "Ceeri", 'mohs_scale_hardness': '5-6'}])
+        self.assertEqual(Mineral.objects.get(name="Ceeri").hardness_max, 6.0)
+
+    def test_filter_view_matches_the_overlapping_ranges(self):
+        url = reverse('minerals:filter')
+        response = self.client.get(url, {'hardness_min': 3,
+                                         'hardness_max': 5})
+        self.assertContains(response, "Aowan")
+        self.assertNotContains(response, "Beeri")
+
+        response = self.client.get(url, {'sg_max': 3, 'ri_min': 1.8})
+        self.assertContains(response, "Beeri")
+        self.assertNotContains(response, "Aowan")
+
+        response = self.client.get(url, {'hardness_min': 'hard'})
+        self.assertContains(response, "Aowan")
+        self.assertContains(response, "Beeri")
+
+    def test_filter_is_an_index_range_scan(self):
+        queryset = get_minerals_in_ranges({'hardness_min': '5'})
+        sql, params = queryset.query.sql_with_params()
+        with connection.cursor() as cursor:
+            cursor.execute('EXPLAIN QUERY PLAN ' + sql, params)
+            plan = ' '.join(str(row[-1]) for row in cursor.fetchall())
+        self.assertIn('USING INDEX', plan)
+        self.assertIn('hardness_max', plan)
+
+
+class FacetIndexTests(CatalogTestCase):
+    def setUp(self):
+        super().setUp()
+        self.aowan = Mineral.objects.create(
+            name="Aowan", category='Oxide', streak='Red',
+            crystal_system='Monoclinic - Prismatic 2/m',
+            luster='Vitreous, pearly on cleavages')
+        self.beeri = Mineral.objects.create(
+            name="Beeri", category='Oxide', streak='White',
+            crystal_system='Isometric', luster='Sub-metallic')
+        self.ceeri = Mineral.objects.create(
+            name="Ceeri", category='Silicate', streak='White',
+            crystal_system='monoclinic', luster='Vitreous')
+
+    def test_free_text_facets_values(self):
+        self.assertEqual(crystal_systems('Trigonal or hexagonal'),
+                         ['hexagonal', 'trigonal'])
+        self.assertEqual(crystal_systems('Isometric'), ['cubic'])
+        self.assertEqual(lusters('Sub-metallic to dull'),
+                         ['dull', 'submetallic'])
+
+    def test_counts_exclude_their_own_facet_selection(self):
+        counts = facet_index.counts({'category': 'oxide'})
+        self.assertEqual(counts['category'], [('oxide', 2), ('silicate', 1)])
+        self.assertEqual(counts['streak'], [('red', 1), ('white', 1)])
+        self.assertEqual(counts['crystal_system'],
+                         [('cubic', 1), ('monoclinic', 1)])
+        self.assertEqual(counts['luster'], [('pearly', 1),
+                                            ('submetallic', 1),
+                                            ('vitreous', 1)])
+        self.assertEqual(counts['letter'], [('a', 1), ('b', 1)])
+
+        bits = facet_index.mask({'luster': 'vitreous',
+                                 'crystal_system': 'monoclinic'})
+        self.assertEqual(facet_index.page(bits, 10),
+                         ([("Aowan", self.aowan.pk),
+                           ("Ceeri", self.ceeri.pk)], False))
+
+    def test_writes_update_the_bitmaps(self):
+        facet_index.ensure_built()
+        self.beeri.streak = 'Red'
+        self.beeri.save()
+        self.assertEqual(facet_index.counts({})['streak'],
+                         [('red', 2), ('white', 1)])
+
+        self.aowan.delete()
+        self.assertEqual(facet_index.counts({})['streak'],
+                         [('red', 1), ('white', 1)])
+
+        Mineral.objects.create(name="Abelite", category='Oxide',
+                               streak='Red')
+        bits = facet_index.mask({'streak': 'red'})
+        self.assertEqual([name for name, _ in facet_index.page(bits, 10)[0]],
+                         ["Abelite", "Beeri"])
+
+    def test_filter_view_pages_the_bitmap_without_queries(self):
+        url = reverse('minerals:filter')
+        params = {'streak': 'white', 'page_size': 1}
+        response = self.client.get(url, params)
+        self.assertContains(response, 'Oxide (1)')
+        self.assertContains(response, 'Silicate (1)')
+        self.assertContains(response, '2 minerals')
+        self.assertEqual(list(response.context['minerals']), [self.beeri])
+
+        invalidate_tags(['catalog'])
+        with self.assertNumQueries(0):
+            response = self.client.get(
+                url + '?' + response.context['page'].next_query)
+        self.assertEqual(list(response.context['minerals']), [self.ceeri])
+        self.assertFalse(response.context['page'].has_next)
+
+        response = self.client.get(
+            url + '?' + response.context['page'].previous_query)
+        self.assertEqual(list(response.context['minerals']), [self.beeri])
+        self.assertFalse(response.context['page'].has_previous)
+
+        response = self.client.get(url, {'category': 'oxide',
+                                         'hardness_min': 1})
+        self.assertContains(response, '0 minerals')
+
+    def test_the_letter_selection_is_case_insensitive(self):
+        url = reverse('minerals:filter')
+        for letter in ('b', 'B'):
+            response = self.client.get(url, {'letter': letter})
+            self.assertEqual(list(response.context['minerals']),
+                             [self.beeri])
+            data = self.client.get(reverse('api:filter'),
+                                   {'letter': letter}).json()
+            self.assertEqual(data['total'], 1)
+
+
+class SuggestIndexTests(CatalogTestCase):
+    def setUp(self):
+        super().setUp()
+        self.galena = Mineral.objects.create(
+            name="Galena (lead glance)", formula='PbS')
+        self.gaitite = Mineral.objects.create(
+            name="Gaitite", formula='Ca<sub>2</sub>Zn(AsO<sub>4</sub>)'
+                                    '<sub>2</sub>·2H<sub>2</sub>O')
+        self.leadhillite = Mineral.objects.create(
+            name="Leadhillite", formula='Pb<sub>4</sub>(SO<sub>4</sub>)')
+        self.agardite = Mineral.objects.create(
+            name="Agardite-(Y), Agardite-(Ce)", formula='Cu6Y(AsO4)3')
+
+    def suggested(self, term, limit=10):
+        return [(suggestion['name'], suggestion['match'], suggestion['kind'])
+                for suggestion in suggest_index.suggest(term, limit)]
+
+    def test_names_synonyms_and_formulas_prefixes(self):
+        self.assertEqual(self.suggested('ga'), [
+            ("Gaitite", "Gaitite", 'name'),
+            ("Galena (lead glance)", "Galena", 'name')])
+        self.assertEqual(self.suggested('LEAD'), [
+            ("Leadhillite", "Leadhillite", 'name'),
+            ("Galena (lead glance)", "lead glance", 'synonym')])
+        self.assertEqual(self.suggested('ca2'), [
+            ("Gaitite", "Ca2Zn(AsO4)2·2H2O", 'formula')])
+        self.assertEqual(self.suggested('agardite (ce'), [
+            ("Agardite-(Y), Agardite-(Ce)", "Agardite-(Ce)", 'name')])
+        self.assertEqual(self.suggested('pb', limit=1), [
+            ("Leadhillite", "Pb4(SO4)", 'formula')])
+        self.assertEqual(self.suggested(' '), [])
+
+    def test_the_index_follows_the_writes(self):
+        suggest_index.ensure_built()
+        self.gaitite.name = "Gahnite"
+        self.gaitite.save()
+        self.leadhillite.delete()
+        Mineral.objects.create(name="Gaylussite")
+        self.assertEqual([name for name, _, _ in self.suggested('ga')],
+                         ["Gahnite", "Galena (lead glance)", "Gaylussite"])
+        self.assertEqual(self.suggested('leadh'), [])
+
+    def test_the_suggest_view_runs_no_query(self):
+        url = reverse('minerals:suggest')
+        self.client.get(url, {'q': 'gal'})
+        with self.assertNumQueries(0):
+            response = self.client.get(url, {'q': 'gal'})
+        self.assertEqual(response.json(), {'suggestions': [
+            {'id': self.galena.pk, 'name': "Galena (lead glance)",
+             'match': "Galena", 'kind': 'name'}]})
+
+
+class FragmentTests(CatalogTestCase):
+    highlighted = 'background-color: #384033; color: #DCF63B">{}</a>'
+
+    def setUp(self):
+        super().setUp()
+        Mineral.objects.create(name="Aowan", category='Oxide', streak='Red')
+        Mineral.objects.create(name="Beeri", category='Silicate',
+                               streak='White')
+        fragment_cache.clear()
+
+    def test_selected_items_are_highlighted(self):
+        response = self.client.get(reverse(
+            'minerals:list_by_category',
+            kwargs={'selected_category': 'silicate'}))
+        self.assertContains(response, self.highlighted.format('Silicate'))
+        self.assertNotContains(response, self.highlighted.format('Oxide'))
+        self.assertContains(response, 'href="{}"'.format(reverse(
+            'minerals:list_by_streak', kwargs={'selected_streak': 'red'})))
+        # a category page has no selected letter
+        self.assertNotContains(response, 'style="font-weight: bold; '
+                                         'color: #DCF63B">')
+
+        response = self.client.get(reverse(
+            'minerals:list_by_letter', kwargs={'letter': 'b'}))
+        self.assertContains(response, self.highlighted.format('Silicate'),
+                            count=0)
+        self.assertContains(response, 'style="font-weight: bold; '
+                                      'color: #DCF63B">B</a>')
+
+    def test_fragments_are_rendered_once_per_facets_version(self):
+        url = reverse('minerals:list_by_category',
+                      kwargs={'selected_category': 'oxide'})
+        self.client.get(url)
+        misses = fragment_cache.misses
+        invalidate_tags(['catalog'])
+        self.client.get(url)
+        self.assertEqual(fragment_cache.misses, misses)
+
+        Mineral.objects.create(name="Ceeri", category='Sulfide')
+        response = self.client.get(url)
+        self.assertGreater(fragment_cache.misses, misses)
+        self.assertContains(response, '>Sulfide</a>')
+
+    def test_unknown_selections_share_the_unselected_fragments(self):
+        for junk in range(20):
+            self.client.get(reverse(
+                'minerals:list_by_category',
+                kwargs={'selected_category': 'junk{}'.format(junk)}))
+            self.client.get(reverse(
+                'minerals:list_by_letter',
+                kwargs={'letter': 'zz{}'.format(junk)}))
+        self.assertLessEqual(len(fragment_cache._fragments), 3)
+
+        response = self.client.get(reverse(
+            'minerals:list_by_letter', kwargs={'letter': 'B'}))
+        self.assertContains(response, 'style="font-weight: bold; '
+                                      'color: #DCF63B">B</a>')
+
+
+class ApiTests(CatalogTestCase):
+    def setUp(self):
+        super().setUp()
+        self.aowan = Mineral.objects.create(
+            name="Aowan", category='Oxide', streak='Red',
+            formula='Fe2O3', mohs_scale_hardness='5½–6')
+        self.abelite = Mineral.objects.create(
+            name="Abelite", category='Silicate', streak='White',
+            formula='SiO2', luster='Vitreous')
+
+    def test_list_pages_and_field_selection(self):
+        response = self.client.get(reverse('api:list'),
+                                   {'fields': 'formula,hardness_min',
+                                    'page_size': 1})
+        data = response.json()
+        self.assertEqual(data['results'], [
+            {'id': self.abelite.pk, 'name': "Abelite", 'formula': 'SiO2',
+             'hardness_min': None}])
+        self.assertIsNone(data['previous'])
+
+        data = self.client.get(data['next']).json()
+        self.assertEqual(data['results'], [
+            {'id': self.aowan.pk, 'name': "Aowan", 'formula': 'Fe2O3',
+             'hardness_min': 5.5}])
+        self.assertIsNone(data['next'])
+
+        data = self.client.get(reverse(
+            'api:list_by_category',
+            kwargs={'selected_category': 'oxide'})).json()
+        self.assertEqual([row['name'] for row in data['results']],
+                         ["Aowan"])
+        self.assertEqual(set(data['results'][0]),
+                         {'id', *api.API_FIELDS})
+
+        response = self.client.get(reverse('api:list'),
+                                   {'fields': 'formula,password'})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json(),
+                         {'error': 'Unknown fields: password'})
+
+    def test_detail_search_and_filter(self):
+        url = reverse('api:detail', kwargs={'pk': self.aowan.pk})
+        self.assertEqual(self.client.get(url, {'fields': 'streak'}).json(),
+                         {'id': self.aowan.pk, 'name': "Aowan",
+                          'streak': 'Red'})
+        response = self.client.get(reverse('api:detail', kwargs={'pk': 0}))
+        self.assertEqual(response.status_code, 404)
+
+        data = self.client.get(reverse('api:search'),
+                               {'q': 'sio2', 'fields': 'name'}).json()
+        self.assertEqual(data['results'],
+                         [{'id': self.abelite.pk, 'name': "Abelite"}])
+
+        data = self.client.get(reverse('api:filter'),
+                               {'luster': 'vitreous',
+                                'fields': 'category'}).json()
+        self.assertEqual(data['results'],
+                         [{'id': self.abelite.pk, 'name': "Abelite",
+                           'category': 'Silicate'}])
+        self.assertEqual(data['total'], 1)
+        self.assertEqual(data['facets']['category'], [['silicate', 1]])
+        self.assertEqual(data['facets']['luster'], [['vitreous', 1]])
+
+    def test_export_streams_ndjson_in_chunks(self):
+        with override_settings(MINERAL_EXPORT_CHUNK_SIZE=1):
+            response = self.client.get(reverse('api:export'),
+                                       {'fields': 'formula'})
+            self.assertTrue(response.streaming)
+            chunks = list(response.streaming_content)
+        self.assertEqual(response['Content-Type'],
+                         'application/x-ndjson; charset=utf-8')
+        self.assertEqual(len(chunks), 2)
+        self.assertEqual(
+            [json.loads(line) for line in b''.join(chunks).splitlines()],
+            [{'id': self.aowan.pk, 'name': "Aowan", 'formula': 'Fe2O3'},
+             {'id': self.abelite.pk, 'name': "Abelite", 'formula': 'SiO2'}])
+
+    def test_export_is_conditional_on_the_catalog_version(self):
+        url = reverse('api:export')
+        etag = self.client.get(url)['ETag']
+        with self.assertNumQueries(0):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+        response = self.client.get(url, {'fields': 'formula'},
+                                   HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+        self.aowan.formula = 'Fe3O4'
+        self.aowan.save()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(b'Fe3O4', b''.join(response.streaming_content))
+
+
+class AsgiTests(SimpleTestCase):
+    @staticmethod
+    def echo_application(environ, start_response):
+        start_response('200 OK', [('Content-Type', 'text/plain')])
+        return [environ['PATH_INFO'].encode('latin-1'), b'|',
+                environ['QUERY_STRING'].encode(), b'|',
+                environ.get('HTTP_X_TAG', '').encode(), b'|',
+                environ['wsgi.input'].read()]
+
+    async def request(self, application, path, body=b'',
+                      disconnect_after=None, **scope):
+        """
+        Calls the ASGI application with the request body split in two
+        :param disconnect_after: the client disconnects once it received
+        this number of messages, None to wait for the whole response
+        :return: The list of the sent messages
+        """
+        received = [{'type': 'http.request', 'body': body[:2],
+                     'more_body': True},
+                    {'type': 'http.request', 'body': body[2:]}]
+        sent = []
+        disconnected = asyncio.Event()
+
+        async def receive():
+            if received:
+                return received.pop(0)
+            await disconnected.wait()
+            return {'type': 'http.disconnect'}
+
+        async def send(message):
+            sent.append(message)
+            if len(sent) == disconnect_after:
+                disconnected.set()
+
+        await application(dict({'type': 'http', 'http_version': '1.1',
+                                'method': 'POST', 'path': path,
+                                'query_string': b'q=1',
+                                'headers': [(b'x-tag', b'a'),
+                                            (b'x-tag', b'b')]}, **scope),
+                          receive, send)
+        return sent
+
+    def test_the_wsgi_application_serves_the_requests(self):
+        application = WsgiToAsgi(self.echo_application, max_workers=1)
+        self.addCleanup(application.executor.shutdown)
+        sent = asyncio.run(self.request(application, '/mineral/é/',
+                                        body=b'body'))
+        self.assertEqual(sent[0], {'type': 'http.response.start',
+                                   'status': 200,
+                                   'headers': [(b'content-type',
+                                                b'text/plain')]})
+        self.assertEqual(b''.join(message['body'] for message in sent[1:]),
+                         '/mineral/é/|q=1|a,b|body'.encode())
+        self.assertNotIn('more_body', sent[-1])
+
+    def test_a_slow_view_does_not_block_the_other_requests(self):
+        release = threading.Event()
+
+        def application(environ, start_response):
+            if environ['PATH_INFO'] == '/slow/':
+                release.wait(5)
+            return self.echo_application(environ, start_response)
+
+        application = WsgiToAsgi(application, max_workers=2)
+        self.addCleanup(application.executor.shutdown)
+        finished = []
+
+        async def requests():
+            async def tracked(path):
+                await self.request(application, path)
+                finished.append(path)
+
+            slow = asyncio.ensure_future(tracked('/slow/'))
+            await tracked('/fast/')
+            release.set()
+            await slow
+
+        asyncio.run(requests())
+        self.assertEqual(finished, ['/fast/', '/slow/'])
+
+    def test_a_too_large_body_is_refused(self):
+        called = []
+
+        def application(environ, start_response):
+            called.append(environ)
+            return self.echo_application(environ, start_response)
+
+        application = WsgiToAsgi(application, max_workers=1,
+                                 max_body_size=3)
+        self.addCleanup(application.executor.shutdown)
+        sent = asyncio.run(self.request(application, '/', body=b'body'))
+        self.assertEqual(sent[0]['status'], 413)
+        sent = asyncio.run(self.request(
+            application, '/', headers=[(b'content-length', b'4')]))
+        self.assertEqual(sent[0]['status'], 413)
+        self.assertEqual(called, [])
+
+        sent = asyncio.run(self.request(application, '/', body=b'abc'))
+        self.assertEqual(sent[0]['status'], 200)
+
+    def test_the_response_stops_when_the_client_disconnects(self):
+        closed = threading.Event()
+
+        class Chunks:
+            def __iter__(self):
+                for _ in range(500):
+                    time.sleep(0.001)
+                    yield b'chunk'
+
+            def close(self):
+                closed.set()
+
+        def application(environ, start_response):
+            start_response('200 OK', [('Content-Type', 'text/plain')])
+            return Chunks()
+
+        application = WsgiToAsgi(application, max_workers=1)
+        self.addCleanup(application.executor.shutdown)
+        sent = asyncio.run(self.request(application, '/',
+                                        disconnect_after=3))
+        self.assertLess(len(sent), 100)
+        self.assertTrue(closed.is_set())
+
+
+class SearchTimeoutTests(CatalogTestCase):
+    def setUp(self):
+        super().setUp()
+        Mineral.objects.create(name="Aowan", formula='Fe2O3')
+
+    def test_queries_past_the_deadline_are_interrupted(self):
+        counting = ('WITH RECURSIVE n(i) AS (SELECT 1 UNION ALL '
+                    'SELECT i + 1 FROM n WHERE i < 100000000) '
+                    'SELECT count(*) FROM n')
+        with self.assertRaises(SearchTimeout):
+            with query_deadline(0.01):
+                with connection.cursor() as cursor:
+                    cursor.execute(counting)
+        # the connection is usable again, without a deadline
+        self.assertEqual(Mineral.objects.count(), 1)
+
+    def test_timed_out_searches_are_503_and_not_cached(self):
+        with mock.patch('main_app.views.search_pks',
+                        side_effect=SearchTimeout):
+            response = self.client.get(reverse('minerals:search'),
+                                       {'q': 'fe2o3'})
+        self.assertEqual(response.status_code, 503)
+        self.assertContains(response, 'The search took too long',
+                            status_code=503)
+
+        response = self.client.get(reverse('minerals:search'),
+                                   {'q': 'fe2o3'})
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, "Aowan")
+
+        with mock.patch('main_app.api.search_pks',
+                        side_effect=SearchTimeout):
+            response = self.client.get(reverse('api:search'), {'q': 'fe'})
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response.json(), {'error': 'The search timed out'})
+
+
+class DetailSnapshotTests(CatalogTestCase):
+    def setUp(self):
+        super().setUp()
+        self.mineral = Mineral.objects.create(
+            name="Aowan", image_caption='A red crystal', category='Oxide',
+            formula='Fe2O3', strunz_classification='04.CB.05')
+
+    def test_the_snapshot_is_built_on_save(self):
+        self.assertEqual(json.loads(self.mineral.detail_snapshot), {
+            'caption': 'A red crystal',
+            'attributes': [['Category', 'Oxide'], ['Formula', 'Fe2O3'],
+                           ['Strunz_Classification', '04.CB.05']]})
+
+        self.mineral.luster = 'Metallic'
+        self.mineral.save(update_fields=['luster'])
+        self.mineral.refresh_from_db()
+        self.assertIn(['Luster', 'Metallic'],
+                      json.loads(self.mineral.detail_snapshot)['attributes'])
+
+    def test_the_detail_page_renders_the_snapshot(self):
+        url = reverse('minerals:detail', kwargs={'pk': self.mineral.pk})
+        response = self.client.get(url)
+        self.assertEqual(
+            re.findall(r'mineral__category">([^<]*)</td>',
+                       response.content.decode()),
+            ['Category', 'Formula', 'Strunz_Classification'])
+        self.assertContains(response, 'A red crystal')
+
+        # a bulk written mineral has no snapshot until the backfill
+        Mineral.objects.filter(pk=self.mineral.pk).update(detail_snapshot='')
+        invalidate_tags(['catalog'])
+        self.assertContains(self.client.get(url), 'Fe2O3')
+
+    def test_the_command_backfills_the_missing_snapshots(self):
+        Mineral.objects.bulk_create([Mineral(name="Beeri", group='Spinel')])
+        out = io.StringIO()
+        call_command('build_detail_snapshots', batch_size=1, stdout=out)
+        self.assertIn('1 snapshots rebuilt, 1 unchanged', out.getvalue())
+        self.assertEqual(json.loads(Mineral.objects.get(
+            name="Beeri").detail_snapshot)['attributes'],
+                         [['Group', 'Spinel']])
+
+
+class FormulaElementsTests(CatalogTestCase):
+    def setUp(self):
+        super().setUp()
+        self.chalcopyrite = Mineral.objects.create(
+            name="Chalcopyrite", formula='CuFeS<sub>2</sub>')
+        self.covellite = Mineral.objects.create(name="Covellite",
+                                                formula='CuS')
+        self.hematite = Mineral.objects.create(
+            name="Hematite", formula='Fe<sub>2</sub>O<sub>3</sub>')
+
+    def symbols(self, mineral):
+        return sorted(mineral.elements.values_list('symbol', flat=True))
+
+    def listed(self, symbols, **params):
+        response = self.client.get(reverse(
+            'minerals:list_by_element', kwargs={'symbols': symbols}), params)
+        return [mineral.name for mineral in response.context['minerals']]
+
+    def test_formula_elements(self):
+        self.assertEqual(formula_elements('CuFeS<sub>2</sub>'), [16, 26, 29])
+        self.assertEqual(
+            formula_elements('(Ca,Na)<sub>x</sub>Al<sub>2</sub>(OH)'),
+            [1, 8, 11, 13, 20])
+        # the prose of a formula isn't made of symbols
+        self.assertEqual(formula_elements('Mg2SiO4 (Fe rich), variable'),
+                         [8, 12, 14, 26])
+        self.assertEqual(formula_elements(''), [])
+        # the oxidation states of the prose names aren't I, V or X
+        self.assertEqual(formula_elements(
+            'iron(III) oxide, Fe<sub>2</sub>O<sub>3</sub>'), [8, 26])
+        self.assertEqual(formula_elements('mercury(II) sulfide, HgS'),
+                         [16, 80])
+        self.assertEqual(formula_elements(
+            'iron(II,III) manganese oxide, MnFe<sub>2</sub>O<sub>4</sub>'),
+            [8, 25, 26])
+        self.assertEqual(formula_elements(
+            'Uranium dioxide or uranium(IV) oxide (UO<sub>2</sub>)'),
+            [8, 92])
+        self.assertEqual(formula_elements(
+            'Pb<sub>3</sub>Cl<sub>3</sub>(IO<sub>3</sub>)O'), [8, 17, 53, 82])
+
+    def test_the_elements_follow_the_formula(self):
+        self.assertEqual(self.symbols(self.chalcopyrite), ['Cu', 'Fe', 'S'])
+        self.covellite.formula = 'Cu<sub>2</sub>O'
+        self.covellite.save(update_fields=['formula'])
+        self.assertEqual(self.symbols(self.covellite), ['Cu', 'O'])
+
+    def test_the_pages_are_purged_after_the_elements_are_linked(self):
+        linked = []
+
+        def record_links(tags):
+            linked.append(self.symbols(self.hematite))
+
+        self.hematite.formula = 'CuS'
+        with mock.patch('main_app.signals.invalidate_tags',
+                        side_effect=record_links):
+            self.hematite.save()
+        self.assertEqual(linked, [['Cu', 'S']])
+
+    def test_all_or_any_of_the_elements(self):
+        self.assertEqual(self.listed('Cu,S'), ["Chalcopyrite", "Covellite"])
+        self.assertEqual(self.listed('fe,cu'), ["Chalcopyrite"])
+        self.assertEqual(self.listed('Cu,O', match='any'),
+                         ["Chalcopyrite", "Covellite", "Hematite"])
+        self.assertEqual(self.listed('Zn'), [])
+        self.assertEqual(self.client.get(reverse(
+            'minerals:list_by_element', kwargs={'symbols': 'Cu,Xx'}))
+            .status_code, 404)
+
+    def test_the_match_links_keep_the_query_params(self):
+        url = reverse('minerals:list_by_element', kwargs={'symbols': 'Cu,S'})
+        response = self.client.get(url, {'page_size': 1})
+        self.assertContains(response, 'href="?page_size=1&amp;match=any"')
+        response = self.client.get(url, {'page_size': 1, 'match': 'any'})
+        self.assertContains(response, 'href="?page_size=1"')
+
+    def test_bulk_writes_are_reindexed(self):
+        Mineral.objects.bulk_create([Mineral(name="Sphalerite",
+                                             formula='ZnS')])
+        self.assertEqual(self.listed('Zn'), [])
+        index_formula_elements()
+        invalidate_tags(['search'])
+        self.assertEqual(self.listed('Zn,S'), ["Sphalerite"])
+
+
+class SimilarMineralsTests(CatalogTestCase):
+    def setUp(self):
+        super().setUp()
+        self.hematite = Mineral.objects.create(
+            name="Hematite", category='Oxide', formula='Fe2O3',
+            crystal_system='Trigonal', color='Steel gray to black',
+            streak='Reddish brown', luster='Metallic',
+            mohs_scale_hardness='5.5-6.5', specific_gravity='5.26')
+        self.magnetite = Mineral.objects.create(
+            name="Magnetite", category='Oxide', formula='Fe3O4',
+            crystal_system='Isometric', color='Black, gray',
+            streak='Black', luster='Metallic',
+            mohs_scale_hardness='5.5-6.5', specific_gravity='5.17-5.18')
+        self.corundum = Mineral.objects.create(
+            name="Corundum", category='Oxide', formula='Al2O3',
+            crystal_system='Trigonal', color='Colourless, blue, red',
+            streak='White', luster='Adamantine to vitreous',
+            mohs_scale_hardness='9', specific_gravity='3.95-4.10')
+        self.halite = Mineral.objects.create(
+            name="Halite", category='Halide', formula='NaCl',
+            crystal_system='Isometric', color='Colorless or white',
+            streak='White', luster='Vitreous',
+            mohs_scale_hardness='2-2.5', specific_gravity='2.17')
+
+    def feature_rows(self):
+        return list(Mineral.objects.order_by('pk').values())
+
+    def test_colors(self):
+        self.assertEqual(colors('Reddish brown, greyish'),
+                         ['brown', 'gray', 'red'])
+        self.assertEqual(colors(''), [])
+
+    def test_the_features_are_unit_vectors(self):
+        for row in self.feature_rows():
+            weights = mineral_features(row).values()
+            self.assertAlmostEqual(sum(weight ** 2 for weight in weights), 1)
+        features = mineral_features(self.feature_rows()[0])
+        self.assertIn(('element', 26), features)
+        # hardness 6 is in a single bin
+        self.assertEqual([value for group, value in features
+                          if group == 'hardness'], [6])
+
+    def test_nearest_neighbours(self):
+        columns, vectors = feature_vectors(self.feature_rows())
+        neighbours = nearest_neighbours(columns, vectors, 2,
+                                        use_numpy=False)
+        self.assertEqual([[index for index, _ in similar]
+                          for similar in neighbours],
+                         [[1, 2], [0, 2], [0, 1], [2, 1]])
+        self.assertGreater(neighbours[0][0][1], neighbours[0][1][1])
+        # the workers batches are put back in order
+        self.assertEqual(nearest_neighbours(columns, vectors, 2, workers=2,
+                                            batch_size=1, use_numpy=False),
+                         neighbours)
+
+    @unittest.skipIf(numpy is None, 'requires NumPy')
+    def test_numpy_finds_the_same_neighbours(self):
+        columns, vectors = feature_vectors(self.feature_rows())
+        expected = nearest_neighbours(columns, vectors, 3, use_numpy=False)
+        found = nearest_neighbours(columns, vectors, 3, batch_size=3,
+                                   use_numpy=True)
+        self.assertEqual([[index for index, _ in similar]
+                          for similar in found],
+                         [[index for index, _ in similar]
+                          for similar in expected])
+
+    def test_the_command_stores_the_lists_shown_by_the_detail_page(self):
+        out = io.StringIO()
+        call_command('build_similar_minerals', limit=2, workers=1,
+                     stdout=out)
+        self.assertIn('4 similar lists rebuilt, 0 unchanged',
+                      out.getvalue())
+        self.hematite.refresh_from_db()
+        self.assertEqual(json.loads(self.hematite.similar_minerals),
+                         [[self.magnetite.pk, "Magnetite"],
+                          [self.corundum.pk, "Corundum"]])
+
+        # warming the in-process caches up
+        self.client.get(reverse('minerals:detail',
+                                kwargs={'pk': self.halite.pk}))
+        url = reverse('minerals:detail', kwargs={'pk': self.hematite.pk})
+        with self.assertNumQueries(1):
+            response = self.client.get(url)
+        self.assertEqual(
+            [mineral['name'] for mineral in
+             response.context['similar_minerals']],
+            ["Magnetite", "Corundum"])
+        self.assertContains(response, reverse(
+            'minerals:detail', kwargs={'pk': self.magnetite.pk}))
+
+        out = io.StringIO()
+        call_command('build_similar_minerals', limit=2, workers=1,
+                     stdout=out)
+        self.assertIn('0 similar lists rebuilt, 4 unchanged',
+                      out.getvalue())
+
+    def test_deleted_and_renamed_minerals_leave_the_lists(self):
+        call_command('build_similar_minerals', limit=2, workers=1,
+                     stdout=io.StringIO())
+        url = reverse('minerals:detail', kwargs={'pk': self.hematite.pk})
+        self.client.get(url)
+
+        self.magnetite.delete()
+        self.corundum.name = "Sapphire"
+        self.corundum.save()
+        response = self.client.get(url)
+        self.assertEqual(response.context['similar_minerals'],
+                         [{'pk': self.corundum.pk, 'name': "Sapphire"}])
+        self.hematite.refresh_from_db()
+        self.assertEqual(json.loads(self.hematite.similar_minerals),
+                         [[self.corundum.pk, "Sapphire"]])
+
+
+class ModelTests(CatalogTestCase):
+
+    def test_derived_values_are_maintained_on_save(self):
+        mineral = Mineral.objects.create(name="Beeri", category='Native '
+                                         'Element', streak='Light gray')
+        self.assertEqual((mineral.category_slug, mineral.streak_slug,
+                          mineral.name_initial),
+                         ('native-element', 'light-gray', 'b'))
+
+        mineral.name = "Aowan"
+        mineral.save(update_fields=['name'])
+        mineral.refresh_from_db()
+        self.assertEqual(mineral.name_initial, 'a')
+
+    def test_partial_saves_write_only_the_derived_fields(self):
+        mineral = Mineral.objects.create(name="Beeri")
+        Mineral.objects.filter(pk=mineral.pk).update(
+            similar_minerals='[[2,"Aowan"]]')
+        mineral.name = "Beerite"
+        mineral.save(update_fields=['name'])
+        mineral.refresh_from_db()
+        self.assertEqual((mineral.name_initial, mineral.similar_minerals),
+                         ('b', '[[2,"Aowan"]]'))
+        self.assertEqual(
+            set(DERIVED_FIELDS),
+            set(derived_values('', '', '')) | set(measured_ranges(mineral)) |
+            {'detail_snapshot', 'updated_at'})
 
     def test_mineral_model_field_types(self):
         # Verifies if Model fields types are correct
         for field in Mineral._meta.fields:
-            if not field.name == 'id':
+            # the fields derived by save() aren't catalog attributes
+            if field.editable and field.name != 'id':
                 self.assertEqual(isinstance(field, models.CharField), True)
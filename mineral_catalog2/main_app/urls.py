@@ -18,10 +18,22 @@ urlpatterns = [
     path('by-streak/<selected_streak>/', views.mineral_list,
          name='list_by_streak'
          ),
-    path('mineral/<pk>/', views.mineral_detail,
+    path('by-element/<symbols>/', views.minerals_by_element,
+         name='list_by_element'
+         ),
+    path('mineral/<int:pk>/', views.mineral_detail,
          name='detail'
          ),
     path('search/', views.search,
          name='search'
          ),
+    path('search/suggest/', views.suggest,
+         name='suggest'
+         ),
+    path('filter/', views.filter_minerals,
+         name='filter'
+         ),
+    path('perf/', views.perf_stats,
+         name='perf'
+         ),
 ]
@@ -1,224 +1,355 @@
-import random
-from django.shortcuts import render, get_object_or_404
-from .models import Mineral
-from django.db.models import Q
-from django.template.defaultfilters import slugify
+import json
+
+from django.conf import settings
+from django.contrib.admin.views.decorators import staff_member_required
+from django.http import Http404, JsonResponse
+from django.shortcuts import render
+from django.db.models import Count
+from django.views.decorators.http import condition
+from .models import Mineral, MineralElement, detail_snapshot
+from .facet_index import FACETS, facet_index
+from .images import image_sources
+from .perf import load_stats
+from .page_cache import (cache_page_by, catalog_last_modified, detail_tags,
+                         element_tags,
+                         list_tags, page_etag, search_tags)
+from .pagination import paginate, paginate_bitmap
+from .parsing import ATOMIC_NUMBERS
+from .random_picker import random_mineral_picker
+from .search import SearchTimeout, search_pks
+from .suggest_index import suggest_index
 
 
-def raw_values(attribute_name):
+def get_random_mineral():
     """
-    Gets all values of the requested attribute_name based on the DB values
-    :param attribute_name: String representation of the attribute name
-    :return: A new list, having distinct values of the attribute name parameter
+    Gets a random mineral from the existing minerals table
+    :return: A single Mineral object, only its pk is loaded
     """
-    # getting all distinct attribute names
-    names_raw = Mineral.objects.values_list(attribute_name, flat=True) \
-        .distinct().order_by(attribute_name)
+    return random_mineral_picker.pick()
 
-    return list(names_raw)
 
+# the filter view range params prefixes: the Mineral range fields prefix
+RANGE_FILTERS = {
+    'hardness': 'hardness',
+    'sg': 'specific_gravity',
+    'ri': 'refractive_index',
+}
 
-def slug_em(names):
+
+def parse_float(value):
     """
-    Slugs all the names list items
-    :param names: String list of names
-    :return: a new slugged names list
+    :return: The float value of a request param, None if blank or invalid
     """
-    return [slugify(name) for name in names]
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
 
 
-def get_random_mineral():
+def facet_selection(params):
     """
-    Gets a random mineral from the existing minerals table
-    :return: A single Mineral object
+    :param params: a dict of the FACETS to their requested values
+    :return: A dict of the selected FACETS to their values, lower cased
+    as the facets values are, e.g. the letter of ?letter=A is 'a'
     """
-    minerals_all = Mineral.objects.all()
-    random_mineral = random.choice(minerals_all)
+    return {facet: params[facet].lower() for facet in FACETS
+            if params.get(facet)}
 
-    return random_mineral
+
+def range_lookups(params):
+    """
+    Builds the lookups of the minerals whose measured properties ranges
+    overlap the requested ones
+    :param params: a dict of the RANGE_FILTERS prefixes suffixed by _min
+    and _max to their values, the missing bounds are open
+    :return: A dict of the range fields lookups, empty if no bound is set
+    """
+    lookups = {}
+    for param, prefix in RANGE_FILTERS.items():
+        low = parse_float(params.get(param + '_min'))
+        high = parse_float(params.get(param + '_max'))
+        if low is not None:
+            lookups[prefix + '_max__gte'] = low
+        if high is not None:
+            lookups[prefix + '_min__lte'] = high
+    return lookups
+
+
+def get_minerals_in_ranges(params):
+    """
+    Gets the minerals whose measured properties ranges overlap the
+    requested ones, as range scans of the indexed numeric columns
+    :param params: see range_lookups
+    :return: A Queryset of the matching minerals
+    """
+    return Mineral.objects.filter(**range_lookups(params))
 
 
-def get_minerals_by(attribute_name, raw_values_list, slugged_values_list,
-                    selected_value):
+def get_minerals_by(attribute_name, selected_value):
     """
     Gets all minerals having attribute_name with the selected_value
-    :param slugged_values_list: helper list of slugged_values_list
-    :param raw_values_list: helper list of raw_values_list
     :param attribute_name: string of Mineral attribute
     :param selected_value: string of the selected Mineral attribute value
     :return: A Queryset of all minerals objects having the attribute_name with
     selected_value
     """
 
-    # finding out all the raw categories that belong to the same slug
-    value_indexes = []
-    for index, item in enumerate(slugged_values_list):
-        if item == selected_value:
-            value_indexes.append(index)
-
-    lookup = attribute_name+'__'+'in'
+    # an indexed lookup of the denormalized slug column
+    lookup = attribute_name + '_slug'
 
     minerals_by_attribute = Mineral.objects.filter(
-        **{lookup: [raw_values_list[index] for index in value_indexes]}
+        **{lookup: selected_value}
     )
 
     return minerals_by_attribute
 
 
+@condition(etag_func=page_etag(list_tags),
+           last_modified_func=catalog_last_modified)
+@cache_page_by(list_tags)
 def mineral_list(request, letter='a',
                  selected_category=None,
                  selected_streak=None):
     """
-    Minerals list view, gets all the requested minerals objects
-    either by their first letter name or by category
+    Minerals list view, gets a page of the requested minerals objects
+    either by their first letter name, by category or by streak
     in addition, chooses a random mineral object.
     :return: rendered html template object
     """
 
-    # removing all duplicates, having a unique ordered list
-    raw_categories = raw_values('category')
-    slugged_categories = slug_em(raw_categories)
-    categories_list = sorted(set(slugged_categories))
-
-    raw_streaks = raw_values('streak')
-    slugged_streaks = slug_em(raw_streaks)
-    streaks_list = sorted(set(slugged_streaks))
-
     if selected_category:
-        minerals = get_minerals_by('category', raw_categories,
-                                   slugged_categories, selected_category)
+        minerals = get_minerals_by('category', selected_category)
         selected_streak = None
         letter = None
     elif selected_streak:
-        minerals = get_minerals_by('streak', raw_streaks,
-                                   slugged_streaks, selected_streak)
+        minerals = get_minerals_by('streak', selected_streak)
         selected_category = None
         letter = None
     else:
-        minerals_by_letter = Mineral.objects.filter(name__startswith=letter)
+        minerals_by_letter = Mineral.objects.filter(
+            name_initial=letter.lower())
         minerals = minerals_by_letter
 
+    page = paginate(request, minerals)
+
     # random mineral
     random_mineral = get_random_mineral()
 
     return render(request, 'main_app/index.html',
-                  {'minerals': minerals,
+                  {'minerals': page.object_list,
+                   'page': page,
                    'random_mineral': random_mineral,
-                   'categories_list': categories_list,
-                   'streaks_list': streaks_list,
                    'selected_letter': letter,
                    'selected_category': selected_category,
                    'selected_streak': selected_streak,
                    })
 
 
+@condition(etag_func=page_etag(search_tags),
+           last_modified_func=catalog_last_modified)
+@cache_page_by(search_tags)
 def search(request):
     """
-    Gets all the minerals objects whose any field contains the search term.
+    Gets the minerals objects whose any field matches the search term.
     The names of the minerals that match the search will
-    be displayed in the list view.
+    be displayed, a page at a time, in the list view.
     in addition, chooses a random mineral object.
     :return: rendered html template object
     """
-    term = request.GET.get('q')
-
-    # filter using Q objects for OR relation search
-    minerals_found = Mineral.objects.filter(
-        Q(name__icontains=term) |
-        Q(image_caption__icontains=term) |
-        Q(category__icontains=term) |
-        Q(formula__icontains=term) |
-        Q(strunz_classification__icontains=term) |
-        Q(color__icontains=term) |
-        Q(crystal_system__icontains=term) |
-        Q(unit_cell__icontains=term) |
-        Q(crystal_symmetry__icontains=term) |
-        Q(cleavage__icontains=term) |
-        Q(mohs_scale_hardness__icontains=term) |
-        Q(luster__icontains=term) |
-        Q(streak__icontains=term) |
-        Q(diaphaneity__icontains=term) |
-        Q(optical_properties__icontains=term) |
-        Q(refractive_index__icontains=term) |
-        Q(crystal_habit__icontains=term) |
-        Q(specific_gravity__icontains=term) |
-        Q(group__icontains=term)
-    )
+    term = request.GET.get('q', '')
+
+    # the most relevant matches, see settings.MINERAL_SEARCH_BACKEND
+    try:
+        pks_found = search_pks(term, settings.MINERAL_SEARCH_MAX_RESULTS)
+        minerals = Mineral.objects.filter(pk__in=pks_found)
+        search_timeout = False
+    except SearchTimeout:
+        # an uncached 503, the term may be tried again
+        minerals = Mineral.objects.none()
+        search_timeout = True
+    page = paginate(request, minerals)
+
+    random_mineral = get_random_mineral()
+
+    return render(request, 'main_app/index.html',
+                  {'minerals': page.object_list,
+                   'page': page,
+                   'random_mineral': random_mineral,
+                   'search_timeout': search_timeout,
+                   }, status=503 if search_timeout else 200)
+
+
+def suggest(request):
+    """
+    Typeahead suggestions of the search form, the minerals whose name,
+    synonym or formula starts with the q param, out of the in-memory
+    suggest index
+    :return: A JSON response of the suggestions list
+    """
+    return JsonResponse({
+        'suggestions': suggest_index.suggest(
+            request.GET.get('q', ''), settings.MINERAL_SUGGEST_LIMIT),
+    })
+
 
-    raw_categories = raw_values('category')
-    slugged_categories = slug_em(raw_categories)
-    categories_list = sorted(set(slugged_categories))
+@condition(etag_func=page_etag(search_tags),
+           last_modified_func=catalog_last_modified)
+@cache_page_by(search_tags)
+def filter_minerals(request):
+    """
+    Gets the minerals having all the selected facets values and whose
+    hardness, specific gravity and refractive index ranges overlap the
+    requested ones, e.g.
+    /filter/?category=oxide&luster=metallic&hardness_min=5&hardness_max=7
+    The names of the matching minerals will be displayed, a page at a
+    time, under the filter form showing the minerals count of every facet
+    value.
+    in addition, chooses a random mineral object.
+    :return: rendered html template object
+    """
+    selection = facet_selection(request.GET)
+    lookups = range_lookups(request.GET)
+    within = None
+    if lookups:
+        within = facet_index.mask_of(Mineral.objects.filter(**lookups)
+                                     .values_list('pk', flat=True))
+
+    # the selected minerals and the facets counts, out of the bitmaps
+    bits = facet_index.mask(selection)
+    if within is not None:
+        bits &= within
+    page = paginate_bitmap(request, bits)
+    counts = facet_index.counts(selection, within)
 
-    raw_streaks = raw_values('streak')
-    slugged_streaks = slug_em(raw_streaks)
-    streaks_list = sorted(set(slugged_streaks))
+    random_mineral = get_random_mineral()
+
+    return render(request, 'main_app/filter.html',
+                  {'minerals': page.object_list,
+                   'page': page,
+                   'total': facet_index.count(bits),
+                   'facets': [(facet, selection.get(facet, ''),
+                               counts[facet]) for facet in FACETS],
+                   'random_mineral': random_mineral,
+                   'ranges': [(param, request.GET.get(param + '_min', ''),
+                               request.GET.get(param + '_max', ''))
+                              for param in RANGE_FILTERS],
+                   })
+
+
+def get_minerals_with_elements(numbers, match_all=True):
+    """
+    Gets the minerals whose formula has all (or any) of the elements, as
+    lookups of the minerals elements table unique index
+    :param numbers: a list of atomic numbers
+    :param match_all: whether a mineral needs all the elements or any
+    :return: A Queryset of the matching minerals
+    """
+    links = MineralElement.objects.filter(element_id__in=numbers)
+    if match_all:
+        links = links.values('mineral_id').annotate(
+            elements_count=Count('element_id')).filter(
+            elements_count=len(set(numbers)))
+    return Mineral.objects.filter(pk__in=links.values('mineral_id'))
+
+
+@condition(etag_func=page_etag(element_tags),
+           last_modified_func=catalog_last_modified)
+@cache_page_by(element_tags)
+def minerals_by_element(request, symbols):
+    """
+    Gets the minerals containing the chemical elements, comma separated
+    symbols, all of them by default or any of them if the match param is
+    'any', e.g. /by-element/Cu,S/ or /by-element/Cu,Zn/?match=any
+    The names of the matching minerals will be displayed, a page at a
+    time, in the list view.
+    in addition:
+        chooses a random mineral object.
+    :return: rendered html template object
+    """
+    symbols = [symbol.strip().capitalize() for symbol in symbols.split(',')
+               if symbol.strip()]
+    unknown = [symbol for symbol in symbols if symbol not in ATOMIC_NUMBERS]
+    if not symbols or unknown:
+        raise Http404('Unknown elements: {}'.format(', '.join(unknown)))
+    match_all = request.GET.get('match') != 'any'
+
+    page = paginate(request, get_minerals_with_elements(
+        [ATOMIC_NUMBERS[symbol] for symbol in symbols], match_all))
+
+    # the other match of the same page size and params, from its first page
+    toggle_query = request.GET.copy()
+    for param in ('after', 'before', 'match'):
+        toggle_query.pop(param, None)
+    if match_all:
+        toggle_query['match'] = 'any'
 
     random_mineral = get_random_mineral()
 
-    return render(request, 'main_app/index.html',
-                  {'minerals': minerals_found,
+    return render(request, 'main_app/by_element.html',
+                  {'minerals': page.object_list,
+                   'page': page,
+                   'symbols': symbols,
+                   'match_all': match_all,
+                   'toggle_query': toggle_query.urlencode(),
                    'random_mineral': random_mineral,
-                   'categories_list': categories_list,
-                   'streaks_list': streaks_list,
+                   'selected_letter': None,
                    })
 
 
+@condition(etag_func=page_etag(detail_tags),
+           last_modified_func=catalog_last_modified)
+@cache_page_by(detail_tags)
 def mineral_detail(request, pk):
     """
-    Single mineral detail view, tries to get the requested
-    mineral entry object.
+    Single mineral detail view, reads the requested mineral name, image
+    and detail snapshot, its attributes ordered by the most common first
+    and its image caption, built when the mineral was saved, and its
+    similar minerals, computed by the build_similar_minerals command.
     in addition:
-        sets the categories order by the most common attributes
         chooses a random mineral object.
     Finally sends for a template rendering
     :return: rendered html template object
     """
-    mineral = get_object_or_404(Mineral, pk=pk)
-    # The category order for displaying the most common first.
-    ordered_category = [
-        'category',
-        'group',
-        'formula',
-        'strunz_classification',
-        'crystal_system',
-        'mohs_scale_hardness',
-        'luster',
-        'color',
-        'specific_gravity',
-        'cleavage',
-        'diaphaneity',
-        'crystal_habit',
-        'streak',
-        'optical_properties',
-        'refractive_index',
-        'unit_cell',
-        'crystal_symmetry',
-    ]
-    # getting the most common categories attributes for the requested mineral
-    net_mineral_attributes = []
-    for category in ordered_category:
-        attribute_value = getattr(mineral, category, False)
-        if attribute_value:
-            net_mineral_attributes.append({category: attribute_value})
+    row = Mineral.objects.filter(pk=pk).values_list(
+        'pk', 'name', 'image_filename', 'detail_snapshot',
+        'similar_minerals').first()
+    if row is None:
+        raise Http404('No Mineral matches the given query.')
+    pk, name, image_filename, snapshot, similar = row
+    if not snapshot:
+        # written by a bulk operation, before build_detail_snapshots ran
+        snapshot = detail_snapshot(Mineral.objects.get(pk=pk))
+    snapshot = json.loads(snapshot)
 
     # choosing a random mineral entry object
     random_mineral = get_random_mineral()
 
-    raw_categories = raw_values('category')
-    slugged_categories = slug_em(raw_categories)
-    categories_list = sorted(set(slugged_categories))
-
-    raw_streaks = raw_values('streak')
-    slugged_streaks = slug_em(raw_streaks)
-    streaks_list = sorted(set(slugged_streaks))
-
     return render(request,
                   'main_app/mineral_detail.html',
                   {
-                      'mineral': mineral,
-                      'net_mineral_attributes': net_mineral_attributes,
+                      'mineral': {'pk': pk, 'name': name,
+                                  'image_caption': snapshot['caption']},
+                      'image': image_sources(image_filename),
+                      'attributes': snapshot['attributes'],
+                      'similar_minerals': [
+                          {'pk': similar_pk, 'name': similar_name}
+                          for similar_pk, similar_name
+                          in json.loads(similar or '[]')],
                       'random_mineral': random_mineral,
-                      'categories_list': categories_list,
-                      'streaks_list': streaks_list,
                   }
                   )
+
+
+@staff_member_required
+def perf_stats(request):
+    """
+    Staff only view of the PerfMiddleware stats of every process,
+    served only if settings.MINERAL_PERF_ENDPOINT is set
+    :return: A JSON response of the per view percentiles
+    """
+    if not settings.MINERAL_PERF_ENDPOINT:
+        raise Http404
+
+    return JsonResponse({view_name: view_stats.summary()
+                         for view_name, view_stats
+                         in sorted(load_stats().items())})
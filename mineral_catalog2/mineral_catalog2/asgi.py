@@ -0,0 +1,23 @@
+"""
+ASGI config for mineral_catalog2 project.
+
+It exposes the ASGI callable as a module-level variable named ``application``,
+e.g. for ``uvicorn mineral_catalog2.asgi:application``.
+Django 2.2 serves WSGI only, the WSGI application of wsgi.py runs in a
+pool of settings.MINERAL_ASGI_THREADS threads behind the asgiref based
+WsgiToAsgi adapter, the event loop keeps accepting requests while views
+run.
+"""
+
+import os
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'mineral_catalog2.settings')
+
+from django.conf import settings  # noqa: E402
+
+from mineral_catalog2.wsgi import application as wsgi_application  # noqa
+from mineral_catalog2.wsgi_to_asgi import WsgiToAsgi  # noqa: E402
+
+application = WsgiToAsgi(wsgi_application,
+                         max_workers=settings.MINERAL_ASGI_THREADS,
+                         max_body_size=settings.MINERAL_ASGI_MAX_BODY_SIZE)
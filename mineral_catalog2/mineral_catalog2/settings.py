@@ -42,6 +42,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'main_app.perf.PerfMiddleware',
     'debug_toolbar.middleware.DebugToolbarMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -56,7 +57,8 @@ ROOT_URLCONF = 'mineral_catalog2.urls'
 
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        # DjangoTemplates timing the renders for the PerfMiddleware
+        'BACKEND': 'main_app.perf.TimedDjangoTemplates',
         'DIRS': ['templates', ],
         'APP_DIRS': True,
         'OPTIONS': {
@@ -72,20 +74,82 @@ TEMPLATES = [
 
 WSGI_APPLICATION = 'mineral_catalog2.wsgi.application'
 
+# Threads running the views behind the ASGI entry point (asgi.py), and
+# the largest request body it accepts, larger ones are answered 413
+MINERAL_ASGI_THREADS = 8
+MINERAL_ASGI_MAX_BODY_SIZE = 2621440
+
 
 # Database
 # https://docs.djangoproject.com/en/2.2/ref/settings/#databases
 
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
+        # SQLite in WAL mode with a larger cache and memory mapped reads,
+        # MINERAL_DB_READ_ONLY=1 opens the shipped catalog immutable
+        'ENGINE': 'mineral_catalog2.sqlite_backend',
         'NAME': os.path.join(BASE_DIR, 'db.sqlite3'),
+        'CONN_MAX_AGE': 600,
+        'OPTIONS': {
+            'read_only': os.environ.get('MINERAL_DB_READ_ONLY') == '1',
+        },
         'TEST': {
                     'NAME': 'mytestdatabase',
                 },
     }
 }
 
+# Cache
+# https://docs.djangoproject.com/en/2.2/topics/cache/
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    }
+}
+
+# Cache alias and timeout in seconds of the catalog pages cache
+MINERAL_PAGE_CACHE = 'default'
+MINERAL_PAGE_CACHE_TIMEOUT = 600
+
+
+# Dotted path of the minerals search backend class (main_app.search),
+# None selects the search index backend of the database vendor
+MINERAL_SEARCH_BACKEND = None
+
+# Maximal number of the most relevant search matches listed, their pks
+# and the page cursor are bound in a single query, SQLite before 3.32
+# binds at most 999 parameters
+MINERAL_SEARCH_MAX_RESULTS = 990
+
+# Seconds a search may run before it is interrupted, None for no limit
+MINERAL_SEARCH_TIMEOUT = 2.0
+
+# Number of the search form typeahead suggestions
+MINERAL_SUGGEST_LIMIT = 10
+
+# Number of the similar minerals of the detail pages, computed by the
+# build_similar_minerals command
+MINERAL_SIMILAR_LIMIT = 6
+
+# Minerals list pages size, the page_size param can't exceed the maximum
+MINERALS_PAGE_SIZE = 100
+MINERALS_MAX_PAGE_SIZE = 500
+
+# Minerals fetched and serialized at a time by the NDJSON export
+MINERAL_EXPORT_CHUNK_SIZE = 2000
+
+# Per view timing histograms of the PerfMiddleware, each process writes
+# them to the snapshot dir (None is a dir in the system temp dir) every
+# interval seconds for the perf_report command. A request running the
+# same SQL with different parameters threshold times is flagged as N+1.
+# The staff only JSON endpoint is served when enabled.
+MINERAL_PERF_ENABLED = True
+MINERAL_PERF_SNAPSHOT_DIR = None
+MINERAL_PERF_SNAPSHOT_INTERVAL = 30
+MINERAL_PERF_N_PLUS_ONE_THRESHOLD = 5
+MINERAL_PERF_ENDPOINT = False
+
 
 # Password validation
 # https://docs.djangoproject.com/en/2.2/ref/settings/#auth-password-validators
@@ -128,6 +192,18 @@ STATICFILES_DIRS = (
     os.path.join(BASE_DIR, 'assets'),
 )
 
+# collectstatic writes content hashed names and gzip (and brotli, when the
+# brotli package is installed) siblings, served by the wsgi.py middleware
+STATIC_ROOT = os.path.join(BASE_DIR, 'staticfiles')
+STATICFILES_STORAGE = \
+    'mineral_catalog2.storage.CompressedManifestStaticFilesStorage'
+
+# Output directory of the build_image_variants command, served as static
+# files under data/variants/, and the img sizes attribute of the variants
+MINERAL_IMAGE_VARIANTS_DIR = os.path.join(BASE_DIR, 'assets', 'data',
+                                          'variants')
+MINERAL_IMAGE_SIZES = '240px'
+
 INTERNAL_IPS = [
     # ...
     '127.0.0.1',
@@ -0,0 +1,69 @@
+"""
+Django's SQLite backend tuned for the read mostly catalog.
+On connect it switches the database to WAL, so readers never wait for a
+writer, maps the file in memory and enlarges the page cache. Connections
+are persisted per thread by CONN_MAX_AGE.
+The extra OPTIONS of DATABASES:
+    'pragmas': a dict overriding or extending DEFAULT_PRAGMAS
+    'read_only': opens the file with immutable=1 and query_only, for the
+    shipped catalog only, migrate and the writes fail in this mode. An
+    immutable database ignores its WAL file, ship it checkpointed (the
+    last connection closing merges the WAL into the database).
+"""
+import os
+from urllib.parse import quote
+
+from django.db.backends.sqlite3 import base
+
+DEFAULT_PRAGMAS = {
+    'journal_mode': 'WAL',
+    # durable up to the last checkpoint, safe from corruption in WAL mode
+    'synchronous': 'NORMAL',
+    'mmap_size': 256 * 1024 * 1024,
+    # negative values are KiB
+    'cache_size': -64 * 1024,
+    'temp_store': 'MEMORY',
+}
+
+# an immutable database can't change its journal
+READ_ONLY_PRAGMAS = {
+    'journal_mode': None,
+    'synchronous': None,
+    'query_only': 'ON',
+}
+
+
+def is_memory_database(name):
+    return name == ':memory:' or 'mode=memory' in name
+
+
+def read_only_uri(path):
+    """
+    :return: The URI opening path read only, as a file nothing else writes
+    """
+    return 'file:{}?mode=ro&immutable=1'.format(
+        quote(os.path.abspath(path)))
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+
+    def get_connection_params(self):
+        kwargs = super().get_connection_params()
+        # the OPTIONS are passed to sqlite3.connect(), except these
+        pragmas = kwargs.pop('pragmas', {})
+        read_only = kwargs.pop('read_only', False)
+
+        self.pragmas = dict(DEFAULT_PRAGMAS, **pragmas)
+        database = kwargs['database']
+        if read_only and not is_memory_database(database):
+            if not database.startswith('file:'):
+                kwargs['database'] = read_only_uri(database)
+            self.pragmas.update(READ_ONLY_PRAGMAS)
+        return kwargs
+
+    def get_new_connection(self, conn_params):
+        conn = super().get_new_connection(conn_params)
+        for name, value in self.pragmas.items():
+            if value is not None:
+                conn.execute('PRAGMA {} = {}'.format(name, value))
+        return conn
@@ -0,0 +1,139 @@
+"""
+WSGI middleware serving the collected static files (STATIC_ROOT) before
+the requests reach Django: the precompressed sibling matching the
+Accept-Encoding header is sent, and the content hashed names are cached
+by clients forever.
+"""
+import json
+import mimetypes
+import os
+from email.utils import formatdate
+
+from django.conf import settings
+
+# the encodings of the precompressed siblings, in preference order
+ENCODINGS = (('br', '.br'), ('gzip', '.gz'))
+
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+DEFAULT_CACHE_CONTROL = 'public, max-age=60'
+
+
+class StaticFile:
+    """
+    A static file and its precompressed siblings, stat once at startup
+    """
+    __slots__ = ('paths', 'headers')
+
+    def __init__(self, path, immutable):
+        stat = os.stat(path)
+        content_type, _ = mimetypes.guess_type(path)
+        self.headers = [
+            ('Content-Type', content_type or 'application/octet-stream'),
+            ('Last-Modified', formatdate(stat.st_mtime, usegmt=True)),
+            ('Cache-Control', IMMUTABLE_CACHE_CONTROL if immutable
+             else DEFAULT_CACHE_CONTROL),
+        ]
+        self.paths = {None: self.variant(path)}
+        for encoding, extension in ENCODINGS:
+            if os.path.exists(path + extension):
+                self.paths[encoding] = self.variant(path + extension)
+        if len(self.paths) > 1:
+            self.headers.append(('Vary', 'Accept-Encoding'))
+
+    @staticmethod
+    def variant(path):
+        """
+        :return: The (path, size, strong ETag) of a file encoding
+        """
+        stat = os.stat(path)
+        return (path, stat.st_size,
+                '"{:x}-{:x}"'.format(int(stat.st_mtime), stat.st_size))
+
+    def negotiate(self, accept_encoding):
+        """
+        :return: The (encoding, path, size, ETag) to send, encoding is None
+        for the uncompressed file
+        """
+        accepted = {part.split(';')[0].strip()
+                    for part in accept_encoding.split(',')}
+        for encoding, _ in ENCODINGS:
+            if encoding in self.paths and encoding in accepted:
+                return (encoding,) + self.paths[encoding]
+        return (None,) + self.paths[None]
+
+
+class StaticFilesMiddleware:
+    """
+    Serves the files of root under the prefix url, passing every other
+    request to the wrapped application. The files are indexed once, run
+    collectstatic before starting the server.
+    """
+
+    def __init__(self, application, root=None, prefix=None):
+        self.application = application
+        self.prefix = prefix or settings.STATIC_URL
+        self.files = self.index(root or settings.STATIC_ROOT)
+
+    @staticmethod
+    def index(root):
+        """
+        :return: A dict of the url path, relative to the prefix, to its
+        StaticFile, empty if the root doesn't exist
+        """
+        if not root or not os.path.isdir(root):
+            return {}
+
+        try:
+            with open(os.path.join(root, 'staticfiles.json')) as manifest:
+                hashed = set(json.load(manifest)['paths'].values())
+        except (OSError, ValueError, KeyError):
+            hashed = set()
+
+        compressed_extensions = tuple(extension for _, extension in ENCODINGS)
+        files = {}
+        for directory, _, filenames in os.walk(root):
+            for filename in filenames:
+                if filename.endswith(compressed_extensions):
+                    continue
+                path = os.path.join(directory, filename)
+                name = os.path.relpath(path, root).replace(os.sep, '/')
+                files[name] = StaticFile(path, immutable=name in hashed)
+        return files
+
+    def __call__(self, environ, start_response):
+        path = environ.get('PATH_INFO', '')
+        static_file = None
+        if path.startswith(self.prefix):
+            static_file = self.files.get(path[len(self.prefix):])
+        if static_file is None:
+            return self.application(environ, start_response)
+
+        method = environ['REQUEST_METHOD']
+        if method not in ('GET', 'HEAD'):
+            start_response('405 Method Not Allowed',
+                           [('Allow', 'GET, HEAD')])
+            return []
+
+        encoding, file_path, size, etag = static_file.negotiate(
+            environ.get('HTTP_ACCEPT_ENCODING', ''))
+        headers = static_file.headers + [('ETag', etag)]
+        if etag in environ.get('HTTP_IF_NONE_MATCH', ''):
+            start_response('304 Not Modified', headers)
+            return []
+
+        if encoding:
+            headers.append(('Content-Encoding', encoding))
+        headers.append(('Content-Length', str(size)))
+        start_response('200 OK', headers)
+        if method == 'HEAD':
+            return []
+
+        file_wrapper = environ.get('wsgi.file_wrapper')
+        if file_wrapper:
+            return file_wrapper(open(file_path, 'rb'), 1 << 16)
+        return read_chunks(file_path)
+
+
+def read_chunks(path, chunk_size=1 << 16):
+    with open(path, 'rb') as content:
+        yield from iter(lambda: content.read(chunk_size), b'')
@@ -0,0 +1,69 @@
+"""
+Static files storage writing content hashed names, as
+ManifestStaticFilesStorage does, plus precompressed gzip and brotli
+siblings of the text assets, served by mineral_catalog2.static_wsgi
+"""
+import gzip
+
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# extensions worth compressing, images and fonts are compressed already
+COMPRESSIBLE_EXTENSIONS = ('.css', '.js', '.json', '.svg', '.txt', '.html',
+                           '.xml', '.map')
+
+# a compressed sibling is written only if it saves enough bytes
+MIN_COMPRESSION_RATIO = 0.95
+
+
+def compressors():
+    """
+    :return: A list of the (file extension, compress function) available
+    """
+    available = [('.gz', lambda data: gzip.compress(data, 9, mtime=0))]
+    if brotli is not None:
+        available.append(('.br', lambda data: brotli.compress(data)))
+    return available
+
+
+class CompressedManifestStaticFilesStorage(ManifestStaticFilesStorage):
+    # names missing from the manifest (e.g. before collectstatic ran) are
+    # served unhashed instead of failing the page
+    manifest_strict = False
+
+    def stored_name(self, name):
+        try:
+            return super().stored_name(name)
+        except ValueError:
+            return name
+
+    def post_process(self, paths, dry_run=False, **options):
+        stored_names = set()
+        for name, hashed_name, processed in super().post_process(
+                paths, dry_run, **options):
+            if hashed_name and not isinstance(processed, Exception):
+                # the unhashed copy is served as well
+                stored_names.update((name, hashed_name))
+            yield name, hashed_name, processed
+
+        if not dry_run:
+            for name in stored_names:
+                self.compress(name)
+
+    def compress(self, name):
+        """
+        Writes the compressed siblings of a stored text file
+        """
+        if not name.endswith(COMPRESSIBLE_EXTENSIONS) or not self.exists(name):
+            return
+        with self.open(name) as original:
+            data = original.read()
+        for extension, compress in compressors():
+            compressed = compress(data)
+            if len(compressed) < len(data) * MIN_COMPRESSION_RATIO:
+                with open(self.path(name + extension), 'wb') as output:
+                    output.write(compressed)
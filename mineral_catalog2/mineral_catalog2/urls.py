@@ -22,6 +22,7 @@ app_name = 'mineral_catalog2'
 
 urlpatterns = [
     path('', include('main_app.urls', namespace='minerals')),
+    path('api/', include('main_app.api_urls', namespace='api')),
     path('admin/', admin.site.urls),
 ]
 
@@ -2,6 +2,8 @@
 WSGI config for mineral_catalog2 project.
 
 It exposes the WSGI callable as a module-level variable named ``application``.
+The collected static files are served by the StaticFilesMiddleware in front
+of Django, run ``python manage.py collectstatic`` first.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/2.2/howto/deployment/wsgi/
@@ -13,4 +15,6 @@ from django.core.wsgi import get_wsgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'mineral_catalog2.settings')
 
-application = get_wsgi_application()
+from mineral_catalog2.static_wsgi import StaticFilesMiddleware  # noqa: E402
+
+application = StaticFilesMiddleware(get_wsgi_application())
@@ -0,0 +1,154 @@
+"""
+An ASGI application serving a WSGI application, Django 2.2 having no
+ASGI handler of its own.
+asgiref's WsgiToAsgi translates the requests and streams the responses
+back chunk by chunk. This adapter runs the WSGI calls in a bounded thread
+pool of its own, asgiref would run them all in its single thread
+sensitive thread, refuses the request bodies over a size limit, and stops
+iterating a response once its client disconnected.
+"""
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from asgiref import wsgi
+from asgiref.sync import sync_to_async
+
+
+class RequestBodyTooLarge(Exception):
+    pass
+
+
+class ClientDisconnected(Exception):
+    pass
+
+
+class WsgiToAsgi(wsgi.WsgiToAsgi):
+    """
+    The ASGI application of a WSGI application
+    :param wsgi_application: the WSGI callable
+    :param max_workers: the size of the thread pool running it
+    :param max_body_size: the maximal request body size in bytes, None
+    for no limit
+    """
+
+    def __init__(self, wsgi_application, max_workers=8, max_body_size=None):
+        super().__init__(wsgi_application)
+        self.max_body_size = max_body_size
+        self.executor = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix='wsgi')
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            await self.lifespan(receive, send)
+        else:
+            await WsgiToAsgiInstance(self)(scope, receive, send)
+
+    async def lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                self.executor.shutdown(wait=False)
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+
+class WsgiToAsgiInstance(wsgi.WsgiToAsgiInstance):
+    """
+    A single request of the WsgiToAsgi adapter
+    """
+
+    def __init__(self, adapter):
+        super().__init__(adapter.wsgi_application)
+        self.adapter = adapter
+        self.disconnected = threading.Event()
+        self.watcher = None
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            raise ValueError('Unsupported ASGI scope {}'.format(
+                scope['type']))
+        received = 0
+        max_body_size = self.adapter.max_body_size
+
+        async def receive_body():
+            nonlocal received
+            message = await receive()
+            if message['type'] == 'http.disconnect':
+                raise ClientDisconnected
+            received += len(message.get('body', b''))
+            if max_body_size is not None and received > max_body_size:
+                raise RequestBodyTooLarge
+            if not message.get('more_body'):
+                # the body is read, the next message is the disconnect
+                self.watcher = asyncio.ensure_future(
+                    self.watch_disconnect(receive))
+            return message
+
+        try:
+            if max_body_size is not None and \
+                    self.content_length(scope) > max_body_size:
+                raise RequestBodyTooLarge
+            await super().__call__(scope, receive_body, send)
+        except RequestBodyTooLarge:
+            await send({'type': 'http.response.start', 'status': 413,
+                        'headers': [(b'content-type', b'text/plain')]})
+            await send({'type': 'http.response.body',
+                        'body': b'Request body too large'})
+        except ClientDisconnected:
+            pass
+        finally:
+            if self.watcher is not None:
+                self.watcher.cancel()
+
+    @staticmethod
+    def content_length(scope):
+        """
+        :return: The announced request body size, 0 if there is none
+        """
+        for name, value in scope.get('headers', []):
+            if name.lower() == b'content-length' and value.isdigit():
+                return int(value)
+        return 0
+
+    async def watch_disconnect(self, receive):
+        while True:
+            message = await receive()
+            if message['type'] == 'http.disconnect':
+                self.disconnected.set()
+                return
+
+    async def run_wsgi_app(self, body):
+        await sync_to_async(self.run_wsgi, thread_sensitive=False,
+                            executor=self.adapter.executor)(body)
+
+    def run_wsgi(self, body):
+        """
+        Calls the WSGI application in a pool thread, every message is
+        sent by the loop and waited for, a slow client slows the response
+        iteration down instead of buffering it
+        """
+        response = self.wsgi_application(
+            self.build_environ(self.scope, body), self.start_response)
+        try:
+            for chunk in response:
+                if self.disconnected.is_set():
+                    return
+                if not chunk:
+                    continue
+                self.send_start()
+                self.sync_send({'type': 'http.response.body',
+                                'body': chunk, 'more_body': True})
+            self.send_start()
+            self.sync_send({'type': 'http.response.body', 'body': b''})
+        finally:
+            close = getattr(response, 'close', None)
+            if close is not None:
+                close()
+
+    def send_start(self):
+        if not self.response_started:
+            self.response_started = True
+            self.sync_send(self.response_start)